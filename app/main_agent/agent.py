@@ -5,11 +5,11 @@ load_dotenv()
 #ADK imports
 from google.adk.agents import Agent
 from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService, Session
+from google.adk.sessions import Session
 
 #Tools imports
 #Prompts imports
-from . import prompts, tools, sub_agents
+from . import prompts, tools, sub_agents, tool_dispatch, session_store, history_compaction, context_cache
 
 ### STATIC VARIABLES ###
 
@@ -29,20 +29,34 @@ GEMINI_PRO_MODEL = "gemini-2.5-pro-exp-03-25"
 # Define the main orchestrator agent
 root_agent = Agent(
     name="main_orchestrator_agent",
-    model=GEMINI_MODEL,
+    model=context_cache.CacheAwareGemini(model=GEMINI_MODEL),  # Resends the prefix if its cache is gone
     description=prompts.main_agent_description,
     instruction=prompts.main_agent_intrcutions,
     tools=[
         tools.search_tool,
         tools.create_document_tool,
+        tools.create_documents_tool,
         tools.delete_document_tool,
         tools.edit_document_tool,
-        
+        tools.expand_tool_result_tool,
+        tools.fetch_more_results_tool,
     ],
     sub_agents=[sub_agents.email_assistant_agent, sub_agents.spreadsheet_assistant_agent],  # List of sub-agents
+    before_tool_callback=tool_dispatch.dispatcher,  # Runs independent calls concurrently
+    before_model_callback=[
+        tool_dispatch.dispatcher.before_model,  # Ends the previous turn's calls
+        history_compaction.compactor,  # Keeps the history within budget
+        context_cache.cache_manager,  # Sends the static prefix as a cache reference
+    ],
+    after_model_callback=tool_dispatch.dispatcher.after_model,  # Records the calls to dispatch
 )
 
 # Session and Runner
-session_service = InMemorySessionService()
-session: Session= session_service.create_session(app_name=APP_NAME, user_id=USER_ID, session_id=SESSION_ID)
+# Sessions persist in SQLite (SESSION_DB_PATH) unless SESSION_BACKEND=memory
+session_service = session_store.make_session_service()
 runner = Runner(agent=root_agent, app_name=APP_NAME, session_service=session_service)
+
+
+def get_or_create_session(user_id: str = USER_ID, session_id: str = SESSION_ID) -> Session:
+    """Resume a user's session, creating it on first use."""
+    return session_store.get_or_create_session(session_service, APP_NAME, user_id, session_id)
@@ -0,0 +1,44 @@
+"""Exponential-backoff retries for Google API requests."""
+import logging
+import random
+import time
+from typing import Any, Callable, Dict, Iterable
+
+from googleapiclient.errors import HttpError
+
+logger = logging.getLogger(__name__)
+
+# Responses worth retrying: rate limiting and transient server errors
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+# For requests that are not idempotent, such as values.append or messages.send: a server error
+# may come after the write was applied, so only rate limiting is retried
+NON_IDEMPOTENT_RETRYABLE_STATUSES = {429}
+
+
+def execute_with_retry(
+    make_request: Callable[[], Any],
+    max_attempts: int = 5,
+    base_delay: float = 1.0,
+    retry_statuses: Iterable[int] = RETRYABLE_STATUSES,
+) -> Dict[str, Any]:
+    """Execute an API request, retrying rate-limit and server errors with exponential backoff.
+
+    Args:
+        make_request (Callable): Returns a fresh googleapiclient request to execute
+        max_attempts (int): Total attempts before the last error is raised
+        base_delay (float): Delay before the first retry, doubled on every retry
+        retry_statuses (Iterable[int]): HTTP statuses to retry; pass
+            NON_IDEMPOTENT_RETRYABLE_STATUSES for requests that must not run twice
+
+    Returns:
+        dict: The API response
+    """
+    for attempt in range(max_attempts):
+        try:
+            return make_request().execute()
+        except HttpError as error:
+            if error.resp.status not in retry_statuses or attempt == max_attempts - 1:
+                raise
+            delay = base_delay * 2 ** attempt * (1 + random.random() / 2)
+            logger.info("Request failed with HTTP %s; retrying in %.1fs", error.resp.status, delay)
+            time.sleep(delay)
@@ -0,0 +1,94 @@
+"""Async variants of the tools in sub_tools.
+
+Each tool keeps the name, signature and docstring of its synchronous
+counterpart, so the function declarations the model sees are unchanged. The
+blocking Google API call runs on a bounded worker pool instead of the event
+loop that drives the ADK Runner, so one slow Gmail or Drive request no longer
+stalls every other session. Worker threads keep their own pooled HTTP
+connections (see services.get_service), so connections are reused across
+calls.
+"""
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Coroutine
+
+from . import sub_tools
+
+# Upper bound on Google API calls in flight at once across all sessions
+MAX_WORKERS = int(os.environ.get("GOOGLE_API_WORKERS", "16"))
+
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="google-api")
+
+# Calls submitted to the pool that no worker has picked up yet
+_queued = 0
+_queued_lock = threading.Lock()
+
+
+def make_async(func: Callable[..., Any]) -> Callable[..., Coroutine[Any, Any, Any]]:
+    """Wrap a blocking tool function in a coroutine function run on the worker pool.
+
+    Args:
+        func (Callable): The synchronous tool function
+
+    Returns:
+        Callable: An async function with the same name, signature and docstring
+    """
+    def run(*args, **kwargs):
+        global _queued
+        with _queued_lock:
+            _queued -= 1
+        return func(*args, **kwargs)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        global _queued
+        with _queued_lock:
+            _queued += 1
+        future = _executor.submit(run, *args, **kwargs)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # A call cancelled before a worker picked it up never runs
+            if future.cancelled():
+                with _queued_lock:
+                    _queued -= 1
+            raise
+    return wrapper
+
+
+def pending_calls() -> int:
+    """Number of tool calls waiting for a free worker."""
+    return _queued
+
+
+# Gmail
+send_email = make_async(sub_tools.send_email)
+send_bulk_email = make_async(sub_tools.send_bulk_email)
+list_email_labels = make_async(sub_tools.list_email_labels)
+get_emails = make_async(sub_tools.get_emails)
+get_email_by_id = make_async(sub_tools.get_email_by_id)
+mark_email_as_read = make_async(sub_tools.mark_email_as_read)
+mark_emails_as_read = make_async(sub_tools.mark_emails_as_read)
+modify_email_labels = make_async(sub_tools.modify_email_labels)
+count_unread_emails = make_async(sub_tools.count_unread_emails)
+
+# Google Docs
+create_document = make_async(sub_tools.create_document)
+create_documents = make_async(sub_tools.create_documents)
+delete_document = make_async(sub_tools.delete_document)
+edit_document = make_async(sub_tools.edit_document)
+
+# Google Sheets and Drive
+create_new_spreadsheet = make_async(sub_tools.create_new_spreadsheet)
+add_sheet_to_spreadsheet = make_async(sub_tools.add_sheet_to_spreadsheet)
+get_sheet_values = make_async(sub_tools.get_sheet_values)
+batch_get_sheet_values = make_async(sub_tools.batch_get_sheet_values)
+aggregate_sheet_values = make_async(sub_tools.aggregate_sheet_values)
+update_sheet_values = make_async(sub_tools.update_sheet_values)
+batch_update_sheet_values = make_async(sub_tools.batch_update_sheet_values)
+bulk_append_sheet_rows = make_async(sub_tools.bulk_append_sheet_rows)
+delete_sheet_from_spreadsheet = make_async(sub_tools.delete_sheet_from_spreadsheet)
+search_drive_files_by_name = make_async(sub_tools.search_drive_files_by_name)
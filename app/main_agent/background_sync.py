@@ -0,0 +1,61 @@
+import logging
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundSync:
+    """Base class of local mirrors kept up to date by a background thread.
+
+    Subclasses implement _sync(). start() runs it on a daemon thread every
+    `interval` seconds; a failed sync is logged and tried again at the next
+    interval.
+    """
+
+    # Name of the background thread, also used in log messages
+    thread_name = "background-sync"
+
+    def __init__(self, interval: float):
+        """
+        Args:
+            interval (float): Seconds between two syncs
+        """
+        self.interval = interval
+        self._last_success = 0.0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Start the background sync thread, if it is not running yet."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Ask the background sync thread to exit."""
+        self._stop.set()
+
+    def sync_once(self) -> None:
+        """Run one sync now, in the calling thread."""
+        self._sync()
+        self._last_success = time.monotonic()
+
+    def synced_recently(self) -> bool:
+        """Whether a sync succeeded within the last few intervals."""
+        return time.monotonic() - self._last_success < 3 * self.interval
+
+    def _sync(self) -> None:
+        raise NotImplementedError
+
+    def _run(self) -> None:
+        """Background loop: sync, then wait for the next interval."""
+        while not self._stop.is_set():
+            try:
+                self.sync_once()
+            except Exception as e:
+                logger.warning("Background sync %s failed: %s", self.thread_name, e)
+            self._stop.wait(self.interval)
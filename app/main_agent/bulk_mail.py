@@ -0,0 +1,263 @@
+import base64
+import html
+import mimetypes
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email import policy
+from email.message import EmailMessage
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import make_msgid
+from typing import Any, BinaryIO, Dict, List, Sequence, Tuple
+
+from googleapiclient.errors import HttpError
+from googleapiclient.http import MediaFileUpload
+
+from .api_retry import NON_IDEMPOTENT_RETRYABLE_STATUSES, execute_with_retry
+
+# messages.send costs 100 quota units against a per-user limit of 250 units
+# per second, so stay at two sends per second unless told otherwise
+SEND_RATE = float(os.environ.get("GMAIL_SEND_RATE", "2"))
+SEND_WORKERS = int(os.environ.get("GMAIL_SEND_WORKERS", "8"))
+
+# Attachments are read and base64-encoded this many bytes at a time; a
+# multiple of 57 so every encoded line is a full 76 characters
+ENCODE_CHUNK_BYTES = 57 * 1024
+
+# Messages up to this size are sent inline as "raw"; larger ones are uploaded
+# from their temporary file
+RAW_LIMIT_BYTES = 5 * 1024 * 1024
+
+_PLACEHOLDER = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+_SMTP = policy.SMTP
+
+
+class RateLimiter:
+    """Token bucket shared by threads: at most `rate` acquisitions per second on average."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        """
+        Args:
+            rate (float): Sustained acquisitions per second
+            burst (int): Acquisitions allowed back to back after an idle period
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Block until a token is available, then take it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def render_template(template: str, variables: Dict[str, str], escape_html: bool = False) -> str:
+    """Replace {{name}} placeholders with variables[name].
+
+    Raises:
+        KeyError: If a placeholder has no value
+    """
+    def replace(match):
+        value = variables[match.group(1)]
+        return html.escape(value) if escape_html else value
+    return _PLACEHOLDER.sub(replace, template)
+
+
+def write_message(
+    fp: BinaryIO,
+    to: str,
+    subject: str,
+    body: str,
+    html_body: str = "",
+    attachment_paths: Sequence[str] = (),
+) -> None:
+    """Write an RFC 822 message to a binary file.
+
+    Attachments are base64-encoded straight from disk in ENCODE_CHUNK_BYTES
+    pieces, so a message never holds a whole attachment in memory.
+    """
+    if html_body:
+        content = MIMEMultipart("alternative")
+        content.attach(MIMEText(body, "plain", "utf-8"))
+        content.attach(MIMEText(html_body, "html", "utf-8"))
+    else:
+        content = MIMEText(body, "plain", "utf-8")
+
+    headers = [("To", to), ("Subject", subject), ("Message-ID", make_msgid()), ("MIME-Version", "1.0")]
+    if not attachment_paths:
+        for name, value in headers:
+            content[name] = value
+        fp.write(content.as_bytes(policy=_SMTP))
+        return
+
+    boundary = f"=_{base64.urlsafe_b64encode(os.urandom(18)).decode()}"
+    fp.write(_header_block(headers + [("Content-Type", f'multipart/mixed; boundary="{boundary}"')]))
+
+    fp.write(f"--{boundary}\r\n".encode())
+    fp.write(content.as_bytes(policy=_SMTP))
+    for path in attachment_paths:
+        filename = os.path.basename(path)
+        mime_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        fp.write(f"\r\n--{boundary}\r\n".encode())
+        fp.write(_header_block([
+            ("Content-Type", mime_type),
+            ("Content-Disposition", f'attachment; filename="{filename}"'),
+            ("Content-Transfer-Encoding", "base64"),
+        ]))
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(ENCODE_CHUNK_BYTES)
+                if not chunk:
+                    break
+                fp.write(base64.encodebytes(chunk).replace(b"\n", b"\r\n"))
+    fp.write(f"\r\n--{boundary}--\r\n".encode())
+
+
+def _header_block(headers: Sequence[Tuple[str, str]]) -> bytes:
+    """Encode headers (RFC 2047 for non-ASCII values) followed by the blank line ending them."""
+    message = EmailMessage(policy=_SMTP)
+    for name, value in headers:
+        message[name] = value
+    return b"".join(_SMTP.fold_binary(name, value) for name, value in message.items()) + b"\r\n"
+
+
+def build_message_file(
+    to: str,
+    subject: str,
+    body: str,
+    html_body: str = "",
+    attachment_paths: Sequence[str] = (),
+) -> str:
+    """Write a message to a new temporary file and return its path; the caller removes it."""
+    for path in attachment_paths:
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"Attachment not found: {path}")
+    fd, path = tempfile.mkstemp(suffix=".eml")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write_message(f, to, subject, body, html_body, attachment_paths)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+def send_message_file(service, path: str) -> str:
+    """Send a message written by build_message_file, retrying when rate limited.
+
+    Server errors are not retried: Gmail may have accepted the message
+    already, and a retry would send it twice.
+
+    Small messages are sent as "raw"; larger ones are uploaded from the file
+    with a resumable upload.
+
+    Returns:
+        str: The ID of the sent message
+    """
+    messages = service.users().messages()
+    if os.path.getsize(path) <= RAW_LIMIT_BYTES:
+        with open(path, "rb") as f:
+            raw = base64.urlsafe_b64encode(f.read()).decode()
+        sent = execute_with_retry(
+            lambda: messages.send(userId="me", body={"raw": raw}),
+            retry_statuses=NON_IDEMPOTENT_RETRYABLE_STATUSES
+        )
+    else:
+        sent = execute_with_retry(
+            lambda: messages.send(
+                userId="me",
+                media_body=MediaFileUpload(path, mimetype="message/rfc822", resumable=True)
+            ),
+            retry_statuses=NON_IDEMPOTENT_RETRYABLE_STATUSES
+        )
+    return sent["id"]
+
+
+def send_message(
+    service,
+    to: str,
+    subject: str,
+    body: str,
+    html_body: str = "",
+    attachment_paths: Sequence[str] = (),
+) -> str:
+    """Build and send one message; returns the ID of the sent message."""
+    path = build_message_file(to, subject, body, html_body, attachment_paths)
+    try:
+        return send_message_file(service, path)
+    finally:
+        os.remove(path)
+
+
+def send_bulk(
+    service,
+    recipients: Sequence[str],
+    subject_template: str,
+    body_template: str,
+    variables: Sequence[Dict[str, str]],
+    html_template: str = "",
+    attachment_paths: Sequence[str] = (),
+    rate: float = SEND_RATE,
+    workers: int = SEND_WORKERS,
+) -> List[Dict[str, Any]]:
+    """Render and send one message per recipient.
+
+    Rendering and MIME encoding run on a worker pool; sends start no faster
+    than `rate` per second across all workers.
+
+    Args:
+        service: Gmail API service
+        recipients (Sequence[str]): Recipient addresses
+        subject_template (str): Subject with {{name}} placeholders
+        body_template (str): Plain-text body with {{name}} placeholders
+        variables (Sequence[dict]): Placeholder values for each recipient,
+            in the same order; "email" is always available
+        html_template (str): Optional HTML body; values are HTML-escaped
+        attachment_paths (Sequence[str]): Files attached to every message
+        rate (float): Maximum sends per second
+        workers (int): Messages rendered and sent at once
+
+    Returns:
+        List[dict]: One {"to", "status", "message_id" or "message"} per recipient, in order
+    """
+    limiter = RateLimiter(rate)
+
+    def send(to: str, values: Dict[str, str]) -> Dict[str, Any]:
+        values = {"email": to, **values}
+        try:
+            subject = render_template(subject_template, values)
+            body = render_template(body_template, values)
+            html_body = render_template(html_template, values, escape_html=True) if html_template else ""
+        except KeyError as missing:
+            return {"to": to, "status": "error", "message": f"No value for placeholder {missing}"}
+        path = None
+        try:
+            # Encode before waiting for the rate limiter, so sends go out back to back
+            path = build_message_file(to, subject, body, html_body, attachment_paths)
+            limiter.acquire()
+            message_id = send_message_file(service, path)
+            return {"to": to, "status": "success", "message_id": message_id}
+        except HttpError as error:
+            return {"to": to, "status": "error", "message": f"An error occurred: {error}"}
+        except Exception as e:
+            return {"to": to, "status": "error", "message": f"An unexpected error occurred: {str(e)}"}
+        finally:
+            if path is not None:
+                os.remove(path)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(recipients)))) as pool:
+        return list(pool.map(send, recipients, variables))
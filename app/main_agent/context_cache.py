@@ -0,0 +1,426 @@
+"""Model-side caching of each agent's static request prefix.
+
+Every model call repeats the agent's system instruction and its tool
+declarations. Installed as a before_model_callback, ContextCacheManager puts
+that prefix into a Gemini cached content once and points later requests at it,
+so each turn sends only the conversation itself.
+
+Caches are keyed by a hash of the model, instruction and tool declarations:
+- a prefix seen for the first time creates a cache with CONTEXT_CACHE_TTL;
+- a cache within CONTEXT_CACHE_REFRESH seconds of expiring has its TTL extended;
+- when an agent's prefix changes (its prompt or tools were edited) a new
+  cache is created and the old one is no longer refreshed, so it expires.
+  Caches may be shared with other processes (see _adopt), so none is ever
+  deleted out from under them.
+
+A model call that fails because its cache is gone (deleted elsewhere, or
+expired early) is retried once by CacheAwareGemini with the full prefix, and
+the cache is created again on the next call.
+
+Set CONTEXT_CACHE=gemini to enable it. LocalCacheBackend is an in-memory
+stand-in for the Gemini caches API, for exercising the manager without one.
+"""
+import collections
+import hashlib
+import itertools
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import Gemini, LlmRequest, LlmResponse
+from google.genai import Client
+from google.genai import errors as genai_errors
+from google.genai import types
+
+logger = logging.getLogger(__name__)
+
+# "gemini" to cache prefixes with the Gemini API, "off" to send them every time
+BACKEND = os.environ.get("CONTEXT_CACHE", "off").lower()
+
+# Lifetime of a cache, in seconds, from its creation or last refresh
+TTL = int(os.environ.get("CONTEXT_CACHE_TTL", "3600"))
+# A cache used with less than this many seconds left has its TTL extended
+REFRESH_MARGIN = int(os.environ.get("CONTEXT_CACHE_REFRESH", "600"))
+# Prefixes smaller than this are sent as they are; Gemini rejects smaller caches
+MIN_TOKENS = int(os.environ.get("CONTEXT_CACHE_MIN_TOKENS", "1024"))
+# Seconds to wait before trying again to cache a prefix whose creation failed
+FAILURE_BACKOFF = 300
+# Caches remembered by name for restoring requests whose cache vanished
+MAX_KNOWN_CACHES = 64
+
+CHARS_PER_TOKEN = 4
+DISPLAY_NAME_PREFIX = "adk-prefix"
+
+
+@dataclass
+class CachedPrefix:
+    """One cache, as this process knows it."""
+
+    name: str
+    key: str
+    expires_at: float  # time.monotonic() deadline
+    # The prefix the cache holds, to put back into a request if the cache is gone
+    system_instruction: Any = None
+    tools: Any = None
+    tool_config: Any = None
+
+
+class GeminiCacheBackend:
+    """Cached contents stored by the Gemini API."""
+
+    def __init__(self, client: Optional[Client] = None):
+        """
+        Args:
+            client (Optional[Client]): The client to use; by default one is
+                created from the environment on first use, like ADK's own
+        """
+        self._client = client
+
+    @property
+    def client(self) -> Client:
+        if self._client is None:
+            self._client = Client()
+        return self._client
+
+    async def create(self, model: str, display_name: str, config: types.GenerateContentConfig, ttl: int) -> str:
+        """Cache the instruction, tools and tool config of config; returns the cache name."""
+        cached = await self.client.aio.caches.create(
+            model=model,
+            config=types.CreateCachedContentConfig(
+                display_name=display_name,
+                system_instruction=config.system_instruction,
+                tools=config.tools or None,
+                tool_config=config.tool_config,
+                ttl=f"{ttl}s",
+            ),
+        )
+        return cached.name
+
+    async def refresh(self, name: str, ttl: int) -> bool:
+        """Extend a cache's TTL; False if it no longer exists."""
+        try:
+            await self.client.aio.caches.update(name=name, config=types.UpdateCachedContentConfig(ttl=f"{ttl}s"))
+        except genai_errors.ClientError as error:
+            if error.code in (403, 404):
+                return False
+            raise
+        return True
+
+    async def delete(self, name: str) -> None:
+        try:
+            await self.client.aio.caches.delete(name=name)
+        except genai_errors.ClientError as error:
+            if error.code not in (403, 404):
+                raise
+
+    async def list(self) -> List[Tuple[str, str, float]]:
+        """(name, display name, seconds left) of every cache."""
+        caches = []
+        async for cached in await self.client.aio.caches.list():
+            left = cached.expire_time.timestamp() - time.time() if cached.expire_time else 0
+            caches.append((cached.name, cached.display_name or "", left))
+        return caches
+
+
+class LocalCacheBackend:
+    """In-memory stand-in for GeminiCacheBackend.
+
+    Keeps what would have been cached, so expand() can rebuild the request
+    Gemini would have seen.
+    """
+
+    def __init__(self):
+        self.caches: Dict[str, Dict[str, Any]] = {}
+        self._ids = itertools.count(1)
+
+    async def create(self, model: str, display_name: str, config: types.GenerateContentConfig, ttl: int) -> str:
+        name = f"cachedContents/local-{next(self._ids)}"
+        self.caches[name] = {
+            "model": model,
+            "display_name": display_name,
+            "system_instruction": config.system_instruction,
+            "tools": list(config.tools or []),
+            "tool_config": config.tool_config,
+            "expires_at": time.monotonic() + ttl,
+        }
+        return name
+
+    async def refresh(self, name: str, ttl: int) -> bool:
+        cached = self._live(name)
+        if cached is None:
+            return False
+        cached["expires_at"] = time.monotonic() + ttl
+        return True
+
+    async def delete(self, name: str) -> None:
+        self.caches.pop(name, None)
+
+    async def list(self) -> List[Tuple[str, str, float]]:
+        now = time.monotonic()
+        return [
+            (name, cached["display_name"], cached["expires_at"] - now)
+            for name, cached in list(self.caches.items())
+            if self._live(name) is not None
+        ]
+
+    def expand(self, llm_request: LlmRequest) -> None:
+        """Put a cached prefix back into a request that refers to it.
+
+        Raises:
+            KeyError: If the request refers to a cache that does not exist or expired
+        """
+        name = llm_request.config.cached_content
+        if not name:
+            return
+        cached = self._live(name)
+        if cached is None:
+            raise KeyError(f"Cached content {name} not found")
+        llm_request.config.cached_content = None
+        llm_request.config.system_instruction = cached["system_instruction"]
+        llm_request.config.tools = list(cached["tools"])
+        llm_request.config.tool_config = cached["tool_config"]
+
+    def _live(self, name: str) -> Optional[Dict[str, Any]]:
+        cached = self.caches.get(name)
+        if cached is not None and cached["expires_at"] <= time.monotonic():
+            del self.caches[name]
+            cached = None
+        return cached
+
+
+def prefix_key(model: str, config: types.GenerateContentConfig) -> str:
+    """Hash of everything a cache holds; changes whenever a prompt or tool does."""
+    prefix = config.model_dump(
+        mode="json",
+        include={"system_instruction", "tools", "tool_config"},
+        exclude_none=True,
+    )
+    serialized = json.dumps({"model": model, **prefix}, sort_keys=True)
+    return hashlib.sha256(serialized.encode()).hexdigest()[:32]
+
+
+def estimate_prefix_tokens(config: types.GenerateContentConfig) -> int:
+    """Approximate token count of the instruction and tool declarations."""
+    prefix = config.model_dump(mode="json", include={"system_instruction", "tools"}, exclude_none=True)
+    return len(json.dumps(prefix)) // CHARS_PER_TOKEN
+
+
+class ContextCacheManager:
+    """before_model_callback that swaps an agent's static prefix for a cache reference."""
+
+    def __init__(
+        self,
+        backend=None,
+        ttl: int = TTL,
+        refresh_margin: int = REFRESH_MARGIN,
+        min_tokens: int = MIN_TOKENS,
+    ):
+        """
+        Args:
+            backend: GeminiCacheBackend, LocalCacheBackend, or None to disable caching
+            ttl (int): Lifetime of a cache, in seconds, from creation or refresh
+            refresh_margin (int): Seconds left below which a used cache is refreshed
+            min_tokens (int): Smallest prefix worth caching
+        """
+        self.backend = backend
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.min_tokens = min_tokens
+        self._caches: Dict[str, CachedPrefix] = {}  # by prefix key
+        self._agent_keys: Dict[str, str] = {}  # agent name -> its current prefix key
+        self._failed: Dict[str, float] = {}  # prefix key -> time to try again
+        self._existing: Optional[Dict[str, Tuple[str, float]]] = None  # display name -> (name, seconds left)
+        # Recently used caches by name, so requests still in flight can be restored
+        self._by_name: "collections.OrderedDict[str, CachedPrefix]" = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"caches": len(self._caches), "hits": self.hits, "misses": self.misses}
+
+    async def __call__(self, callback_context: CallbackContext, llm_request: LlmRequest) -> None:
+        config = llm_request.config
+        if self.backend is None or config is None or config.cached_content:
+            return
+        if not config.system_instruction and not config.tools:
+            return
+
+        model = llm_request.model
+        agent_name = callback_context.agent_name
+        key = prefix_key(model, config)
+        try:
+            cached = await self._cache_for(agent_name, model, key, config)
+        except Exception as e:
+            # Caching only saves tokens; never fail the model call over it
+            logger.warning("Context cache unavailable for %s: %s", agent_name, e)
+            self._failed[key] = time.monotonic() + FAILURE_BACKOFF
+            return
+        if cached is None:
+            return
+
+        config.cached_content = cached.name
+        config.system_instruction = None
+        config.tools = None
+        config.tool_config = None
+
+    def restore(self, llm_request: LlmRequest) -> bool:
+        """Put the full prefix back into a request whose cache is gone, and forget that cache.
+
+        Returns:
+            bool: Whether the request referred to a cache of this manager
+        """
+        config = llm_request.config
+        cached = self._by_name.get(config.cached_content) if config and config.cached_content else None
+        if cached is None:
+            return False
+        logger.warning("Context cache %s is gone; resending the full prefix", cached.name)
+        if self._caches.get(cached.key) is cached:
+            del self._caches[cached.key]
+        config.cached_content = None
+        config.system_instruction = cached.system_instruction
+        config.tools = cached.tools
+        config.tool_config = cached.tool_config
+        return True
+
+    async def _cache_for(
+        self,
+        agent_name: str,
+        model: str,
+        key: str,
+        config: types.GenerateContentConfig,
+    ) -> Optional[CachedPrefix]:
+        """The live cache for this prefix, creating or refreshing it as needed."""
+        previous_key = self._agent_keys.get(agent_name)
+        self._agent_keys[agent_name] = key
+        if previous_key is not None and previous_key != key:
+            self._release(previous_key)
+
+        now = time.monotonic()
+        cached = self._caches.get(key)
+        if cached is not None:
+            if cached.expires_at - now > self.refresh_margin:
+                self.hits += 1
+                return cached
+            if cached.expires_at > now and await self.backend.refresh(cached.name, self.ttl):
+                cached.expires_at = time.monotonic() + self.ttl
+                self.hits += 1
+                return cached
+            # Expired or deleted elsewhere
+            del self._caches[key]
+
+        if self._failed.get(key, 0) > now:
+            return None
+        if estimate_prefix_tokens(config) < self.min_tokens:
+            return None
+
+        self.misses += 1
+        display_name = f"{DISPLAY_NAME_PREFIX}:{agent_name}:{key}"
+        cached = await self._adopt(agent_name, display_name, key)
+        created = cached is None
+        if created:
+            name = await self.backend.create(model, display_name, config, self.ttl)
+            cached = CachedPrefix(name=name, key=key, expires_at=time.monotonic() + self.ttl)
+            logger.info("Created context cache %s for %s", name, agent_name)
+        if key in self._caches:
+            # A concurrent request created or adopted one while this one waited
+            if created:
+                await self.backend.delete(cached.name)
+            return self._caches[key]
+        cached.system_instruction = config.system_instruction
+        cached.tools = config.tools
+        cached.tool_config = config.tool_config
+        self._caches[key] = cached
+        self._by_name[cached.name] = cached
+        while len(self._by_name) > MAX_KNOWN_CACHES:
+            self._by_name.popitem(last=False)
+        return cached
+
+    async def _adopt(self, agent_name: str, display_name: str, key: str) -> Optional[CachedPrefix]:
+        """Reuse a matching cache left by an earlier process, or kept by another one.
+
+        Caches with another key are left alone: another live process may
+        still be using them, and unused ones expire with their TTL.
+        """
+        if self._existing is None:
+            self._existing = {
+                existing_display_name: (name, left)
+                for name, existing_display_name, left in await self.backend.list()
+                if existing_display_name.startswith(f"{DISPLAY_NAME_PREFIX}:")
+            }
+        existing = self._existing.pop(display_name, None)
+        if existing is None:
+            return None
+        name, left = existing
+        if left <= self.refresh_margin or not await self.backend.refresh(name, self.ttl):
+            return None
+        return CachedPrefix(name=name, key=key, expires_at=time.monotonic() + self.ttl)
+
+    def _release(self, key: str) -> None:
+        """Stop using and refreshing a prefix's cache once no agent of this process uses it.
+
+        The cache is not deleted, since other processes may share it; it expires with its TTL.
+        """
+        if key in self._agent_keys.values():
+            return
+        cached = self._caches.pop(key, None)
+        if cached is not None:
+            logger.info("Context cache %s is outdated; letting it expire", cached.name)
+
+    async def clear(self) -> None:
+        """Delete every cache this manager created or adopted.
+
+        Only for shutting down the last process using them.
+        """
+        caches, self._caches = self._caches, {}
+        self._agent_keys.clear()
+        self._by_name.clear()
+        for cached in caches.values():
+            await self.backend.delete(cached.name)
+
+
+def is_cache_error(error: genai_errors.APIError) -> bool:
+    """Whether a model call failed because its cached content is missing or not accessible."""
+    if error.code in (403, 404):
+        return True
+    return error.code == 400 and "cachedcontent" in str(error).lower().replace(" ", "")
+
+
+class CacheAwareGemini(Gemini):
+    """Gemini model that recovers from a cached prefix vanishing between calls.
+
+    If a request that refers to a cache fails with a not-found or permission
+    error before anything was streamed, the full prefix is put back and the
+    request is sent once more without the cache.
+    """
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        yielded = False
+        try:
+            async for response in super().generate_content_async(llm_request, stream):
+                yielded = True
+                yield response
+            return
+        except genai_errors.ClientError as error:
+            if yielded or not is_cache_error(error) or not cache_manager.restore(llm_request):
+                raise
+        async for response in super().generate_content_async(llm_request, stream):
+            yield response
+
+
+def make_backend():
+    """Create the cache backend selected by CONTEXT_CACHE, or None when caching is off."""
+    if BACKEND == "off":
+        return None
+    if BACKEND != "gemini":
+        raise ValueError(f"Unknown CONTEXT_CACHE '{BACKEND}'; use 'gemini' or 'off'.")
+    return GeminiCacheBackend()
+
+
+# Shared by every agent
+cache_manager = ContextCacheManager(make_backend())
@@ -0,0 +1,191 @@
+import datetime
+import logging
+import os
+import tempfile
+import threading
+from typing import List, Optional
+
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import InstalledAppFlow
+
+from .services import invalidate_services
+
+logger = logging.getLogger(__name__)
+
+
+def _utcnow() -> datetime.datetime:
+    """Naive UTC now, matching the naive UTC `expiry` google-auth uses."""
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+class CredentialManager:
+    """Holds OAuth credentials in memory and keeps them fresh in the background.
+
+    The token file is read once. Afterwards credentials are served from memory
+    and refreshed on a timer shortly before they expire, so tool calls never
+    pay for disk reads or token refreshes. Only one refresh runs at a time;
+    concurrent callers that need fresh credentials wait for it and reuse the
+    result. The token file is rewritten atomically, and only when its content
+    actually changed.
+    """
+
+    def __init__(
+        self,
+        token_path: str,
+        scopes: List[str],
+        client_secret_paths: List[str],
+        refresh_margin: float = 300.0,
+        retry_interval: float = 60.0,
+    ):
+        """
+        Args:
+            token_path (str): Path of the token.json file
+            scopes (List[str]): OAuth scopes to request
+            client_secret_paths (List[str]): Candidate credentials.json locations for first-time authorization
+            refresh_margin (float): Seconds before expiry at which to refresh
+            retry_interval (float): Seconds to wait before retrying a failed background refresh
+        """
+        self.token_path = token_path
+        self.scopes = scopes
+        self.client_secret_paths = client_secret_paths
+        self.refresh_margin = refresh_margin
+        self.retry_interval = retry_interval
+
+        self._creds: Optional[Credentials] = None
+        self._saved_json: Optional[str] = None
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+
+    def get(self) -> Credentials:
+        """Return valid credentials, loading or refreshing them only when needed."""
+        creds = self._creds
+        if creds is not None and self._is_fresh(creds):
+            return creds
+
+        with self._lock:
+            # Another caller may have refreshed while we waited for the lock
+            creds = self._creds
+            if creds is None:
+                creds = self._load()
+            if not self._is_fresh(creds):
+                try:
+                    self._refresh(creds)
+                except Exception as e:
+                    logger.warning("Error refreshing token: %s", e)
+                    creds = self._authorize()
+            self._schedule_refresh()
+            return creds
+
+    def stop(self) -> None:
+        """Cancel the background refresh timer."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def _is_fresh(self, creds: Credentials) -> bool:
+        """Whether the credentials can be used right now without a refresh."""
+        return creds.valid
+
+    def _load(self) -> Credentials:
+        """Load credentials from the token file, authorizing interactively if needed.
+
+        Must be called with the lock held.
+        """
+        creds = None
+        if os.path.exists(self.token_path):
+            try:
+                # Loaded with the scopes it was granted, so missing ones can be detected
+                creds = Credentials.from_authorized_user_file(self.token_path)
+                with open(self.token_path) as token:
+                    self._saved_json = token.read()
+                logger.info("Loaded token from %s", self.token_path)
+            except Exception as e:
+                logger.warning("Error loading token: %s", e)
+            if creds is not None and not creds.has_scopes(self.scopes):
+                logger.warning("Token in %s lacks required scopes; asking for consent again", self.token_path)
+                creds = None
+
+        if creds and (creds.valid or creds.refresh_token):
+            self._set_credentials(creds)
+            return creds
+        return self._authorize()
+
+    def _authorize(self) -> Credentials:
+        """Run the interactive OAuth flow. Must be called with the lock held."""
+        client_secret_file = next((p for p in self.client_secret_paths if os.path.exists(p)), None)
+        if not client_secret_file:
+            raise FileNotFoundError("No credentials.json file found in any of the expected locations.")
+
+        logger.info("Using credentials from: %s", client_secret_file)
+        flow = InstalledAppFlow.from_client_secrets_file(client_secret_file, self.scopes)
+        creds = flow.run_local_server(port=0)
+        self._set_credentials(creds)
+        self._save(creds)
+        return creds
+
+    def _set_credentials(self, creds: Credentials) -> None:
+        """Install new credentials; cached API clients for the old ones are dropped."""
+        if self._creds is not None and self._creds is not creds:
+            invalidate_services()
+        self._creds = creds
+
+    def _refresh(self, creds: Credentials) -> None:
+        """Refresh the credentials in place and persist them.
+
+        Must be called with the lock held.
+        """
+        if not creds.refresh_token:
+            raise RuntimeError("Credentials expired and cannot be refreshed; run quickstart.py to re-authorize.")
+        creds.refresh(Request())
+        logger.info("Token refreshed successfully")
+        self._save(creds)
+
+    def _save(self, creds: Credentials) -> None:
+        """Atomically write the token file if its content changed."""
+        data = creds.to_json()
+        if data == self._saved_json:
+            return
+        directory = os.path.dirname(self.token_path) or "."
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".token-", suffix=".json")
+        try:
+            with os.fdopen(fd, "w") as tmp:
+                tmp.write(data)
+            os.replace(tmp_path, self.token_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._saved_json = data
+        logger.info("Credentials saved to %s", self.token_path)
+
+    def _schedule_refresh(self, delay: Optional[float] = None) -> None:
+        """(Re)arm the background refresh timer. Must be called with the lock held."""
+        creds = self._creds
+        if creds is None or not creds.refresh_token:
+            return
+        if delay is None:
+            if creds.expiry is None:
+                return
+            delay = (creds.expiry - _utcnow()).total_seconds() - self.refresh_margin
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(max(delay, 0.0), self._background_refresh)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _background_refresh(self) -> None:
+        """Timer callback: refresh ahead of expiry and schedule the next run."""
+        with self._lock:
+            self._timer = None
+            creds = self._creds
+            if creds is None:
+                return
+            try:
+                self._refresh(creds)
+            except Exception as e:
+                logger.warning("Background token refresh failed: %s", e)
+                self._schedule_refresh(self.retry_interval)
+                return
+            self._schedule_refresh()
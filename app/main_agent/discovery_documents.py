@@ -0,0 +1,133 @@
+import json
+import logging
+import os
+import pickle
+import tempfile
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import httplib2
+from googleapiclient.discovery_cache import get_static_doc
+
+logger = logging.getLogger(__name__)
+
+DISCOVERY_URL = "https://www.googleapis.com/discovery/v1/apis/{api}/{version}/rest"
+
+# Directory holding the local copies; override with GOOGLE_DISCOVERY_CACHE_DIR
+_project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+CACHE_DIR = os.environ.get(
+    "GOOGLE_DISCOVERY_CACHE_DIR",
+    os.path.join(_project_root, ".cache", "discovery")
+)
+
+# Documents are only fetched over the network when explicitly allowed
+ALLOW_NETWORK = os.environ.get("GOOGLE_DISCOVERY_ALLOW_NETWORK", "").lower() in ("1", "true", "yes")
+
+_documents: Dict[Tuple[str, str], Dict[str, Any]] = {}
+_documents_lock = threading.Lock()
+
+
+def _atomic_write(path: str, data: bytes) -> None:
+    """Write a file via a temporary file and rename so readers never see partial content."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            tmp.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _read_pickle(pickle_path: str, json_path: str) -> Optional[Dict[str, Any]]:
+    """Load the pre-parsed document unless it is missing or older than its JSON source."""
+    if not os.path.exists(pickle_path):
+        return None
+    if os.path.exists(json_path) and os.path.getmtime(pickle_path) < os.path.getmtime(json_path):
+        return None
+    try:
+        with open(pickle_path, "rb") as f:
+            document = pickle.load(f)
+    except Exception as e:
+        logger.warning("Ignoring unreadable discovery cache %s: %s", pickle_path, e)
+        return None
+    return document if isinstance(document, dict) else None
+
+
+def _fetch_document(api_name: str, api_version: str) -> Optional[str]:
+    """Fetch the discovery document from Google, if network access is allowed."""
+    if not ALLOW_NETWORK:
+        return None
+    url = DISCOVERY_URL.format(api=api_name, version=api_version)
+    response, content = httplib2.Http().request(url)
+    if response.status >= 400:
+        logger.warning("Fetching discovery document %s failed with HTTP %s", url, response.status)
+        return None
+    return content.decode("utf-8")
+
+
+def _load_document(api_name: str, api_version: str, cache_dir: str) -> Dict[str, Any]:
+    """Load a discovery document from the fastest local source available."""
+    name = f"{api_name}.{api_version}"
+    json_path = os.path.join(cache_dir, f"{name}.json")
+    pickle_path = os.path.join(cache_dir, f"{name}.pickle")
+
+    document = _read_pickle(pickle_path, json_path)
+    if document is not None:
+        return document
+
+    content = None
+    if os.path.exists(json_path):
+        with open(json_path, "r", encoding="utf-8") as f:
+            content = f.read()
+    else:
+        # googleapiclient ships static copies of the common APIs
+        content = get_static_doc(api_name, api_version) or _fetch_document(api_name, api_version)
+        if content is None:
+            raise FileNotFoundError(
+                f"No local discovery document for {name}; place it at {json_path} "
+                "or set GOOGLE_DISCOVERY_ALLOW_NETWORK=1 to download it once."
+            )
+        try:
+            _atomic_write(json_path, content.encode("utf-8"))
+        except OSError as e:
+            logger.warning("Could not persist discovery document %s: %s", json_path, e)
+
+    document = json.loads(content)
+    try:
+        _atomic_write(pickle_path, pickle.dumps(document, protocol=pickle.HIGHEST_PROTOCOL))
+    except OSError as e:
+        logger.warning("Could not persist parsed discovery document %s: %s", pickle_path, e)
+    return document
+
+
+def get_discovery_document(api_name: str, api_version: str, cache_dir: Optional[str] = None) -> Dict[str, Any]:
+    """Return the parsed discovery document for an API without touching the network.
+
+    Documents are looked up, in order, in memory, as a pickled pre-parsed copy
+    in the cache directory, as JSON in the cache directory, and in the static
+    copies bundled with googleapiclient. Whatever is found is persisted to the
+    cache directory so later processes load the pickled form directly. The
+    network is used only as a last resort and only when
+    GOOGLE_DISCOVERY_ALLOW_NETWORK is set.
+
+    Args:
+        api_name (str): The API name, e.g. "gmail"
+        api_version (str): The API version, e.g. "v1"
+        cache_dir (Optional[str]): Directory of the local copies (default CACHE_DIR)
+
+    Returns:
+        dict: The parsed discovery document
+    """
+    key = (api_name, api_version)
+    document = _documents.get(key)
+    if document is not None:
+        return document
+    with _documents_lock:
+        document = _documents.get(key)
+        if document is None:
+            document = _load_document(api_name, api_version, cache_dir or CACHE_DIR)
+            _documents[key] = document
+    return document
@@ -0,0 +1,156 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from .doc_edits import utf16_len
+
+CONTENT_FORMATS = ("plain", "markdown")
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*)$")
+_BULLET = re.compile(r"^\s*[-*+]\s+(.*)$")
+_NUMBERED = re.compile(r"^\s*\d+[.)]\s+(.*)$")
+_TABLE_SEPARATOR = re.compile(r"^\|?\s*:?-+:?\s*(\|\s*:?-+:?\s*)*\|?$")
+
+_BULLET_PRESETS = {
+    "bullet": "BULLET_DISC_CIRCLE_SQUARE",
+    "numbered": "NUMBERED_DECIMAL_ALPHA_ROMAN",
+}
+
+
+def compile_content(content: str, content_format: str = "plain", start_index: int = 1) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Compile document content into one list of Docs batchUpdate requests.
+
+    "markdown" understands a small subset: "#" to "######" headings, "-"/"*"
+    bullet lists, "1." numbered lists and "|"-delimited tables (a "|---|"
+    separator row is skipped). Everything else is inserted as plain text.
+
+    Args:
+        content (str): The document content
+        content_format (str): "plain" or "markdown"
+        start_index (int): Index to insert at; 1 for a new document
+
+    Returns:
+        (requests, text): The requests, in order, and the text they insert
+            before the document's final newline, or None if the content
+            holds a table
+    """
+    if content_format not in CONTENT_FORMATS:
+        raise ValueError(f"Unsupported content_format '{content_format}'; use one of {', '.join(CONTENT_FORMATS)}.")
+    if not content:
+        return [], ""
+    if content_format == "plain":
+        return [{"insertText": {"location": {"index": start_index}, "text": content}}], content
+
+    inserts: List[Dict[str, Any]] = []
+    styles: List[Dict[str, Any]] = []
+    pending: List[str] = []
+    has_table = False
+    index = start_index
+
+    def flush() -> None:
+        nonlocal index
+        if pending:
+            text = "".join(pending)
+            inserts.append({"insertText": {"location": {"index": index}, "text": text}})
+            index += utf16_len(text)
+            pending.clear()
+
+    def add_paragraph(text: str) -> Tuple[int, int]:
+        # The returned range stops before the newline, so styling it cannot
+        # spill into the next paragraph
+        start = index + sum(utf16_len(part) for part in pending)
+        pending.append(text + "\n")
+        return start, start + max(utf16_len(text), 1)
+
+    lines = content.splitlines()
+    position = 0
+    while position < len(lines):
+        line = lines[position]
+
+        if line.lstrip().startswith("|"):
+            rows = []
+            while position < len(lines) and lines[position].lstrip().startswith("|"):
+                if not _TABLE_SEPARATOR.match(lines[position].strip()):
+                    rows.append(_table_cells(lines[position]))
+                position += 1
+            if rows:
+                flush()
+                inserts.extend(_table_requests(index, rows))
+                index += _table_size(rows)
+                has_table = True
+            continue
+
+        heading = _HEADING.match(line)
+        if heading:
+            start, end = add_paragraph(heading.group(2).strip())
+            styles.append({
+                "updateParagraphStyle": {
+                    "range": {"startIndex": start, "endIndex": end},
+                    "paragraphStyle": {"namedStyleType": f"HEADING_{len(heading.group(1))}"},
+                    "fields": "namedStyleType",
+                }
+            })
+            position += 1
+            continue
+
+        for kind, pattern in (("bullet", _BULLET), ("numbered", _NUMBERED)):
+            if pattern.match(line):
+                list_start = list_end = None
+                while position < len(lines) and pattern.match(lines[position]):
+                    start, list_end = add_paragraph(pattern.match(lines[position]).group(1).strip())
+                    list_start = start if list_start is None else list_start
+                    position += 1
+                styles.append({
+                    "createParagraphBullets": {
+                        "range": {"startIndex": list_start, "endIndex": list_end},
+                        "bulletPreset": _BULLET_PRESETS[kind],
+                    }
+                })
+                break
+        else:
+            add_paragraph(line)
+            position += 1
+
+    flush()
+    if has_table:
+        return inserts + styles, None
+    text = "".join(request["insertText"]["text"] for request in inserts)
+    return inserts + styles, text
+
+
+def _table_cells(line: str) -> List[str]:
+    """Cell texts of one "| a | b |" row."""
+    line = line.strip()
+    if line.startswith("|"):
+        line = line[1:]
+    if line.endswith("|"):
+        line = line[:-1]
+    return [cell.strip() for cell in line.split("|")]
+
+
+def _table_requests(index: int, rows: List[List[str]]) -> List[Dict[str, Any]]:
+    """insertTable at index, then fill its cells from the last to the first.
+
+    Docs inserts a newline before the table, so the table starts at index + 1;
+    every row takes one index and every empty cell two, which puts cell (r, c)'s
+    paragraph at index + 4 + r * (1 + 2 * columns) + 2 * c.
+    """
+    columns = max(len(row) for row in rows)
+    requests: List[Dict[str, Any]] = [
+        {"insertTable": {"rows": len(rows), "columns": columns, "location": {"index": index}}}
+    ]
+    for r in reversed(range(len(rows))):
+        for c in reversed(range(len(rows[r]))):
+            if rows[r][c]:
+                requests.append({
+                    "insertText": {
+                        "location": {"index": index + 4 + r * (1 + 2 * columns) + 2 * c},
+                        "text": rows[r][c],
+                    }
+                })
+    return requests
+
+
+def _table_size(rows: List[List[str]]) -> int:
+    """Number of indices a filled table occupies, including the newline before it."""
+    columns = max(len(row) for row in rows)
+    return 2 + len(rows) * (1 + 2 * columns) + sum(utf16_len(cell) for row in rows for cell in row)
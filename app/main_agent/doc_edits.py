@@ -0,0 +1,278 @@
+import difflib
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from googleapiclient.errors import HttpError
+
+# Only what is needed to rebuild the body text and its indices
+DOCUMENT_FIELDS = (
+    "revisionId,"
+    "body(content(startIndex,endIndex,"
+    "paragraph(elements(startIndex,endIndex,textRun(content))),"
+    "table(rows),tableOfContents(content(startIndex))))"
+)
+
+# Stands in for one index of a non-text paragraph element (images, page breaks, ...)
+PLACEHOLDER = "\ufffc"
+
+# Above this many characters a changed block of lines is replaced wholesale
+# instead of being diffed character by character
+CHAR_DIFF_LIMIT = 20_000
+
+
+class DocumentStateCache:
+    """Last known revision, end index and body text of documents edited by the agent.
+
+    Writes based on a cached state carry writeControl.requiredRevisionId, so
+    Docs rejects them if anyone else changed the document in the meantime; the
+    caller then fetches the document and retries.
+    """
+
+    def __init__(self):
+        self._states: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """Return the cached state (revision_id, end_index, text) of a document, or None."""
+        with self._lock:
+            return self._states.get(document_id)
+
+    def put(self, document_id: str, revision_id: Optional[str], end_index: int, text: Optional[str]) -> None:
+        """Remember a document's state; text is None when the body is not plain paragraphs."""
+        with self._lock:
+            if revision_id is None:
+                self._states.pop(document_id, None)
+            else:
+                self._states[document_id] = {"revision_id": revision_id, "end_index": end_index, "text": text}
+
+    def invalidate(self, document_id: str) -> None:
+        """Forget a document, e.g. after deleting it."""
+        with self._lock:
+            self._states.pop(document_id, None)
+
+
+def utf16_len(text: str) -> int:
+    """Length of text in UTF-16 code units, the unit of Docs indices."""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def body_text(document: Dict[str, Any]) -> Tuple[Optional[str], int]:
+    """Rebuild the body text of a document fetched with DOCUMENT_FIELDS.
+
+    Returns:
+        (text, end_index): text is the body as one string, whose UTF-16 offset
+            plus 1 is the document index; it is None if the body holds tables,
+            a table of contents, or section breaks after the first element
+    """
+    content = document.get("body", {}).get("content", [])
+    end_index = content[-1].get("endIndex", 1) if content else 1
+    parts: List[str] = []
+    position = 1
+    for element in content:
+        if "paragraph" in element:
+            for part in element["paragraph"].get("elements", []):
+                if part.get("startIndex", position) != position:
+                    return None, end_index
+                text = part.get("textRun", {}).get("content")
+                if text is None:
+                    text = PLACEHOLDER * (part.get("endIndex", position) - position)
+                parts.append(text)
+                position += utf16_len(text)
+        elif element.get("endIndex", 1) > 1:
+            # Tables, tables of contents and section breaks cannot be diffed as text
+            return None, end_index
+    return "".join(parts), end_index
+
+
+def diff_requests(current: str, desired: str, base_index: int = 1) -> List[Dict[str, Any]]:
+    """Minimal deleteContentRange/insertText requests turning current into desired.
+
+    The requests are ordered from the end of the document to the start, so
+    each one leaves the indices of the ones after it valid.
+
+    Args:
+        current (str): Text currently at base_index
+        desired (str): Text that should be there instead
+        base_index (int): Document index of the first character of current
+
+    Returns:
+        List[dict]: Docs batchUpdate requests, empty if the texts are equal
+    """
+    offsets = _Utf16Offsets(current)
+    spans = [
+        (base_index + offsets.at(i1), base_index + offsets.at(i2), j1, j2)
+        for i1, i2, j1, j2 in _changed_blocks(current, desired)
+    ]
+    requests = []
+    for start, end, j1, j2 in reversed(spans):
+        if end > start:
+            requests.append({"deleteContentRange": {"range": {"startIndex": start, "endIndex": end}}})
+        if j2 > j1:
+            requests.append({"insertText": {"location": {"index": start}, "text": desired[j1:j2]}})
+    return requests
+
+
+def _changed_blocks(a: str, b: str) -> List[Tuple[int, int, int, int]]:
+    """(i1, i2, j1, j2) spans where a[i1:i2] must become b[j1:j2], in order."""
+    # Trim the common prefix and suffix first; most edits touch a small region
+    prefix = 0
+    limit = min(len(a), len(b))
+    while prefix < limit and a[prefix] == b[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and a[len(a) - 1 - suffix] == b[len(b) - 1 - suffix]:
+        suffix += 1
+    a_mid, b_mid = a[prefix:len(a) - suffix], b[prefix:len(b) - suffix]
+    if not a_mid and not b_mid:
+        return []
+
+    # Diff lines, then refine each changed block of lines character by character
+    a_lines, b_lines = a_mid.splitlines(keepends=True), b_mid.splitlines(keepends=True)
+    a_starts, b_starts = _line_starts(a_lines), _line_starts(b_lines)
+    blocks = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a_lines, b_lines).get_opcodes():
+        if tag == "equal":
+            continue
+        a_start, a_end = a_starts[i1], a_starts[i2]
+        b_start, b_end = b_starts[j1], b_starts[j2]
+        if tag == "replace" and (a_end - a_start) + (b_end - b_start) <= CHAR_DIFF_LIMIT:
+            matcher = difflib.SequenceMatcher(None, a_mid[a_start:a_end], b_mid[b_start:b_end], autojunk=False)
+            for char_tag, ci1, ci2, cj1, cj2 in matcher.get_opcodes():
+                if char_tag != "equal":
+                    blocks.append((a_start + ci1, a_start + ci2, b_start + cj1, b_start + cj2))
+        else:
+            blocks.append((a_start, a_end, b_start, b_end))
+    return [(prefix + i1, prefix + i2, prefix + j1, prefix + j2) for i1, i2, j1, j2 in blocks]
+
+
+def _line_starts(lines: List[str]) -> List[int]:
+    """Character offset of each line, plus the total length."""
+    starts = [0]
+    for line in lines:
+        starts.append(starts[-1] + len(line))
+    return starts
+
+
+class _Utf16Offsets:
+    """Maps increasing character positions of a string to UTF-16 offsets."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.position = 0
+        self.offset = 0
+
+    def at(self, position: int) -> int:
+        self.offset += utf16_len(self.text[self.position:position])
+        self.position = position
+        return self.offset
+
+
+def fetch_state(service, document_id: str) -> Tuple[Optional[str], Optional[str], int]:
+    """Fetch a document's revision, body text and end index with a narrow field mask."""
+    document = service.documents().get(documentId=document_id, fields=DOCUMENT_FIELDS).execute()
+    text, end_index = body_text(document)
+    return document.get("revisionId"), text, end_index
+
+
+def is_revision_conflict(error: HttpError) -> bool:
+    """Whether a batchUpdate failed because requiredRevisionId no longer matches."""
+    return error.resp.status == 400 and "revision" in str(error).lower()
+
+
+def batch_update(service, document_id: str, requests: List[Dict[str, Any]], revision_id: Optional[str]) -> Optional[str]:
+    """Apply requests, guarded by revision_id when given; returns the new revision ID."""
+    body: Dict[str, Any] = {"requests": requests}
+    if revision_id:
+        body["writeControl"] = {"requiredRevisionId": revision_id}
+    response = service.documents().batchUpdate(documentId=document_id, body=body).execute()
+    return response.get("writeControl", {}).get("requiredRevisionId")
+
+
+def append_text(service, cache: DocumentStateCache, document_id: str, content: str) -> int:
+    """Insert content before the final newline of a document.
+
+    Uses the cached end index when there is one, so no GET is needed; a
+    revision conflict refreshes the state and retries once.
+
+    Returns:
+        int: Number of batchUpdate requests sent
+    """
+    state = cache.get(document_id)
+    for attempt in range(2):
+        if state is None:
+            revision_id, text, end_index = fetch_state(service, document_id)
+            state = {"revision_id": revision_id, "end_index": end_index, "text": text}
+        try:
+            new_revision = batch_update(
+                service,
+                document_id,
+                [{"insertText": {"location": {"index": state["end_index"] - 1}, "text": content}}],
+                state["revision_id"],
+            )
+        except HttpError as error:
+            if attempt == 0 and is_revision_conflict(error):
+                cache.invalidate(document_id)
+                state = None
+                continue
+            cache.invalidate(document_id)
+            raise
+        text = state["text"]
+        cache.put(
+            document_id,
+            new_revision,
+            state["end_index"] + utf16_len(content),
+            None if text is None else text[:-1] + content + text[-1:],
+        )
+        return 1
+    return 0
+
+
+def replace_text(service, cache: DocumentStateCache, document_id: str, content: str) -> int:
+    """Make the document body read content, sending only the changed ranges.
+
+    Diffs against the cached body text when it is known, otherwise against a
+    narrow GET; a revision conflict refreshes the state and retries once.
+    Documents with tables or other structure fall back to deleting and
+    reinserting the whole body.
+
+    Returns:
+        int: Number of batchUpdate requests sent (0 when nothing changed)
+    """
+    state = cache.get(document_id)
+    for attempt in range(2):
+        if state is None or state["text"] is None:
+            revision_id, text, end_index = fetch_state(service, document_id)
+            state = {"revision_id": revision_id, "end_index": end_index, "text": text}
+
+        text = state["text"]
+        if text is None:
+            requests = []
+            if state["end_index"] > 2:
+                requests.append({"deleteContentRange": {"range": {"startIndex": 1, "endIndex": state["end_index"] - 1}}})
+            if content:
+                requests.append({"insertText": {"location": {"index": 1}, "text": content}})
+        else:
+            # The body always ends with a newline that cannot be deleted
+            requests = diff_requests(text[:-1], content)
+        if not requests:
+            return 0
+
+        try:
+            new_revision = batch_update(service, document_id, requests, state["revision_id"])
+        except HttpError as error:
+            if attempt == 0 and is_revision_conflict(error):
+                cache.invalidate(document_id)
+                state = None
+                continue
+            cache.invalidate(document_id)
+            raise
+        if text is None:
+            cache.invalidate(document_id)
+        else:
+            cache.put(document_id, new_revision, 1 + utf16_len(content) + 1, content + "\n")
+        return len(requests)
+    return 0
+
+
+# Shared by all docs tools
+document_state_cache = DocumentStateCache()
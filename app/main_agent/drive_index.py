@@ -0,0 +1,288 @@
+import datetime
+import difflib
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from .background_sync import BackgroundSync
+
+logger = logging.getLogger(__name__)
+
+_project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+INDEX_PATH = os.environ.get(
+    "DRIVE_INDEX_PATH",
+    os.path.join(_project_root, ".cache", "drive_index.sqlite3")
+)
+
+# The index is opt-in: the initial build lists every file in the Drive
+ENABLED = os.environ.get("DRIVE_INDEX", "").lower() in ("1", "true", "yes")
+
+# Seconds between two change syncs
+SYNC_INTERVAL = float(os.environ.get("DRIVE_INDEX_SYNC_INTERVAL", "30"))
+
+FILE_FIELDS = "id,name,mimeType,modifiedTime,parents,description,trashed"
+MATCH_MODES = ("contains", "prefix", "fuzzy")
+
+# Minimum similarity (0-1) for a fuzzy match
+FUZZY_CUTOFF = 0.7
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    name_lower TEXT NOT NULL,
+    mime_type TEXT,
+    modified_time TEXT,
+    parents TEXT NOT NULL DEFAULT '[]',
+    description TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS files_by_name ON files (name_lower);
+CREATE INDEX IF NOT EXISTS files_by_type ON files (mime_type, name_lower);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class DriveIndex(BackgroundSync):
+    """Local index of Drive file metadata for fast name lookups.
+
+    The first sync lists every non-trashed file. A background thread then
+    applies Drive changes.list deltas from the stored page token every
+    `interval` seconds, so name searches are answered from SQLite without a
+    network round trip. The agent's own creations and deletions are applied
+    at once through record_file() and forget_file().
+    """
+
+    thread_name = "drive-index-sync"
+
+    def __init__(
+        self,
+        service_factory: Callable[[], Any],
+        path: str = INDEX_PATH,
+        interval: float = SYNC_INTERVAL,
+    ):
+        """
+        Args:
+            service_factory (Callable): Returns the Drive v3 API service to use
+            path (str): SQLite database file
+            interval (float): Seconds between two change syncs
+        """
+        super().__init__(interval)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.service_factory = service_factory
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def is_ready(self) -> bool:
+        """Whether the index is complete and was synced recently enough to answer searches."""
+        return self._get_state("page_token") is not None and self.synced_recently()
+
+    def _sync(self) -> None:
+        """Build the index if needed, otherwise apply the changes since the last sync."""
+        service = self.service_factory()
+        if self._get_state("page_token") is None:
+            self._full_build(service)
+        else:
+            self._apply_changes(service)
+
+    def _full_build(self, service) -> None:
+        """List every non-trashed file into the index."""
+        # Take the change token first so edits made during the listing are replayed later
+        start_token = service.changes().getStartPageToken().execute()["startPageToken"]
+        with self._lock:
+            self._conn.execute("DELETE FROM files")
+        page_token = None
+        while True:
+            response = service.files().list(
+                q="trashed = false",
+                pageSize=1000,
+                pageToken=page_token,
+                fields=f"nextPageToken,files({FILE_FIELDS})"
+            ).execute()
+            for file in response.get("files", []):
+                self.upsert(file)
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                break
+        self._set_state("page_token", start_token)
+        logger.info("Drive index built")
+
+    def _apply_changes(self, service) -> None:
+        """Replay changes.list from the stored page token."""
+        page_token = self._get_state("page_token")
+        while page_token:
+            response = service.changes().list(
+                pageToken=page_token,
+                pageSize=1000,
+                fields=f"nextPageToken,newStartPageToken,changes(fileId,removed,file({FILE_FIELDS}))"
+            ).execute()
+            for change in response.get("changes", []):
+                file = change.get("file")
+                if change.get("removed") or file is None or file.get("trashed"):
+                    self.delete(change["fileId"])
+                else:
+                    self.upsert(file)
+            if "newStartPageToken" in response:
+                self._set_state("page_token", response["newStartPageToken"])
+                return
+            page_token = response.get("nextPageToken")
+            self._set_state("page_token", page_token)
+
+    def search(
+        self,
+        name_query: str,
+        mime_type: Optional[str] = None,
+        max_results: int = 10,
+        match_mode: str = "contains",
+    ) -> List[Dict[str, Any]]:
+        """Search indexed files by name.
+
+        Args:
+            name_query (str): Name or partial name to look for (case-insensitive)
+            mime_type (Optional[str]): Only files of this MIME type
+            max_results (int): Maximum number of files to return
+            match_mode (str): "contains" (substring), "prefix", or "fuzzy"
+                (closest names, tolerating typos)
+
+        Returns:
+            List[dict]: Files with id, name, description, mimeType, modifiedTime and parents
+        """
+        if match_mode not in MATCH_MODES:
+            raise ValueError(f"Unsupported match_mode '{match_mode}'; use one of {', '.join(MATCH_MODES)}.")
+        query = name_query.lower()
+        clauses, params = [], []
+        if mime_type:
+            clauses.append("mime_type = ?")
+            params.append(mime_type)
+        if match_mode != "fuzzy":
+            escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            clauses.append("name_lower LIKE ? ESCAPE '\\'")
+            params.append(f"{escaped}%" if match_mode == "prefix" else f"%{escaped}%")
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        limit = "" if match_mode == "fuzzy" else f"LIMIT {int(max_results)}"
+        with self._lock:
+            rows = self._conn.execute(
+                f"""SELECT id, name, name_lower, mime_type, modified_time, parents, description
+                    FROM files {where} ORDER BY modified_time DESC {limit}""",
+                params,
+            ).fetchall()
+
+        if match_mode == "fuzzy":
+            scored = [(_fuzzy_score(query, row[2]), row) for row in rows]
+            scored = [item for item in scored if item[0] >= FUZZY_CUTOFF]
+            scored.sort(key=lambda item: item[0], reverse=True)
+            rows = [row for _, row in scored[:max_results]]
+
+        return [
+            {
+                "id": file_id,
+                "name": name,
+                "description": description,
+                "mimeType": mime,
+                "modifiedTime": modified_time,
+                "parents": json.loads(parents),
+            }
+            for file_id, name, _, mime, modified_time, parents, description in rows
+        ]
+
+    def upsert(self, file: Dict[str, Any]) -> None:
+        """Insert or update one file's metadata."""
+        with self._lock:
+            self._conn.execute(
+                """INSERT INTO files (id, name, name_lower, mime_type, modified_time, parents, description)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(id) DO UPDATE SET
+                       name = excluded.name,
+                       name_lower = excluded.name_lower,
+                       mime_type = excluded.mime_type,
+                       modified_time = excluded.modified_time,
+                       parents = excluded.parents,
+                       description = excluded.description""",
+                (
+                    file["id"],
+                    file.get("name", ""),
+                    file.get("name", "").lower(),
+                    file.get("mimeType"),
+                    file.get("modifiedTime"),
+                    json.dumps(file.get("parents", [])),
+                    file.get("description", ""),
+                ),
+            )
+
+    def delete(self, file_id: str) -> None:
+        """Remove one file from the index."""
+        with self._lock:
+            self._conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    def _get_state(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_state(self, key: str, value: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO sync_state (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, value),
+            )
+
+
+def _fuzzy_score(query: str, name: str) -> float:
+    """Similarity of a query to a name, 1.0 for an exact substring.
+
+    The query is compared to the whole name, each word and the name's
+    leading characters, so a short misspelled query still matches a long name.
+    """
+    if query in name:
+        return 1.0
+    candidates = [name, name[:len(query)]] + name.split()
+    return max(difflib.SequenceMatcher(None, query, candidate).ratio() for candidate in candidates)
+
+
+_drive_index: Optional[DriveIndex] = None
+_drive_index_lock = threading.Lock()
+
+
+def get_drive_index(service_factory: Callable[[], Any]) -> Optional[DriveIndex]:
+    """Return the process-wide Drive index, starting its sync on first use.
+
+    Returns None unless DRIVE_INDEX is enabled.
+    """
+    global _drive_index
+    if not ENABLED:
+        return None
+    if _drive_index is None:
+        with _drive_index_lock:
+            if _drive_index is None:
+                _drive_index = DriveIndex(service_factory)
+                _drive_index.start()
+    return _drive_index
+
+
+def record_file(file: Dict[str, Any]) -> None:
+    """Add or update a file the agent itself created, without waiting for the next change sync.
+
+    Args:
+        file (dict): Drive file metadata; at least id, name and mimeType
+    """
+    if _drive_index is not None:
+        _drive_index.upsert({"modifiedTime": _now_rfc3339(), **file})
+
+
+def forget_file(file_id: str) -> None:
+    """Remove a file the agent itself deleted, without waiting for the next change sync."""
+    if _drive_index is not None:
+        _drive_index.delete(file_id)
+
+
+def _now_rfc3339() -> str:
+    """The current time as Drive formats modifiedTime, so new files sort first."""
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
@@ -0,0 +1,280 @@
+"""Keeps the conversation history sent to the model within a token budget.
+
+Installed as a before_model_callback. The most recent turns always reach the
+model unchanged. In older turns, large tool results are replaced by a short
+preview and a reference the model can pass to expand_tool_result; if the
+request is still over budget, the oldest turns are dropped and replaced by a
+one-line-per-turn digest of what the user asked.
+
+Elided results are kept per session: in memory, and in the session database
+when sessions are stored in SQLite, so they can still be expanded after a
+restart.
+"""
+import asyncio
+import collections
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest
+from google.adk.tools import ToolContext
+from google.genai import types
+
+from . import session_store
+
+# Rough size of a token, in characters of text or JSON
+CHARS_PER_TOKEN = 4
+
+# Default budget for the history of one model request; per agent override
+# with e.g. HISTORY_TOKEN_BUDGET_EMAIL_ASSISTANT_AGENT=16000
+DEFAULT_TOKEN_BUDGET = int(os.environ.get("HISTORY_TOKEN_BUDGET", "32000"))
+
+# Turns at the end of the history that are never compacted
+KEEP_RECENT_TURNS = int(os.environ.get("HISTORY_KEEP_RECENT_TURNS", "2"))
+
+# Tool results larger than this (in characters) are elided from older turns
+MAX_TOOL_RESULT_CHARS = int(os.environ.get("HISTORY_MAX_TOOL_RESULT_CHARS", "2000"))
+
+PREVIEW_CHARS = 300
+# Elided results kept in memory per session, and sessions kept in memory
+STORE_SIZE = 200
+STORE_SESSIONS = 256
+# Days elided results are kept in the session database
+RESULT_RETENTION_DAYS = 30
+
+
+def estimate_tokens(content: types.Content) -> int:
+    """Approximate token count of one content."""
+    chars = 0
+    for part in content.parts or []:
+        if part.text:
+            chars += len(part.text)
+        elif part.function_call:
+            chars += len(json.dumps(part.function_call.args or {}, default=str))
+        elif part.function_response:
+            chars += len(json.dumps(part.function_response.response or {}, default=str))
+    return chars // CHARS_PER_TOKEN + 1
+
+
+def result_reference(name: str, response: Dict[str, Any]) -> str:
+    """Stable reference for a tool result: the tool name plus a hash of the result."""
+    digest = hashlib.sha1(json.dumps(response, sort_keys=True, default=str).encode()).hexdigest()[:16]
+    return f"{name}:{digest}"
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS elided_results (
+    scope TEXT NOT NULL,
+    reference TEXT NOT NULL,
+    response TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (scope, reference)
+);
+"""
+
+
+class ElidedResultStore:
+    """Full results of elided tool calls, by session scope and reference.
+
+    Recent sessions are cached in memory; with a database, results are also
+    written to the elided_results table and looked up there by primary key.
+    The database is opened, and old results pruned, on first use.
+    """
+
+    def __init__(self, path: Optional[str] = None, pool_size: int = 2):
+        """
+        Args:
+            path (Optional[str]): Database file to persist results in, or None for memory only
+            pool_size (int): Maximum number of open connections
+        """
+        self.pool = session_store.ConnectionPool(path, pool_size, schema=_SCHEMA) if path else None
+        self._sessions: "collections.OrderedDict[str, collections.OrderedDict[str, Dict[str, Any]]]" = (
+            collections.OrderedDict()
+        )
+        self._lock = threading.Lock()
+        self._pruned = False
+
+    def remember(self, scope: str, reference: str, response: Dict[str, Any]) -> bool:
+        """Keep a result in memory; True if it was not there yet and still needs saving."""
+        with self._lock:
+            results = self._sessions.get(scope)
+            if results is None:
+                results = self._sessions[scope] = collections.OrderedDict()
+            self._sessions.move_to_end(scope)
+            while len(self._sessions) > STORE_SESSIONS:
+                self._sessions.popitem(last=False)
+            new = reference not in results
+            results[reference] = response
+            results.move_to_end(reference)
+            while len(results) > STORE_SIZE:
+                results.popitem(last=False)
+            return new
+
+    def save(self, scope: str, results: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """Persist results; blocking, so call it from a worker thread."""
+        if self.pool is None or not results:
+            return
+        now = time.time()
+        with self.pool.transaction() as conn:
+            if not self._pruned:
+                conn.execute("DELETE FROM elided_results WHERE created < ?", (now - RESULT_RETENTION_DAYS * 86400,))
+                self._pruned = True
+            conn.executemany(
+                "INSERT OR IGNORE INTO elided_results (scope, reference, response, created) VALUES (?, ?, ?, ?)",
+                [(scope, reference, json.dumps(response, default=str), now) for reference, response in results]
+            )
+
+    def recall(self, scope: str, reference: str) -> Optional[Dict[str, Any]]:
+        """A session's elided result, from memory or the database; blocking on a memory miss."""
+        with self._lock:
+            response = self._sessions.get(scope, {}).get(reference)
+        if response is not None or self.pool is None:
+            return response
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT response FROM elided_results WHERE scope = ? AND reference = ?",
+                (scope, reference)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+
+class HistoryCompactor:
+    """before_model_callback that compacts the history of each model request."""
+
+    def __init__(
+        self,
+        budgets: Optional[Dict[str, int]] = None,
+        default_budget: int = DEFAULT_TOKEN_BUDGET,
+        keep_recent_turns: int = KEEP_RECENT_TURNS,
+        max_tool_result_chars: int = MAX_TOOL_RESULT_CHARS,
+        store: Optional[ElidedResultStore] = None,
+    ):
+        """
+        Args:
+            budgets (Optional[dict]): Token budget per agent name; agents not
+                listed use HISTORY_TOKEN_BUDGET_<AGENT NAME> or default_budget
+            default_budget (int): Token budget for other agents
+            keep_recent_turns (int): Turns at the end that are never compacted
+            max_tool_result_chars (int): Older tool results above this size are elided
+            store (Optional[ElidedResultStore]): Where elided results are kept (default: memory only)
+        """
+        self.budgets = budgets or {}
+        self.default_budget = default_budget
+        self.keep_recent_turns = keep_recent_turns
+        self.max_tool_result_chars = max_tool_result_chars
+        self.store = store or ElidedResultStore()
+
+    def budget_for(self, agent_name: str) -> int:
+        """Token budget of an agent's history."""
+        if agent_name in self.budgets:
+            return self.budgets[agent_name]
+        return int(os.environ.get(f"HISTORY_TOKEN_BUDGET_{agent_name.upper()}", self.default_budget))
+
+    async def __call__(self, callback_context: CallbackContext, llm_request: LlmRequest) -> None:
+        contents = llm_request.contents
+        turn_starts = [i for i, content in enumerate(contents) if _is_turn_start(content)]
+        if len(turn_starts) <= self.keep_recent_turns:
+            return
+        # Everything before this index belongs to older turns
+        boundary = turn_starts[-self.keep_recent_turns] if self.keep_recent_turns else len(contents)
+
+        scope = session_store.session_scope(callback_context)
+        unsaved: List[Tuple[str, Dict[str, Any]]] = []
+        older = [self._elide_results(content, scope, unsaved) for content in contents[:boundary]]
+        if unsaved:
+            await asyncio.to_thread(self.store.save, scope, unsaved)
+        recent = contents[boundary:]
+        budget = self.budget_for(callback_context.agent_name)
+        total = sum(estimate_tokens(content) for content in older + recent)
+
+        # Drop the oldest turns, one at a time, until the request fits
+        dropped: List[types.Content] = []
+        while older and total > budget:
+            end = next((i for i in range(1, len(older)) if _is_turn_start(older[i])), len(older))
+            total -= sum(estimate_tokens(content) for content in older[:end])
+            dropped.extend(older[:end])
+            older = older[end:]
+
+        compacted = older + recent
+        if dropped:
+            digest = _digest(dropped)
+            first = compacted[0]
+            compacted[0] = types.Content(role=first.role, parts=[types.Part(text=digest)] + list(first.parts or []))
+        llm_request.contents = compacted
+
+    def _elide_results(
+        self,
+        content: types.Content,
+        scope: str,
+        unsaved: List[Tuple[str, Dict[str, Any]]],
+    ) -> types.Content:
+        """Copy of content with large tool results replaced by references.
+
+        Results elided for the first time are added to unsaved.
+        """
+        parts = []
+        changed = False
+        for part in content.parts or []:
+            response = part.function_response.response if part.function_response else None
+            if response is not None:
+                serialized = json.dumps(response, default=str)
+                if len(serialized) > self.max_tool_result_chars:
+                    name = part.function_response.name
+                    reference = result_reference(name, response)
+                    if self.store.remember(scope, reference, response):
+                        unsaved.append((reference, response))
+                    part = types.Part(function_response=types.FunctionResponse(
+                        name=name,
+                        response={
+                            "status": response.get("status", "unknown") if isinstance(response, dict) else "unknown",
+                            "elided": True,
+                            "preview": serialized[:PREVIEW_CHARS],
+                            "reference": reference,
+                            "message": f"Result elided to save space ({len(serialized)} characters); "
+                                       "call expand_tool_result with this reference to see it in full.",
+                        },
+                    ))
+                    changed = True
+            parts.append(part)
+        return types.Content(role=content.role, parts=parts) if changed else content
+
+
+def _is_turn_start(content: types.Content) -> bool:
+    """Whether a content opens a new turn: user text rather than a tool result."""
+    return content.role == "user" and any(part.text for part in content.parts or [])
+
+
+def _digest(contents: List[types.Content]) -> str:
+    """One line per dropped user message, so the model keeps the gist of earlier turns."""
+    requests = []
+    for content in contents:
+        if _is_turn_start(content):
+            text = " ".join(part.text for part in content.parts if part.text).strip().replace("\n", " ")
+            requests.append(f"- {text[:200]}")
+    return "Earlier parts of this conversation were removed to save space. The user had asked:\n" + "\n".join(requests)
+
+
+# Shared by every agent; results persist alongside SQLite sessions
+compactor = HistoryCompactor(store=ElidedResultStore(
+    session_store.DB_PATH if session_store.BACKEND == "sqlite" else None
+))
+
+
+async def expand_tool_result(reference: str, tool_context: ToolContext) -> dict:
+    """Returns the full result of an earlier tool call that was elided from the conversation.
+
+    Args:
+        reference (str): The reference given in the elided result (e.g., "get_email_by_id:0123abcd...")
+
+    Returns:
+        dict: Status and the original result
+    """
+    scope = session_store.session_scope(tool_context)
+    response = await asyncio.to_thread(compactor.store.recall, scope, reference)
+    if response is None:
+        return {"status": "error", "message": f"No earlier result found for reference {reference}."}
+    return {"status": "success", "result": response}
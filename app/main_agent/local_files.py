@@ -0,0 +1,46 @@
+"""Access to local files named by the model.
+
+Tool arguments come from the model, and the model can be steered by the
+content it reads (an email, a document), so a tool must never open an
+arbitrary path it is given. Files are only read from an allowlisted
+directory, and only with the expected extensions.
+"""
+import os
+from typing import Optional, Sequence
+
+_project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+# Directory bulk_append_sheet_rows may read CSV and Parquet files from
+UPLOAD_DIR = os.environ.get("UPLOAD_DIR", os.path.join(_project_root, "uploads"))
+
+# Directory send_email and send_bulk_email may attach files from
+ATTACHMENT_DIR = os.environ.get("ATTACHMENT_DIR", UPLOAD_DIR)
+
+
+def resolve_allowed_path(file_path: str, directory: str, extensions: Optional[Sequence[str]] = None) -> str:
+    """Resolve a file path and check that it stays inside directory.
+
+    Relative paths are taken relative to directory. Symbolic links are
+    resolved first, so a link inside the directory cannot point outside it.
+
+    Args:
+        file_path (str): The path given by the model
+        directory (str): The only directory files may be read from
+        extensions (Optional[Sequence[str]]): Allowed lowercase suffixes, e.g. (".csv",)
+
+    Returns:
+        str: The resolved absolute path of an existing file
+
+    Raises:
+        PermissionError: If the path is outside directory or has another extension
+        FileNotFoundError: If there is no such file
+    """
+    root = os.path.realpath(directory)
+    resolved = os.path.realpath(os.path.join(root, os.path.expanduser(file_path)))
+    if os.path.commonpath([root, resolved]) != root:
+        raise PermissionError(f"{file_path} is outside the allowed directory {root}.")
+    if extensions is not None and not resolved.lower().endswith(tuple(extensions)):
+        raise PermissionError(f"{file_path} must be one of these file types: {', '.join(extensions)}.")
+    if not os.path.isfile(resolved):
+        raise FileNotFoundError(f"File {file_path} not found.")
+    return resolved
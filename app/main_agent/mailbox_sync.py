@@ -0,0 +1,159 @@
+import logging
+import os
+import threading
+from typing import Callable, List, Optional
+
+from .background_sync import BackgroundSync
+from .message_cache import ALL_HISTORY_TYPES, MessageCache, get_message_cache
+
+logger = logging.getLogger(__name__)
+
+# The mirror is opt-in: the initial pull downloads metadata for the whole mailbox
+ENABLED = os.environ.get("GMAIL_MAILBOX_SYNC", "").lower() in ("1", "true", "yes")
+
+# Seconds between two incremental syncs
+SYNC_INTERVAL = float(os.environ.get("GMAIL_MAILBOX_SYNC_INTERVAL", "30"))
+
+# Page size used for the initial listing (the Gmail maximum)
+LIST_PAGE_SIZE = 500
+
+
+class MailboxSync(BackgroundSync):
+    """Keeps a local mirror of the mailbox's message metadata up to date.
+
+    The first run lists every message and stores its metadata in the message
+    cache. After that a background thread replays users.history.list deltas
+    (messages added and deleted, labels added and removed) every
+    `interval` seconds, so searches such as sender/date/unread filters and
+    unread counts can be answered from the local, indexed store instead of
+    the Gmail search API.
+    """
+
+    thread_name = "gmail-mailbox-sync"
+
+    def __init__(
+        self,
+        service_factory: Callable[[], object],
+        fetch_metadata: Callable[[object, List[str]], List[tuple]],
+        fetch_labels: Optional[Callable[[object, List[str]], List[tuple]]] = None,
+        cache: Optional[MessageCache] = None,
+        interval: float = SYNC_INTERVAL,
+    ):
+        """
+        Args:
+            service_factory (Callable): Returns the Gmail API service to use
+            fetch_metadata (Callable): fetch_metadata(service, ids) returns one
+                (message, error) pair per ID, with messages in the cache's metadata format
+            fetch_labels (Optional[Callable]): Like fetch_metadata, with messages holding
+                only id and labelIds; refreshes messages cached before the mirror
+                started (default fetch_metadata)
+            cache (Optional[MessageCache]): Store to mirror into (default: the shared cache)
+            interval (float): Seconds between two incremental syncs
+        """
+        super().__init__(interval)
+        self.service_factory = service_factory
+        self.fetch_metadata = fetch_metadata
+        self.fetch_labels = fetch_labels or fetch_metadata
+        self.cache = cache or get_message_cache()
+
+    def is_ready(self) -> bool:
+        """Whether the mirror is complete and was synced recently enough to answer queries."""
+        return self.cache.get_state("mirror_complete") == "1" and self.synced_recently()
+
+    def _sync(self) -> None:
+        """Run the initial pull if the mirror is incomplete, otherwise apply the latest deltas."""
+        service = self.service_factory()
+        if self.cache.get_state("mirror_complete") != "1":
+            self._full_pull(service)
+        else:
+            added_ids = self.cache.sync(service, force=True, history_types=ALL_HISTORY_TYPES)
+            self._store(service, added_ids)
+
+    def _full_pull(self, service) -> None:
+        """List every message and store the metadata of those not cached yet.
+
+        Messages cached earlier (lazily, or by an interrupted pull) are brought
+        up to date first by replaying history from the stored historyId. If
+        there is none, or Gmail no longer has that history, their labels are
+        fetched again while listing.
+        """
+        refresh_cached = True
+        if self.cache.get_state("history_id") is not None:
+            added_ids = self.cache.sync(service, force=True, history_types=ALL_HISTORY_TYPES)
+            # An expired history clears the cache and its historyId
+            refresh_cached = self.cache.get_state("history_id") is None
+            self._store(service, added_ids)
+        if refresh_cached:
+            # Record the starting point first so changes made during the pull
+            # are picked up by the first incremental sync
+            profile = service.users().getProfile(userId="me", fields="historyId").execute()
+            self.cache.set_state("history_id", profile["historyId"])
+
+        page_token = None
+        total = 0
+        while not self._stop.is_set():
+            response = service.users().messages().list(
+                userId="me",
+                maxResults=LIST_PAGE_SIZE,
+                pageToken=page_token,
+                fields="messages(id),nextPageToken"
+            ).execute()
+            message_ids = [message["id"] for message in response.get("messages", [])]
+            cached = self.cache.get_many(message_ids)
+            self._store(service, [message_id for message_id in message_ids if message_id not in cached])
+            if refresh_cached:
+                self._refresh_labels(service, list(cached))
+            total += len(message_ids)
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                self.cache.set_state("mirror_complete", "1")
+                logger.info("Gmail mailbox mirror complete (%d messages)", total)
+                return
+
+    def _refresh_labels(self, service, message_ids: List[str]) -> None:
+        """Fetch the current labels of cached messages; drop those deleted since."""
+        if not message_ids:
+            return
+        for message_id, (message, error) in zip(message_ids, self.fetch_labels(service, message_ids)):
+            if error is None:
+                self.cache.set_labels(message_id, message.get("labelIds", []))
+            elif getattr(getattr(error, "resp", None), "status", None) == 404:
+                self.cache.delete(message_id)
+            else:
+                logger.debug("Could not refresh labels of message %s: %s", message_id, error)
+
+    def _store(self, service, message_ids: List[str]) -> None:
+        """Fetch and cache the metadata of the given messages."""
+        if not message_ids:
+            return
+        for message_id, (message, error) in zip(message_ids, self.fetch_metadata(service, message_ids)):
+            if error is not None:
+                # Deleted between listing and fetching, or a transient error;
+                # the next full pull or history replay will catch up
+                logger.debug("Skipping message %s: %s", message_id, error)
+                continue
+            self.cache.put(message)
+
+
+_mailbox_sync: Optional[MailboxSync] = None
+_mailbox_sync_lock = threading.Lock()
+
+
+def get_mailbox_sync(
+    service_factory: Callable[[], object],
+    fetch_metadata: Callable[[object, List[str]], List[tuple]],
+    fetch_labels: Optional[Callable[[object, List[str]], List[tuple]]] = None,
+) -> Optional[MailboxSync]:
+    """Return the process-wide mailbox sync, starting it on first use.
+
+    Returns None unless GMAIL_MAILBOX_SYNC is enabled.
+    """
+    global _mailbox_sync
+    if not ENABLED:
+        return None
+    if _mailbox_sync is None:
+        with _mailbox_sync_lock:
+            if _mailbox_sync is None:
+                _mailbox_sync = MailboxSync(service_factory, fetch_metadata, fetch_labels)
+                _mailbox_sync.start()
+    return _mailbox_sync
@@ -0,0 +1,410 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from googleapiclient.errors import HttpError
+
+logger = logging.getLogger(__name__)
+
+_project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+CACHE_PATH = os.environ.get(
+    "GMAIL_CACHE_PATH",
+    os.path.join(_project_root, ".cache", "gmail_messages.sqlite3")
+)
+
+# Minimum number of seconds between two history syncs
+SYNC_INTERVAL = float(os.environ.get("GMAIL_CACHE_SYNC_INTERVAL", "10"))
+
+# History record types that only change the state of already known messages
+LABEL_HISTORY_TYPES = ["labelAdded", "labelRemoved", "messageDeleted"]
+# History record types needed to mirror the whole mailbox
+ALL_HISTORY_TYPES = ["messageAdded"] + LABEL_HISTORY_TYPES
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id TEXT PRIMARY KEY,
+    thread_id TEXT,
+    label_ids TEXT NOT NULL DEFAULT '[]',
+    metadata TEXT,
+    full TEXT
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Columns used to answer email queries locally, added to older databases on open
+_INDEX_COLUMNS = {
+    "sender": "TEXT",
+    "subject": "TEXT",
+    "internal_date": "INTEGER",
+    "unread": "INTEGER NOT NULL DEFAULT 0",
+    "hidden": "INTEGER NOT NULL DEFAULT 0",
+}
+
+_INDEXES = """
+CREATE INDEX IF NOT EXISTS messages_by_date ON messages (hidden, internal_date DESC);
+CREATE INDEX IF NOT EXISTS messages_unread ON messages (hidden, unread, internal_date DESC);
+"""
+
+
+def _label_flags(label_ids: List[str]) -> tuple:
+    """(unread, hidden) flags for a label list; spam and trash are hidden from searches."""
+    unread = int("UNREAD" in label_ids)
+    hidden = int("SPAM" in label_ids or "TRASH" in label_ids)
+    return unread, hidden
+
+
+def _index_values(message: Dict[str, Any]) -> tuple:
+    """(sender, subject, internal_date) of a message resource, lower-cased for matching."""
+    headers = message.get("payload", {}).get("headers", [])
+    sender = next((h["value"] for h in headers if h["name"].lower() == "from"), "")
+    subject = next((h["value"] for h in headers if h["name"].lower() == "subject"), "")
+    internal_date = message.get("internalDate")
+    return sender.lower(), subject.lower(), int(internal_date) if internal_date else None
+
+
+class MessageCache:
+    """On-disk cache of Gmail messages keyed by message ID.
+
+    Message content never changes once sent, so it is stored once and served
+    locally from then on. The only mutable part, the label list, is kept
+    fresh by replaying users.history.list from the last seen historyId.
+    Metadata-only and full messages are stored separately, so a listing entry
+    never stands in for a full body.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, sync_interval: float = SYNC_INTERVAL):
+        """
+        Args:
+            path (str): SQLite database file
+            sync_interval (float): Minimum seconds between two history syncs
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.sync_interval = sync_interval
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._migrate()
+        self._last_sync = 0.0
+
+    def _migrate(self) -> None:
+        """Add the query columns and indexes to databases created before they existed."""
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(messages)")}
+        for name, declaration in _INDEX_COLUMNS.items():
+            if name not in existing:
+                self._conn.execute(f"ALTER TABLE messages ADD COLUMN {name} {declaration}")
+        self._conn.executescript(_INDEXES)
+
+    # -- messages --------------------------------------------------------
+
+    def get(self, message_id: str, full: bool = False) -> Optional[Dict[str, Any]]:
+        """Return a cached message resource with its current labels, or None.
+
+        Args:
+            message_id (str): The Gmail message ID
+            full (bool): Require the full message rather than metadata
+        """
+        column = "full" if full else "COALESCE(metadata, full)"
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {column}, label_ids FROM messages WHERE id = ?", (message_id,)
+            ).fetchone()
+        if row is None or row[0] is None:
+            return None
+        message = json.loads(row[0])
+        message["labelIds"] = json.loads(row[1])
+        return message
+
+    def get_many(self, message_ids: List[str], full: bool = False) -> Dict[str, Dict[str, Any]]:
+        """Return the cached messages among message_ids, keyed by ID."""
+        if not message_ids:
+            return {}
+        column = "full" if full else "COALESCE(metadata, full)"
+        placeholders = ",".join("?" * len(message_ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, {column}, label_ids FROM messages WHERE id IN ({placeholders})",
+                list(message_ids),
+            ).fetchall()
+        found = {}
+        for message_id, data, label_ids in rows:
+            if data is None:
+                continue
+            message = json.loads(data)
+            message["labelIds"] = json.loads(label_ids)
+            found[message_id] = message
+        return found
+
+    def put(self, message: Dict[str, Any], full: bool = False) -> None:
+        """Store a message resource fetched from the API.
+
+        Args:
+            message (dict): Gmail message resource
+            full (bool): Whether the resource was fetched with format="full"
+        """
+        column = "full" if full else "metadata"
+        label_ids = message.get("labelIds", [])
+        with self._lock:
+            self._conn.execute(
+                f"""INSERT INTO messages (id, thread_id, label_ids, {column},
+                                          sender, subject, internal_date, unread, hidden)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(id) DO UPDATE SET
+                        thread_id = excluded.thread_id,
+                        label_ids = excluded.label_ids,
+                        {column} = excluded.{column},
+                        sender = excluded.sender,
+                        subject = excluded.subject,
+                        internal_date = excluded.internal_date,
+                        unread = excluded.unread,
+                        hidden = excluded.hidden""",
+                (
+                    message["id"],
+                    message.get("threadId"),
+                    json.dumps(label_ids),
+                    json.dumps(message),
+                    *_index_values(message),
+                    *_label_flags(label_ids),
+                ),
+            )
+
+    def update_labels(
+        self, message_id: str, added: Optional[List[str]] = None, removed: Optional[List[str]] = None
+    ) -> None:
+        """Apply a label change to a cached message, if it is cached."""
+        self.update_labels_many([message_id], added, removed)
+
+    def update_labels_many(
+        self, message_ids: List[str], added: Optional[List[str]] = None, removed: Optional[List[str]] = None
+    ) -> None:
+        """Apply the same label change to every cached message among message_ids, in one transaction."""
+        added, removed = added or [], removed or []
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                for message_id in message_ids:
+                    row = self._conn.execute(
+                        "SELECT label_ids FROM messages WHERE id = ?", (message_id,)
+                    ).fetchone()
+                    if row is None:
+                        continue
+                    labels = [label for label in json.loads(row[0]) if label not in removed]
+                    labels.extend(label for label in added if label not in labels)
+                    self._conn.execute(
+                        "UPDATE messages SET label_ids = ?, unread = ?, hidden = ? WHERE id = ?",
+                        (json.dumps(labels), *_label_flags(labels), message_id)
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def set_labels(self, message_id: str, label_ids: List[str]) -> None:
+        """Replace the labels of a cached message with its current ones, if it is cached."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE messages SET label_ids = ?, unread = ?, hidden = ? WHERE id = ?",
+                (json.dumps(label_ids), *_label_flags(label_ids), message_id)
+            )
+
+    def delete(self, message_id: str) -> None:
+        """Remove a message from the cache."""
+        with self._lock:
+            self._conn.execute("DELETE FROM messages WHERE id = ?", (message_id,))
+
+    def clear(self) -> None:
+        """Remove every cached message and the sync position."""
+        with self._lock:
+            self._conn.execute("DELETE FROM messages")
+            self._conn.execute("DELETE FROM sync_state")
+
+    # -- history sync ----------------------------------------------------
+
+    def get_state(self, key: str) -> Optional[str]:
+        """Read a value from the sync_state table."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_state(self, key: str, value: str) -> None:
+        """Write a value to the sync_state table."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO sync_state (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, value),
+            )
+
+    def sync(
+        self, service, force: bool = False, history_types: Optional[List[str]] = None
+    ) -> List[str]:
+        """Bring cached label state up to date with users.history.list.
+
+        The first call only records the mailbox's current historyId. Later
+        calls replay label changes and deletions since then. If Gmail no
+        longer has history that old, the cache is cleared and rebuilt lazily.
+
+        Args:
+            service: Gmail API service
+            force (bool): Sync even if the last sync was less than sync_interval ago
+            history_types (Optional[List[str]]): History record types to replay
+                (default LABEL_HISTORY_TYPES)
+
+        Returns:
+            List[str]: IDs of messages added to the mailbox since the last sync,
+                when "messageAdded" is among the history types
+        """
+        with self._sync_lock:
+            if not force and time.monotonic() - self._last_sync < self.sync_interval:
+                return []
+            self._last_sync = time.monotonic()
+
+            start_history_id = self.get_state("history_id")
+            if start_history_id is None:
+                profile = service.users().getProfile(userId="me", fields="historyId").execute()
+                self.set_state("history_id", profile["historyId"])
+                return []
+
+            try:
+                latest_history_id, added_ids = self._replay_history(
+                    service, start_history_id, history_types or LABEL_HISTORY_TYPES
+                )
+            except HttpError as error:
+                if error.resp.status != 404:
+                    raise
+                logger.info("Gmail history %s expired; clearing message cache", start_history_id)
+                self.clear()
+                return []
+            self.set_state("history_id", latest_history_id)
+            return added_ids
+
+    def _replay_history(self, service, start_history_id: str, history_types: List[str]) -> tuple:
+        """Apply every history record after start_history_id.
+
+        Returns:
+            tuple: The newest historyId and the IDs of added messages
+        """
+        latest_history_id = start_history_id
+        added_ids = []
+        page_token = None
+        while True:
+            response = service.users().history().list(
+                userId="me",
+                startHistoryId=start_history_id,
+                historyTypes=history_types,
+                pageToken=page_token,
+            ).execute()
+            for record in response.get("history", []):
+                added_ids.extend(self.apply_history_record(record))
+            latest_history_id = response.get("historyId", latest_history_id)
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                return latest_history_id, added_ids
+
+    def apply_history_record(self, record: Dict[str, Any]) -> List[str]:
+        """Apply one users.history record to the cache.
+
+        Returns:
+            List[str]: IDs of messages the record adds; their content has to be
+                fetched by the caller
+        """
+        for change in record.get("labelsAdded", []):
+            self.update_labels(change["message"]["id"], added=change.get("labelIds", []))
+        for change in record.get("labelsRemoved", []):
+            self.update_labels(change["message"]["id"], removed=change.get("labelIds", []))
+        for change in record.get("messagesDeleted", []):
+            self.delete(change["message"]["id"])
+        return [change["message"]["id"] for change in record.get("messagesAdded", [])]
+
+    # -- local queries ---------------------------------------------------
+
+    def query(
+        self,
+        sender: str = "",
+        subject: str = "",
+        after_ms: Optional[int] = None,
+        before_ms: Optional[int] = None,
+        unread_only: bool = False,
+        limit: int = 10,
+    ) -> List[Dict[str, Any]]:
+        """Search cached messages, newest first, the way a Gmail search would.
+
+        Spam and trash are excluded. Only meaningful when the cache mirrors the
+        whole mailbox, see MailboxSync.
+
+        Args:
+            sender (str): Case-insensitive substring of the From header
+            subject (str): Case-insensitive substring of the Subject header
+            after_ms (Optional[int]): Only messages received at or after this epoch time in ms
+            before_ms (Optional[int]): Only messages received before this epoch time in ms
+            unread_only (bool): Only unread messages
+            limit (int): Maximum number of messages to return
+
+        Returns:
+            List[dict]: Message resources with their current labels
+        """
+        clauses, params = ["hidden = 0"], []
+        if sender:
+            clauses.append("sender LIKE ? ESCAPE '\\'")
+            params.append(_like_pattern(sender))
+        if subject:
+            clauses.append("subject LIKE ? ESCAPE '\\'")
+            params.append(_like_pattern(subject))
+        if after_ms is not None:
+            clauses.append("internal_date >= ?")
+            params.append(after_ms)
+        if before_ms is not None:
+            clauses.append("internal_date < ?")
+            params.append(before_ms)
+        if unread_only:
+            clauses.append("unread = 1")
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(
+                f"""SELECT COALESCE(metadata, full), label_ids FROM messages
+                    WHERE {" AND ".join(clauses)}
+                    ORDER BY internal_date DESC LIMIT ?""",
+                params,
+            ).fetchall()
+        messages = []
+        for data, label_ids in rows:
+            message = json.loads(data)
+            message["labelIds"] = json.loads(label_ids)
+            messages.append(message)
+        return messages
+
+    def count_unread(self) -> int:
+        """Number of cached unread messages outside spam and trash."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM messages WHERE hidden = 0 AND unread = 1"
+            ).fetchone()[0]
+
+
+def _like_pattern(text: str) -> str:
+    """Lower-cased substring LIKE pattern with SQL wildcards escaped."""
+    escaped = text.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+_cache: Optional[MessageCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_message_cache() -> MessageCache:
+    """Return the process-wide message cache, opening it on first use."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = MessageCache()
+    return _cache
@@ -27,7 +27,9 @@ Available tools:
 - search_tool: A specialized tool that uses Google search to find answers to queries. It returns a json object with the search results.
 
 - Google Docs Tools:
-  1. create_document_tool: Use this to create a new Google Doc with a title and optional initial content. It returns a dict = {status, message, document_id, document_url}.
+  1. create_document_tool: Use this to create a new Google Doc with a title and optional initial content. Set content_format="markdown" to turn "#" headings, "-" or "1." lists and "|" tables in the content into real document structure. It returns a dict = {status, message, document_id, document_url}.
+  
+  1b. create_documents_tool: Use this to create several Google Docs at once. Pass titles (list) and contents (list, one per title, same order) and optionally content_format. It returns a dict = {status, documents, message} with one result per document.
   
   2. delete_document_tool: Use this to delete a Google Doc by its ID. It returns a dict = {status, message}.
   
@@ -36,6 +38,10 @@ Available tools:
      - document_id: ID of the document to edit
      - content: New content to add/replace
      - replace_all: Whether to replace all content (true) or append (false)
+
+- expand_tool_result_tool: Older tool results may appear shortened with "elided": true and a reference. If you need the full result again, call this with the reference instead of repeating the original call.
+
+- fetch_more_results_tool: A large tool result may come back as its first page only, with a "page" summary and a next_cursor. If you need more of it, call this with next_cursor; keep calling with each new next_cursor until you have what you need or none is returned.
      
      
 **SUB-AGENTS**
@@ -78,8 +84,9 @@ When a user asks to work with Google Docs, handle the request directly using the
 
 1. For document creation (create_document_tool):
    - Ask for a title and content if not provided
-   - Create a document with a clear structure (headings, paragraphs, etc.)
+   - Create a document with a clear structure (headings, paragraphs, etc.), written in markdown with content_format="markdown"
    - Provide the document ID and URL after successful creation
+   - When asked for several documents (e.g. a batch of reports), create them all in one create_documents_tool call
 
 2. For document editing (edit_document_tool):
    - Require the document ID
@@ -108,12 +115,22 @@ main_agent_description = "Agent that orchestrates tasks and completes them or de
 email_assistant_agent_instruction = """You are an Email Assistant sub_agent that can send and retrieve emails via Gmail when called on by your parent agent.
             
 You have access to these tools:
-1. send_email_tool: Use this to send emails when requested.
+1. send_email_tool: Use this to send emails when requested. Optional html_body adds an HTML version and attachment_paths attaches files from the attachment directory (relative paths are taken relative to it); other files are refused.
 2. list_labels_tool: Use this to list available Gmail labels.
 3. get_emails_tool: Use this to retrieve and filter emails from the user's inbox.
 4. get_email_by_id_tool: Use this to get the full content of a specific email.
 5. mark_email_as_read_tool: Use this to mark an email as read.
 6. count_unread_emails_tool: Use this to count the number of unread emails.
+7. mark_emails_as_read_tool: Use this to mark many emails as read in one call, given email_ids and/or a Gmail query (e.g., "is:unread from:alerts@example.com").
+8. modify_email_labels_tool: Use this to add or remove labels on many emails in one call, given email_ids and/or a Gmail query. Labels can be names or IDs; removing "INBOX" archives, removing "UNREAD" marks as read, adding "TRASH" moves to trash.
+9. send_bulk_email_tool: Use this only when explicitly asked to send the same templated email to a list of people (a mail merge). Write each placeholder as its variable name wrapped in double curly braces in subject_template, body_template and the optional html_template; pass variable_names and one row of variable_values per recipient (an "email" placeholder is filled in automatically). Returns a status per recipient.
+10. expand_tool_result_tool: Use this with the reference of an elided earlier result (marked "elided": true) when you need its full content again.
+11. fetch_more_results_tool: A large result (e.g., a long email body or many emails) may come back as its first page, with a next_cursor. Call this with next_cursor for the next page when you need more of it.
+
+When changing many emails (e.g., inbox zero, "mark all of these as read", "archive every newsletter"):
+- Use one mark_emails_as_read_tool or modify_email_labels_tool call instead of one call per email
+- Prefer a Gmail query over listing the emails first when the user describes them by sender, age or state
+- If the result says the query was truncated, tell the user and offer to continue
 
 When retrieving emails:
 - Use get_emails_tool with appropriate filters when asked to find specific emails
@@ -139,7 +156,7 @@ When asked to send an email:
 - Report success or errors clearly
 
 For security reasons:
-- Never send emails to multiple recipients at once
+- Never send emails to multiple recipients at once, except through send_bulk_email_tool when the user explicitly asked for a mail merge to that list of recipients
 - Refuse to send emails with sensitive content
 - Do not store email content in memory between sessions
 - Once the task is complete, transfer control back to the parent agent
@@ -151,10 +168,16 @@ You are a Spreadsheet Assistant sub-agent that manages Google Spreadsheets when
 **Your tools:**
 1. create_new_spreadsheet_tool: Creates a new Google Spreadsheet. Requires a title (str). Returns status, message, spreadsheet_id, and spreadsheet_url.
 2. add_sheet_to_spreadsheet_tool: Adds a new sheet (tab) to an existing spreadsheet. Requires spreadsheet_id (str) and sheet_title (str). Returns status, message, and sheet_id.
-3. get_sheet_values_tool: Reads data from a specified range in a sheet. Requires spreadsheet_id (str) and range_name (str, e.g., "Sheet1!A1:B5"). Returns status, message, and values.
+3. get_sheet_values_tool: Reads data from a specified range in a sheet. Requires spreadsheet_id (str) and range_name (str, e.g., "Sheet1!A1:B5"); optional as_columns (bool) returns typed columns keyed by header instead of rows. Returns status, message, and values (or columns).
 4. update_sheet_values_tool: Writes data to a specified range in a sheet. Requires spreadsheet_id (str), range_name (str), and values (list of lists of strings). Returns status and message.
 5. delete_sheet_from_spreadsheet_tool: Deletes a sheet from a spreadsheet by name. Requires spreadsheet_id (str) and sheet_name (str). Returns status and message.
-6. search_drive_files_tool: Searches Google Drive for files by name (partial match). Requires name_query (str), optional mime_type (str), and max_results (int, default 10). Returns a list of files (id, name, description, mimeType) and a message.
+6. search_drive_files_tool: Searches Google Drive for files by name (partial match). Requires name_query (str), optional mime_type (str), max_results (int, default 10), and match_mode (str: 'contains' (default), 'prefix', or 'fuzzy' when the user may have misspelled the name). Returns a list of files (id, name, description, mimeType) and a message.
+7. batch_get_sheet_values_tool: Reads several ranges in one call. Requires spreadsheet_id (str) and ranges (list of str); optional value_render_option ("FORMATTED_VALUE", "UNFORMATTED_VALUE" or "FORMULA") and major_dimension ("ROWS" or "COLUMNS"). Returns status, message, and values keyed by range.
+8. batch_update_sheet_values_tool: Writes several ranges in one call. Requires spreadsheet_id (str), ranges (list of str) and values (one list of lists of strings per range, in the same order); optional major_dimension. Returns status, message, and updated cells per range.
+9. bulk_append_sheet_rows_tool: Appends every row of a local CSV or Parquet file to a sheet, uploading in chunks. Only files in the upload directory can be read; a relative file_path is taken relative to it. Requires spreadsheet_id (str), range_name (str, e.g., "Sheet1!A1") and file_path (str); optional skip_header (bool). Returns status, message, rows written and throughput.
+10. aggregate_sheet_values_tool: Computes sum, mean, median, min, max, count or nunique of a column, optionally grouped by another column and filtered on a column (==, !=, >, >=, <, <=, contains). Requires spreadsheet_id (str), range_name (str), operation (str) and value_column (str, the column header). Returns status, message, and result.
+11. expand_tool_result_tool: Use this with the reference of an elided earlier result (marked "elided": true) when you need its full content again.
+12. fetch_more_results_tool: A large result (e.g., a big range of rows) may come back as its first page, with a next_cursor. Call this with next_cursor for the next page; prefer aggregate_sheet_values_tool over paging through a whole sheet to compute a summary.
 
 **How to use your tools:**
 - When you need to find a spreadsheet (or doc) by name, use search_drive_files_tool first. Pass the user's query as name_query and, for spreadsheets, set mime_type to 'application/vnd.google-apps.spreadsheet'.
@@ -162,6 +185,9 @@ You are a Spreadsheet Assistant sub-agent that manages Google Spreadsheets when
 - After finding the correct file, use its ID with the other spreadsheet tools to perform the requested operation.
 - If multiple files match, present the options to the parent agent and ask for clarification.
 - For reading or writing values, if the user does not specify a range, clarify with the parent agent or use a sensible default (e.g., the whole sheet or "A1:Z1000").
+- When you need to read or write more than one range of the same spreadsheet, use batch_get_sheet_values_tool or batch_update_sheet_values_tool once instead of calling the single-range tools repeatedly.
+- When asked for totals, averages, counts or other statistics over a range, use aggregate_sheet_values_tool instead of reading all the cells.
+- To upload data from a file, use bulk_append_sheet_rows_tool instead of reading the file into update_sheet_values_tool.
 - Always return clear, structured responses indicating success or failure, and include any relevant IDs or URLs.
 - Do not perform actions outside spreadsheet management. Once your task is complete, return control to the parent agent.
 
@@ -0,0 +1,353 @@
+"""Keeps every tool result that reaches the model within a size budget.
+
+govern() wraps a tool function. A result that fits its tool's budget is
+returned unchanged. A larger one is cut to one page: its largest list (such as
+sheet rows or emails) or string (such as an email body) is shortened to fit,
+and the result gains a "next_cursor" the model passes to fetch_more_results to
+read the next page. The rest stays in memory, per session, until it is read or
+evicted.
+
+A list item too large for a page on its own (one long email among many) is
+truncated, marked so the model can fetch it by itself, where its own largest
+field is paged. Results without a field to page have their largest fields
+truncated. Either way the model always receives well-formed JSON.
+
+Later pages of a sheet's "values" repeat its first row, the header.
+"""
+import collections
+import copy
+import functools
+import inspect
+import json
+import os
+import threading
+import uuid
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+from google.adk.tools import ToolContext
+
+from . import session_store
+
+# Default budget for one tool result, in UTF-8 bytes of its JSON (about 4,000 tokens);
+# per tool override with e.g. TOOL_RESULT_BUDGET_GET_SHEET_VALUES=32000
+DEFAULT_BUDGET_BYTES = int(os.environ.get("TOOL_RESULT_BUDGET", "16000"))
+
+# Paged results kept for fetch_more_results, across all sessions
+STORE_SIZE = 200
+
+# Room left in a page for its "page", "next_cursor" and "message" fields
+PAGE_OVERHEAD_BYTES = 512
+
+TRUNCATION_MARK = "... [truncated]"
+
+Path = Tuple[Union[str, int], ...]
+
+
+def result_size(value: Any) -> int:
+    """Size of a value as the model receives it, in UTF-8 bytes of JSON."""
+    return len(json.dumps(value, ensure_ascii=False, default=str).encode())
+
+
+class ResultGovernor:
+    """Cuts oversized tool results into pages and serves the following pages."""
+
+    def __init__(self, budgets: Optional[Dict[str, int]] = None, default_budget: int = DEFAULT_BUDGET_BYTES):
+        """
+        Args:
+            budgets (Optional[dict]): Byte budget per tool name; tools not listed
+                use TOOL_RESULT_BUDGET_<TOOL NAME> or default_budget
+            default_budget (int): Byte budget for other tools
+        """
+        self.budgets = budgets or {}
+        self.default_budget = default_budget
+        # Keyed by (session scope, store id)
+        self._pages: "collections.OrderedDict[Tuple[str, str], Dict[str, Any]]" = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def budget_for(self, tool_name: str) -> int:
+        """Byte budget of one tool's results."""
+        if tool_name in self.budgets:
+            return self.budgets[tool_name]
+        return int(os.environ.get(f"TOOL_RESULT_BUDGET_{tool_name.upper()}", self.default_budget))
+
+    def shape(self, tool_name: str, result: Any, scope: str = "") -> Any:
+        """Return result unchanged if it fits the tool's budget, otherwise its first page.
+
+        Args:
+            tool_name (str): The tool that returned result
+            result (Any): The tool's return value; anything but a dict is
+                shaped as {"result": result}, the way ADK sends it
+            scope (str): The session the result belongs to; its later pages
+                can only be fetched from the same session
+        """
+        budget = self.budget_for(tool_name)
+        if result_size(result) <= budget:
+            return result
+        if not isinstance(result, dict):
+            result = {"result": result}
+
+        path = _pageable_path(result)
+        if path:
+            value = _get(result, path)
+            truncated = False
+            if isinstance(value, list):
+                # Items too large for a page of their own are cut down
+                item_budget = budget - result_size(_with(result, path, [])) - PAGE_OVERHEAD_BYTES
+                fitted = [_truncate(item, item_budget) for item in value]
+                truncated = any(item is not original for item, original in zip(fitted, value))
+                value = fitted
+            page = self._first_page(scope, {
+                "tool": tool_name,
+                "budget": budget,
+                "result": result,
+                "path": path,
+                "value": value,
+                "header": _header_row(path, value),
+                "truncated": truncated,
+            })
+            if page is not None:
+                return page
+
+        # No single field to page: cut the largest fields down instead
+        shaped = _truncate(result, budget - PAGE_OVERHEAD_BYTES)
+        if shaped is result:
+            # A budget too small for any page at all leaves the result as it is
+            return result
+        shaped["message"] = (
+            f"Result too large; fields ending in '{TRUNCATION_MARK}' were cut short. "
+            f"Call {tool_name} with a narrower request for the rest."
+        )
+        return shaped
+
+    def _first_page(self, scope: str, entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """First page of an entry, storing the entry if more pages follow."""
+        store_id = uuid.uuid4().hex
+        page = _page(entry, 0, store_id)
+        if page is not None and "next_cursor" in page:
+            with self._lock:
+                self._pages[(scope, store_id)] = entry
+                while len(self._pages) > STORE_SIZE:
+                    self._pages.popitem(last=False)
+        return page
+
+    def next_page(self, cursor: str, scope: str = "") -> Optional[Dict[str, Any]]:
+        """The page a cursor points to, or None if the cursor is unknown, evicted or from another session."""
+        store_id, _, offset = cursor.partition(":")
+        with self._lock:
+            entry = self._pages.get((scope, store_id))
+            if entry is not None:
+                self._pages.move_to_end((scope, store_id))
+        if entry is None or not offset.isdigit() or int(offset) >= len(entry["value"]):
+            return None
+        return _page(entry, int(offset), store_id)
+
+
+def _pageable_path(result: Dict[str, Any]) -> Optional[Path]:
+    """Path to the field to page: the largest list or string, found by following the largest value down."""
+    path: Path = ()
+    value: Any = result
+    while True:
+        if isinstance(value, dict) and value:
+            key = max(value, key=lambda k: result_size(value[k]))
+        elif isinstance(value, list) and len(value) == 1:
+            key = 0
+        else:
+            break
+        path += (key,)
+        value = value[key]
+    if path and isinstance(value, (list, str)) and len(value) > 1:
+        return path
+    return None
+
+
+def _get(value: Any, path: Path) -> Any:
+    for key in path:
+        value = value[key]
+    return value
+
+
+def _with(result: Dict[str, Any], path: Path, value: Any) -> Dict[str, Any]:
+    """Copy of result with the field at path replaced."""
+    shaped = copy.copy(result)
+    container = shaped
+    for key in path[:-1]:
+        container[key] = copy.copy(container[key])
+        container = container[key]
+    container[path[-1]] = value
+    return shaped
+
+
+def _header_row(path: Path, value: Any) -> Optional[list]:
+    """The header row of a sheet's values, repeated on every later page."""
+    if path[-1] == "values" and len(value) > 1 and all(isinstance(row, list) for row in value):
+        return value[0]
+    return None
+
+
+def _truncate(value: Any, budget: int) -> Any:
+    """Cut a value's largest strings and lists until its JSON fits budget.
+
+    Returns value itself if it already fits or cannot be cut, otherwise a
+    shortened copy; cut strings end in TRUNCATION_MARK and cut dicts gain
+    "truncated": True.
+    """
+    if budget <= 0 or result_size(value) <= budget:
+        return value
+    if isinstance(value, str):
+        mark_size = result_size(TRUNCATION_MARK) - 2
+        low, high = 0, len(value)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if result_size(value[:middle]) + mark_size <= budget:
+                low = middle
+            else:
+                high = middle - 1
+        return value[:low] + TRUNCATION_MARK
+    if isinstance(value, list):
+        if not value:
+            return value
+        low, high = 0, len(value)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if result_size(value[:middle]) <= budget:
+                low = middle
+            else:
+                high = middle - 1
+        if low == 0:
+            return [_truncate(value[0], budget - 2)]
+        return value[:low]
+    if not isinstance(value, dict):
+        return value
+
+    shaped = dict(value, truncated=True)
+    while result_size(shaped) > budget:
+        path = _pageable_path(shaped)
+        if path is None:
+            break
+        leaf = _get(shaped, path)
+        # Cut the largest field to fit, or by half if the others are too large anyway
+        room = max(budget - result_size(_with(shaped, path, leaf[:0])), result_size(leaf) // 2)
+        cut = _truncate(leaf, room)
+        if result_size(cut) >= result_size(leaf):
+            break
+        shaped = _with(shaped, path, cut)
+    return shaped if result_size(shaped) < result_size(value) else value
+
+
+def _page(entry: Dict[str, Any], offset: int, store_id: str) -> Optional[Dict[str, Any]]:
+    """The page of an entry starting at offset, or None if not even one item fits the budget."""
+    value = entry["value"]
+    total = len(value)
+    field = ".".join(str(key) for key in entry["path"])
+    unit = "characters" if isinstance(value, str) else "items"
+    header = entry.get("header") if offset > 0 else None
+
+    def build(end: int) -> Dict[str, Any]:
+        items = value[offset:end]
+        page = _with(entry["result"], entry["path"], [header] + items if header is not None else items)
+        page["page"] = {"field": field, "offset": offset, "returned": end - offset, "total": total, "unit": unit}
+        if header is not None:
+            page["page"]["header_repeated"] = True
+        notes = []
+        if end < total:
+            page["next_cursor"] = f"{store_id}:{end}"
+            notes.append(
+                f"Result too large; showing {unit} {offset + 1}-{end} of {total} of '{field}'. "
+                "Call fetch_more_results with next_cursor for the next page."
+            )
+        if header is not None:
+            notes.append(f"The first row of '{field}' repeats the header row.")
+        if entry.get("truncated") and any(isinstance(item, dict) and item.get("truncated") for item in items):
+            notes.append("Items marked truncated were cut short; fetch them one at a time for the rest.")
+        if notes:
+            page["message"] = " ".join(notes)
+        return page
+
+    budget = entry["budget"]
+    # Binary search for the largest page that fits
+    low, high = offset, total
+    while low < high:
+        middle = (low + high + 1) // 2
+        if result_size(build(middle)) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    if low == offset:
+        return None
+    return build(low)
+
+
+def govern(func: Callable[..., Any], governor: Optional[ResultGovernor] = None) -> Callable[..., Any]:
+    """Wrap a tool function so its results are paged by the governor.
+
+    The wrapper keeps the function's name, signature and docstring, and is a
+    coroutine function exactly when func is, so FunctionTool declares and
+    calls it as it would func. It also takes the tool_context (which ADK
+    leaves out of the declaration) to keep pages per session, and passes it
+    on only if func takes it too.
+
+    Args:
+        func (Callable): The tool function, sync or async
+        governor (Optional[ResultGovernor]): Defaults to the shared governor
+
+    Returns:
+        Callable: The wrapped tool function
+    """
+    signature = inspect.signature(func)
+    wants_context = "tool_context" in signature.parameters
+
+    def call_args(kwargs: Dict[str, Any]) -> Tuple[Dict[str, Any], str]:
+        tool_context = kwargs.get("tool_context") if wants_context else kwargs.pop("tool_context", None)
+        scope = session_store.session_scope(tool_context) if tool_context is not None else ""
+        return kwargs, scope
+
+    def shape(result: Any, scope: str) -> Any:
+        return (governor or result_governor).shape(func.__name__, result, scope)
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            kwargs, scope = call_args(kwargs)
+            return shape(await func(*args, **kwargs), scope)
+        wrapper_func = async_wrapper
+    else:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            kwargs, scope = call_args(kwargs)
+            return shape(func(*args, **kwargs), scope)
+        wrapper_func = wrapper
+
+    if not wants_context:
+        context = inspect.Parameter(
+            "tool_context", inspect.Parameter.KEYWORD_ONLY, default=None, annotation=Optional[ToolContext]
+        )
+        parameters = [
+            parameter for parameter in signature.parameters.values()
+            if parameter.kind != inspect.Parameter.VAR_KEYWORD
+        ]
+        parameters += [context] + [
+            parameter for parameter in signature.parameters.values()
+            if parameter.kind == inspect.Parameter.VAR_KEYWORD
+        ]
+        wrapper_func.__signature__ = signature.replace(parameters=parameters)
+    return wrapper_func
+
+
+# Shared by every tool
+result_governor = ResultGovernor()
+
+
+def fetch_more_results(cursor: str, tool_context: ToolContext) -> dict:
+    """Returns the next page of a tool result that was too large to return at once.
+
+    Args:
+        cursor (str): The next_cursor value from the previous page
+
+    Returns:
+        dict: The next page, shaped like the original result, with a new
+            next_cursor if more remains
+    """
+    page = result_governor.next_page(cursor, session_store.session_scope(tool_context))
+    if page is None:
+        return {"status": "error", "message": f"Cursor {cursor} is unknown or has expired; call the original tool again."}
+    return page
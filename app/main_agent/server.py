@@ -0,0 +1,259 @@
+"""HTTP server that runs many user sessions on the shared root_agent.
+
+Run it with ``python -m app.main_agent.server``. The server is single-tenant:
+every session, whatever its user_id, acts on the one Google account in
+token.json, and user_id only keeps conversations apart. It therefore listens
+on localhost by default. Set SERVER_AUTH_TOKEN to require an
+"Authorization: Bearer <token>" header; binding SERVER_HOST to any other
+address is refused without one.
+
+Each message is answered as a
+stream of server-sent events, one per ADK event, including partial model
+output. Messages of one session run strictly one after another; messages of
+different sessions run concurrently, up to SERVER_MAX_RUNS at a time.
+Requests beyond that wait in a bounded queue, and once the queue is full, or
+the Google API worker pool or the model is saturated, new messages are
+rejected with 503 and a Retry-After header instead of piling up.
+"""
+import asyncio
+import contextlib
+import hmac
+import ipaddress
+import json
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Dict, Optional
+
+from fastapi import Body, Depends, FastAPI, Header, HTTPException
+from fastapi.responses import StreamingResponse
+from google.adk.agents.run_config import RunConfig, StreamingMode
+from google.genai import errors as genai_errors
+from google.genai import types
+
+from . import async_tools, context_cache, session_store, tool_dispatch
+from .agent import APP_NAME, runner, session_service
+
+logger = logging.getLogger(__name__)
+
+# Messages processed at once across all sessions
+MAX_RUNS = int(os.environ.get("SERVER_MAX_RUNS", "32"))
+# Messages allowed to wait for a free run slot before new ones are rejected
+MAX_QUEUED = int(os.environ.get("SERVER_MAX_QUEUED", "64"))
+# Queued Google API calls above which new messages are rejected
+MAX_API_BACKLOG = int(os.environ.get("SERVER_MAX_API_BACKLOG", str(4 * async_tools.MAX_WORKERS)))
+# Seconds to shed load after the model reports rate limiting
+MODEL_COOLDOWN = float(os.environ.get("SERVER_MODEL_COOLDOWN", "10"))
+# Bearer token clients must send; required unless the server only listens on localhost
+AUTH_TOKEN = os.environ.get("SERVER_AUTH_TOKEN", "")
+
+
+class Overloaded(Exception):
+    """Raised when a message cannot be admitted right now."""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+class Admission:
+    """One admitted message's place in the multiplexer, released exactly once."""
+
+    def __init__(self, multiplexer: "SessionMultiplexer"):
+        self._multiplexer = multiplexer
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._multiplexer._admitted -= 1
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """Streaming response that releases its admission once it is finished.
+
+    The release does not rely on the stream's generator, which never runs if
+    the client disconnects before the first frame is sent.
+    """
+
+    def __init__(self, admission: Admission, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.admission = admission
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.admission.release()
+
+
+class SessionMultiplexer:
+    """Admits messages, keeps each session's messages in order and bounds concurrency."""
+
+    def __init__(self, max_runs: int = MAX_RUNS, max_queued: int = MAX_QUEUED):
+        """
+        Args:
+            max_runs (int): Messages processed at once
+            max_queued (int): Messages allowed to wait for a run slot
+        """
+        self.max_runs = max_runs
+        self.max_queued = max_queued
+        self._slots = asyncio.Semaphore(max_runs)
+        self._admitted = 0
+        self._running = 0
+        self._session_locks: Dict[tuple, asyncio.Lock] = {}
+        self._session_waiters: Dict[tuple, int] = {}
+        self._cooldown_until = 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        """Current load, for health checks."""
+        return {
+            "running": self._running,
+            "queued": self._admitted - self._running,
+            "max_runs": self.max_runs,
+            "max_queued": self.max_queued,
+            "google_api_backlog": async_tools.pending_calls(),
+            "context_cache": context_cache.cache_manager.stats(),
+        }
+
+    def admit(self) -> Admission:
+        """Reserve a place for one message or raise Overloaded."""
+        remaining_cooldown = self._cooldown_until - time.monotonic()
+        if remaining_cooldown > 0:
+            raise Overloaded("The model is rate limiting requests", remaining_cooldown)
+        if self._admitted >= self.max_runs + self.max_queued:
+            raise Overloaded("Too many messages in progress", 1)
+        if async_tools.pending_calls() > MAX_API_BACKLOG:
+            raise Overloaded("Google API calls are backed up", 1)
+        self._admitted += 1
+        return Admission(self)
+
+    def model_rate_limited(self) -> None:
+        """Stop admitting messages for MODEL_COOLDOWN seconds."""
+        self._cooldown_until = time.monotonic() + MODEL_COOLDOWN
+
+    async def run(self, admission: Admission, user_id: str, session_id: str, text: str) -> AsyncIterator[str]:
+        """Run one admitted message and yield its events as SSE frames.
+
+        The admission is released when the stream ends; AdmittedStreamingResponse
+        also releases it if the stream is never started.
+        """
+        key = (user_id, session_id)
+        lock = self._session_locks.setdefault(key, asyncio.Lock())
+        self._session_waiters[key] = self._session_waiters.get(key, 0) + 1
+        try:
+            async with lock:
+                async with self._slots:
+                    self._running += 1
+                    try:
+                        async for frame in self._stream(user_id, session_id, text):
+                            yield frame
+                    finally:
+                        self._running -= 1
+        finally:
+            admission.release()
+            self._session_waiters[key] -= 1
+            if not self._session_waiters[key]:
+                # Nobody else is waiting on this session; drop its lock
+                del self._session_waiters[key]
+                del self._session_locks[key]
+
+    async def _stream(self, user_id: str, session_id: str, text: str) -> AsyncIterator[str]:
+        # Read ahead in a worker thread; the runner's own get_session then returns it
+        await session_store.load_session(session_service, APP_NAME, user_id, session_id)
+        message = types.Content(role="user", parts=[types.Part(text=text)])
+        invocation_ids = set()
+        try:
+            async for event in runner.run_async(
+                user_id=user_id,
+                session_id=session_id,
+                new_message=message,
+                run_config=RunConfig(streaming_mode=StreamingMode.SSE),
+            ):
+                invocation_ids.add(event.invocation_id)
+                yield _sse("event", event.model_dump_json(exclude_none=True, by_alias=True))
+        except genai_errors.APIError as error:
+            if error.code == 429:
+                self.model_rate_limited()
+            logger.warning("Model call failed for session %s: %s", session_id, error)
+            yield _sse("error", json.dumps({"status": "error", "code": error.code, "message": str(error)}))
+        except Exception as e:
+            logger.exception("Run failed for session %s", session_id)
+            yield _sse("error", json.dumps({"status": "error", "message": f"An unexpected error occurred: {str(e)}"}))
+        finally:
+            # Stop tool calls the run started but never collected
+            for invocation_id in invocation_ids:
+                tool_dispatch.dispatcher.finish_invocation(invocation_id)
+        yield _sse("done", "{}")
+
+
+def _sse(event: str, data: str) -> str:
+    """Format one server-sent event frame."""
+    return f"event: {event}\ndata: {data}\n\n"
+
+
+multiplexer: Optional[SessionMultiplexer] = None
+
+
+@contextlib.asynccontextmanager
+async def _lifespan(app: FastAPI):
+    # Created here so its semaphore belongs to the server's event loop
+    global multiplexer
+    multiplexer = SessionMultiplexer()
+    yield
+
+
+def _authorize(authorization: Optional[str] = Header(default=None)) -> None:
+    """Reject requests without the configured bearer token."""
+    if AUTH_TOKEN and not hmac.compare_digest(authorization or "", f"Bearer {AUTH_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Unauthorized", headers={"WWW-Authenticate": "Bearer"})
+
+
+def _is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+app = FastAPI(title=APP_NAME, lifespan=_lifespan)
+
+
+@app.get("/healthz")
+async def healthz() -> Dict[str, Any]:
+    return {"status": "ok", **multiplexer.stats()}
+
+
+@app.post("/users/{user_id}/sessions", dependencies=[Depends(_authorize)])
+async def create_session(user_id: str, state: Optional[Dict[str, Any]] = Body(default=None, embed=True)) -> Dict[str, Any]:
+    session = await asyncio.to_thread(session_service.create_session, app_name=APP_NAME, user_id=user_id, state=state)
+    return {"user_id": user_id, "session_id": session.id}
+
+
+@app.post("/users/{user_id}/sessions/{session_id}/messages", dependencies=[Depends(_authorize)])
+async def send_message(user_id: str, session_id: str, text: str = Body(..., embed=True)) -> StreamingResponse:
+    try:
+        admission = multiplexer.admit()
+    except Overloaded as overloaded:
+        raise HTTPException(
+            status_code=503,
+            detail=str(overloaded),
+            headers={"Retry-After": str(max(1, round(overloaded.retry_after)))},
+        )
+    return AdmittedStreamingResponse(
+        admission,
+        multiplexer.run(admission, user_id, session_id, text),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    host = os.environ.get("SERVER_HOST", "127.0.0.1")
+    if not AUTH_TOKEN and not _is_loopback(host):
+        raise SystemExit(f"Refusing to listen on {host} without SERVER_AUTH_TOKEN; every session acts on the same Google account.")
+    uvicorn.run(app, host=host, port=int(os.environ.get("SERVER_PORT", "8080")))
@@ -0,0 +1,110 @@
+import threading
+from typing import Any, Dict, Tuple
+
+import google_auth_httplib2
+import httplib2
+from googleapiclient.discovery import build_from_document
+from googleapiclient.http import HttpRequest
+
+from .discovery_documents import get_discovery_document
+
+# Services are keyed by (api name, api version, credentials key)
+_services: Dict[Tuple[str, str, Any], Any] = {}
+_services_lock = threading.Lock()
+
+# httplib2.Http is not thread-safe, so every thread gets its own authorized
+# connection per credentials object. The connection is reused by every
+# request that thread makes, which keeps the TCP/TLS session warm.
+_thread_local = threading.local()
+# Bumped by invalidate_services() so every thread drops its connections
+_generation = 0
+
+
+def _credentials_key(credentials) -> Any:
+    """Identify credentials by the grant they represent rather than by object.
+
+    User credentials re-loaded from token.json are new objects every time but
+    carry the same client and refresh token, so they can share one client.
+    """
+    refresh_token = getattr(credentials, "refresh_token", None)
+    if refresh_token:
+        return (getattr(credentials, "client_id", None), refresh_token)
+    return id(credentials)
+
+
+def _get_thread_http(credentials) -> google_auth_httplib2.AuthorizedHttp:
+    """Return the calling thread's authorized HTTP client for the given credentials."""
+    clients = getattr(_thread_local, "clients", None)
+    if clients is None or _thread_local.generation != _generation:
+        clients = _thread_local.clients = {}
+        _thread_local.generation = _generation
+    key = _credentials_key(credentials)
+    client = clients.get(key)
+    if client is None:
+        client = google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http())
+        clients[key] = client
+    return client
+
+
+def _make_request_builder(credentials):
+    """Build a requestBuilder that sends every request over a per-thread connection."""
+    def request_builder(http, *args, **kwargs):
+        return HttpRequest(_get_thread_http(credentials), *args, **kwargs)
+    return request_builder
+
+
+def get_service(api_name: str, api_version: str, credentials) -> Any:
+    """Return a shared Google API client for (api_name, api_version, credentials).
+
+    The client is built once and reused by every caller. Requests issued from
+    it are executed over a connection owned by the calling thread, so the same
+    client can be used safely from several threads at once. The client is
+    built from a local copy of the discovery document, see
+    get_discovery_document().
+
+    Args:
+        api_name (str): The API name, e.g. "gmail" or "sheets"
+        api_version (str): The API version, e.g. "v1"
+        credentials: The google.auth credentials used to authorize requests
+
+    Returns:
+        The googleapiclient Resource for the API
+    """
+    key = (api_name, api_version, _credentials_key(credentials))
+    service = _services.get(key)
+    if service is not None:
+        return service
+
+    with _services_lock:
+        service = _services.get(key)
+        if service is None:
+            service = build_from_document(
+                get_discovery_document(api_name, api_version),
+                http=_get_thread_http(credentials),
+                requestBuilder=_make_request_builder(credentials),
+            )
+            # Drop clients built for credentials that have since been replaced
+            for stale_key in [k for k in _services if k[:2] == key[:2]]:
+                del _services[stale_key]
+            _services[key] = service
+    return service
+
+
+def invalidate_services(api_name: str = "", api_version: str = "") -> None:
+    """Forget cached API clients so the next get_service() call rebuilds them.
+
+    Call this when the credentials rotate (e.g. after re-authorization).
+
+    Args:
+        api_name (str): Only invalidate clients of this API (default: all APIs)
+        api_version (str): Only invalidate clients of this version (default: all versions)
+    """
+    global _generation
+    with _services_lock:
+        _generation += 1
+        for key in list(_services):
+            if api_name and key[0] != api_name:
+                continue
+            if api_version and key[1] != api_version:
+                continue
+            del _services[key]
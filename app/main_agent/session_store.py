@@ -0,0 +1,448 @@
+"""SQLite-backed ADK session service.
+
+Sessions, their events and the app- and user-scoped state live in one SQLite
+database in WAL mode, so readers never block the writer and many sessions can
+be served from one process. Events are appended one row at a time, and a
+resumed session loads only its most recent turns, so neither storage writes
+nor memory grow with the length of a conversation.
+
+ADK's Runner calls get_session and append_event synchronously on the event
+loop, so SqliteSessionService keeps its I/O off it: append_event updates the
+session object at once and stores the event on a single writer thread, in
+order, and load_session reads a session in a worker thread ahead of a run so
+the Runner's get_session returns it without touching the database.
+"""
+import asyncio
+import concurrent.futures
+import contextlib
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, InMemorySessionService, Session, State
+from google.adk.sessions.base_session_service import GetSessionConfig, ListEventsResponse, ListSessionsResponse
+
+logger = logging.getLogger(__name__)
+
+_project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+DB_PATH = os.environ.get(
+    "SESSION_DB_PATH",
+    os.path.join(_project_root, ".cache", "sessions.sqlite3")
+)
+
+# "sqlite" (default) or "memory" for the old non-persistent behaviour
+BACKEND = os.environ.get("SESSION_BACKEND", "sqlite").lower()
+
+# Events loaded when a session is resumed without an explicit window; 0 loads everything
+HISTORY_EVENTS = int(os.environ.get("SESSION_HISTORY_EVENTS", "200"))
+
+POOL_SIZE = int(os.environ.get("SESSION_DB_POOL_SIZE", "8"))
+
+# Session state key holding the session's scope key; see session_scope()
+SCOPE_STATE_KEY = "session_scope"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT '{}',
+    create_time REAL NOT NULL,
+    update_time REAL NOT NULL,
+    PRIMARY KEY (app_name, user_id, id)
+);
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    author TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_by_session ON events (app_name, user_id, session_id, seq);
+CREATE TABLE IF NOT EXISTS app_states (
+    app_name TEXT PRIMARY KEY,
+    state TEXT NOT NULL DEFAULT '{}'
+);
+CREATE TABLE IF NOT EXISTS user_states (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT '{}',
+    PRIMARY KEY (app_name, user_id)
+);
+"""
+
+
+class ConnectionPool:
+    """Fixed-size pool of SQLite connections to one database in WAL mode.
+
+    Connections are opened lazily and handed out one caller at a time, so
+    reads from several threads run in parallel while SQLite serializes writers.
+    Nothing is created on disk until the first connection is opened.
+    """
+
+    def __init__(self, path: str, size: int = POOL_SIZE, schema: str = ""):
+        """
+        Args:
+            path (str): SQLite database file
+            size (int): Maximum number of open connections
+            schema (str): Idempotent SQL script run on every new connection,
+                e.g. CREATE TABLE IF NOT EXISTS statements
+        """
+        self.path = path
+        self.schema = schema
+        self._idle: "queue.LifoQueue[Optional[sqlite3.Connection]]" = queue.LifoQueue()
+        for _ in range(size):
+            self._idle.put(None)
+
+    def _open(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        if self.schema:
+            conn.executescript(self.schema)
+        return conn
+
+    @contextlib.contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection, waiting for one to be returned if all are in use."""
+        conn = self._idle.get()
+        try:
+            if conn is None:
+                conn = self._open()
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    @contextlib.contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection inside a write transaction, committed on success."""
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+
+def _split_state(state: Optional[Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
+    """Split a state delta into its app, user and session parts; temp: keys are dropped."""
+    app_state, user_state, session_state = {}, {}, {}
+    for key, value in (state or {}).items():
+        if key.startswith(State.APP_PREFIX):
+            app_state[key.removeprefix(State.APP_PREFIX)] = value
+        elif key.startswith(State.USER_PREFIX):
+            user_state[key.removeprefix(State.USER_PREFIX)] = value
+        elif not key.startswith(State.TEMP_PREFIX):
+            session_state[key] = value
+    return app_state, user_state, session_state
+
+
+class SqliteSessionService(BaseSessionService):
+    """Persistent session service storing every session in one SQLite database."""
+
+    def __init__(self, path: str = DB_PATH, pool_size: int = POOL_SIZE, history_events: int = HISTORY_EVENTS):
+        """
+        Args:
+            path (str): SQLite database file
+            pool_size (int): Maximum number of open connections
+            history_events (int): Events loaded by get_session() without a config;
+                0 loads the whole history
+        """
+        self.history_events = history_events
+        # The database and its tables are created on first use
+        self._pool = ConnectionPool(path, pool_size, schema=_SCHEMA)
+        # One thread stores every event, so each session's events keep their order
+        self._writer = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-writer")
+        self._lock = threading.Lock()
+        self._last_writes: Dict[Tuple[str, str, str], concurrent.futures.Future] = {}
+        self._loaded: Dict[Tuple[str, str, str], Session] = {}
+
+    def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        session_id = session_id.strip() if session_id and session_id.strip() else str(uuid.uuid4())
+        app_delta, user_delta, session_state = _split_state(state)
+        now = time.time()
+        with self._pool.transaction() as conn:
+            try:
+                conn.execute(
+                    "INSERT INTO sessions (app_name, user_id, id, state, create_time, update_time) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (app_name, user_id, session_id, json.dumps(session_state), now, now),
+                )
+            except sqlite3.IntegrityError:
+                raise ValueError(f"Session {session_id} already exists for user {user_id}.")
+            self._merge_scoped_state(conn, app_name, user_id, app_delta, user_delta)
+            merged = self._with_scoped_state(conn, app_name, user_id, session_state)
+        return Session(app_name=app_name, user_id=user_id, id=session_id, state=merged, last_update_time=now)
+
+    async def load_session(self, *, app_name: str, user_id: str, session_id: str) -> Session:
+        """Read a session, creating it on first use, without blocking the event loop.
+
+        The next get_session() call for it, made by the Runner from the event
+        loop, returns this session object instead of reading it again.
+        """
+        key = (app_name, user_id, session_id)
+        with self._lock:
+            self._loaded.pop(key, None)
+        session = await asyncio.to_thread(get_or_create_session, self, app_name, user_id, session_id)
+        with self._lock:
+            self._loaded[key] = session
+        return session
+
+    def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        """Load a session with a window of its most recent events.
+
+        Without a config only the last history_events events are loaded,
+        starting at a user message so no turn is cut in half. A session read
+        by load_session() is returned as it is, once.
+        """
+        key = (app_name, user_id, session_id)
+        if config is None:
+            with self._lock:
+                session = self._loaded.pop(key, None)
+            if session is not None:
+                return session
+        self._wait_for_writes(key)
+        with self._pool.connection() as conn:
+            row = conn.execute(
+                "SELECT state, update_time FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?",
+                (app_name, user_id, session_id),
+            ).fetchone()
+            if row is None:
+                return None
+            state = self._with_scoped_state(conn, app_name, user_id, json.loads(row[0]))
+            events = self._load_events(conn, app_name, user_id, session_id, config)
+        return Session(
+            app_name=app_name,
+            user_id=user_id,
+            id=session_id,
+            state=state,
+            events=events,
+            last_update_time=row[1],
+        )
+
+    def _load_events(self, conn, app_name: str, user_id: str, session_id: str, config: Optional[GetSessionConfig]) -> List[Event]:
+        """Read a session's events, oldest first, restricted to the requested window."""
+        clauses = ["app_name = ?", "user_id = ?", "session_id = ?"]
+        params: List[Any] = [app_name, user_id, session_id]
+        if config and config.after_timestamp:
+            clauses.append("timestamp >= ?")
+            params.append(config.after_timestamp)
+        if config and config.num_recent_events:
+            limit = config.num_recent_events
+        elif config is None and self.history_events > 0:
+            limit = self.history_events
+        else:
+            limit = -1
+        rows = conn.execute(
+            f"SELECT author, data FROM events WHERE {' AND '.join(clauses)} ORDER BY seq DESC LIMIT ?",
+            (*params, limit),
+        ).fetchall()
+        rows.reverse()
+
+        if config is None and limit != -1 and len(rows) == limit:
+            # The window was cut; start it at the first user message
+            first_turn = next((i for i, (author, _) in enumerate(rows) if author == "user"), 0)
+            rows = rows[first_turn:]
+        return [Event.model_validate_json(data) for _, data in rows]
+
+    def list_sessions(self, *, app_name: str, user_id: str) -> ListSessionsResponse:
+        with self._pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT id, update_time FROM sessions WHERE app_name = ? AND user_id = ? ORDER BY update_time DESC",
+                (app_name, user_id),
+            ).fetchall()
+        return ListSessionsResponse(sessions=[
+            Session(app_name=app_name, user_id=user_id, id=session_id, state={}, last_update_time=update_time)
+            for session_id, update_time in rows
+        ])
+
+    def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        key = (app_name, user_id, session_id)
+        with self._lock:
+            self._loaded.pop(key, None)
+        self._wait_for_writes(key)
+        with self._pool.transaction() as conn:
+            conn.execute(
+                "DELETE FROM events WHERE app_name = ? AND user_id = ? AND session_id = ?",
+                (app_name, user_id, session_id),
+            )
+            conn.execute(
+                "DELETE FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?",
+                (app_name, user_id, session_id),
+            )
+
+    def list_events(self, *, app_name: str, user_id: str, session_id: str) -> ListEventsResponse:
+        self._wait_for_writes((app_name, user_id, session_id))
+        with self._pool.connection() as conn:
+            events = self._load_events(conn, app_name, user_id, session_id, GetSessionConfig())
+        return ListEventsResponse(events=events)
+
+    def append_event(self, session: Session, event: Event) -> Event:
+        """Add an event to the session object and queue it to be stored as one new row.
+
+        Returns at once; the row is written on the writer thread. Reads of
+        the session through this service wait for its queued writes first.
+        """
+        if event.partial:
+            return event
+        super().append_event(session=session, event=event)
+        session.last_update_time = event.timestamp
+
+        key = (session.app_name, session.user_id, session.id)
+        data = event.model_dump_json(exclude_none=True)
+        deltas = _split_state(event.actions.state_delta if event.actions else None)
+        with self._lock:
+            write = self._writer.submit(self._store_event, key, event.author, event.timestamp, data, deltas)
+            self._last_writes[key] = write
+        write.add_done_callback(lambda done: self._write_done(key, done))
+        return event
+
+    def _store_event(
+        self,
+        key: Tuple[str, str, str],
+        author: str,
+        timestamp: float,
+        data: str,
+        deltas: Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]],
+    ) -> None:
+        """Write one event and its state changes; runs on the writer thread."""
+        app_name, user_id, session_id = key
+        app_delta, user_delta, session_delta = deltas
+        with self._pool.transaction() as conn:
+            row = conn.execute(
+                "SELECT state FROM sessions WHERE app_name = ? AND user_id = ? AND id = ?",
+                (app_name, user_id, session_id),
+            ).fetchone()
+            if row is None:
+                # Deleted meanwhile; keep the in-memory copy only
+                return
+            conn.execute(
+                "INSERT INTO events (app_name, user_id, session_id, author, timestamp, data) VALUES (?, ?, ?, ?, ?, ?)",
+                (app_name, user_id, session_id, author, timestamp, data),
+            )
+            state = json.loads(row[0])
+            state.update(session_delta)
+            conn.execute(
+                "UPDATE sessions SET state = ?, update_time = ? WHERE app_name = ? AND user_id = ? AND id = ?",
+                (json.dumps(state), timestamp, app_name, user_id, session_id),
+            )
+            self._merge_scoped_state(conn, app_name, user_id, app_delta, user_delta)
+
+    def _write_done(self, key: Tuple[str, str, str], write: concurrent.futures.Future) -> None:
+        if write.exception() is not None:
+            logger.error("Could not store an event of session %s: %s", key[2], write.exception())
+        with self._lock:
+            if self._last_writes.get(key) is write:
+                del self._last_writes[key]
+
+    def _wait_for_writes(self, key: Tuple[str, str, str]) -> None:
+        """Block until the session's queued events are stored."""
+        with self._lock:
+            write = self._last_writes.get(key)
+        if write is not None:
+            concurrent.futures.wait([write])
+
+    def flush(self) -> None:
+        """Block until every queued event is stored."""
+        self._writer.submit(lambda: None).result()
+
+    def _merge_scoped_state(self, conn, app_name: str, user_id: str, app_delta: Dict[str, Any], user_delta: Dict[str, Any]) -> None:
+        """Apply app- and user-scoped state changes inside the caller's transaction."""
+        if app_delta:
+            row = conn.execute("SELECT state FROM app_states WHERE app_name = ?", (app_name,)).fetchone()
+            state = {**(json.loads(row[0]) if row else {}), **app_delta}
+            conn.execute(
+                "INSERT INTO app_states (app_name, state) VALUES (?, ?) "
+                "ON CONFLICT(app_name) DO UPDATE SET state = excluded.state",
+                (app_name, json.dumps(state)),
+            )
+        if user_delta:
+            row = conn.execute(
+                "SELECT state FROM user_states WHERE app_name = ? AND user_id = ?", (app_name, user_id)
+            ).fetchone()
+            state = {**(json.loads(row[0]) if row else {}), **user_delta}
+            conn.execute(
+                "INSERT INTO user_states (app_name, user_id, state) VALUES (?, ?, ?) "
+                "ON CONFLICT(app_name, user_id) DO UPDATE SET state = excluded.state",
+                (app_name, user_id, json.dumps(state)),
+            )
+
+    def _with_scoped_state(self, conn, app_name: str, user_id: str, session_state: Dict[str, Any]) -> Dict[str, Any]:
+        """Session state plus the app: and user: prefixed keys, as sessions expose them."""
+        state = dict(session_state)
+        row = conn.execute("SELECT state FROM app_states WHERE app_name = ?", (app_name,)).fetchone()
+        if row:
+            state.update({State.APP_PREFIX + key: value for key, value in json.loads(row[0]).items()})
+        row = conn.execute(
+            "SELECT state FROM user_states WHERE app_name = ? AND user_id = ?", (app_name, user_id)
+        ).fetchone()
+        if row:
+            state.update({State.USER_PREFIX + key: value for key, value in json.loads(row[0]).items()})
+        return state
+
+
+def session_scope(context) -> str:
+    """Stable key of the session a callback or tool context belongs to.
+
+    ADK's callback and tool contexts do not expose the session ID, so a random
+    key is stored in the session's state on first use and read back after that.
+    """
+    scope = context.state.get(SCOPE_STATE_KEY)
+    if scope is None:
+        scope = uuid.uuid4().hex
+        context.state[SCOPE_STATE_KEY] = scope
+    return scope
+
+
+def make_session_service() -> BaseSessionService:
+    """Create the session service selected by SESSION_BACKEND."""
+    if BACKEND == "memory":
+        return InMemorySessionService()
+    if BACKEND != "sqlite":
+        raise ValueError(f"Unknown SESSION_BACKEND '{BACKEND}'; use 'sqlite' or 'memory'.")
+    return SqliteSessionService()
+
+
+async def load_session(service: BaseSessionService, app_name: str, user_id: str, session_id: str) -> Session:
+    """Resume a session ahead of a run, creating it on first use, without blocking the event loop."""
+    if isinstance(service, SqliteSessionService):
+        return await service.load_session(app_name=app_name, user_id=user_id, session_id=session_id)
+    return await asyncio.to_thread(get_or_create_session, service, app_name, user_id, session_id)
+
+
+def get_or_create_session(service: BaseSessionService, app_name: str, user_id: str, session_id: str) -> Session:
+    """Resume a session, creating it on first use."""
+    session = service.get_session(app_name=app_name, user_id=user_id, session_id=session_id)
+    if session is not None:
+        return session
+    try:
+        return service.create_session(app_name=app_name, user_id=user_id, session_id=session_id)
+    except ValueError:
+        # Another request created it first
+        return service.get_session(app_name=app_name, user_id=user_id, session_id=session_id)
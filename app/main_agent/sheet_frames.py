@@ -0,0 +1,169 @@
+from typing import Any, Dict, List, Optional
+
+# pandas is optional; it is only imported when a columnar result is requested
+AGGREGATIONS = ("sum", "mean", "median", "min", "max", "count", "nunique")
+FILTER_OPERATORS = ("==", "!=", ">", ">=", "<", "<=", "contains")
+# Aggregations that only make sense over numbers
+NUMERIC_AGGREGATIONS = ("sum", "mean", "median")
+
+
+def to_frame(values: List[List[Any]], header_row: bool = True):
+    """Build a typed pandas DataFrame from a ragged Sheets value range.
+
+    Short rows are padded, the first row supplies the column names (or
+    A, B, C, ... when header_row is False), and every column gets the
+    narrowest dtype its values allow: numeric, boolean, or string.
+
+    Args:
+        values (List[List[Any]]): Values as returned by spreadsheets.values.get,
+            ideally with valueRenderOption=UNFORMATTED_VALUE
+        header_row (bool): Whether the first row holds column names
+
+    Returns:
+        pandas.DataFrame: One column per sheet column
+    """
+    import pandas as pd
+
+    rows = values[1:] if header_row and values else values
+    width = max((len(row) for row in values), default=0)
+    if header_row and values:
+        names = [str(name) if name != "" else _column_letter(i) for i, name in enumerate(values[0])]
+        names += [_column_letter(i) for i in range(len(names), width)]
+    else:
+        names = [_column_letter(i) for i in range(width)]
+
+    frame = pd.DataFrame([list(row) + [None] * (width - len(row)) for row in rows], columns=names)
+    frame = frame.replace("", None)
+    for name in frame.columns:
+        cells = frame[name].dropna()
+        if cells.empty:
+            frame[name] = frame[name].astype("string")
+            continue
+        if cells.map(lambda cell: isinstance(cell, bool)).all():
+            frame[name] = frame[name].astype("boolean")
+            continue
+        numeric = pd.to_numeric(frame[name], errors="coerce")
+        # Only convert when every non-empty cell is a number
+        if numeric.notna().sum() == len(cells):
+            frame[name] = numeric
+        else:
+            frame[name] = frame[name].astype("string")
+    return frame
+
+
+def to_columns(frame) -> Dict[str, Any]:
+    """Serialize a frame as JSON-friendly columns plus their dtypes."""
+    return {
+        "columns": {
+            name: [None if _is_missing(cell) else _to_python(cell) for cell in frame[name].tolist()]
+            for name in frame.columns
+        },
+        "dtypes": {name: str(dtype) for name, dtype in frame.dtypes.items()},
+        "row_count": len(frame),
+    }
+
+
+def aggregate(
+    frame,
+    operation: str,
+    value_column: str,
+    group_by_column: str = "",
+    filter_column: str = "",
+    filter_operator: str = "==",
+    filter_value: str = "",
+) -> Any:
+    """Filter, group and aggregate a frame with vectorized pandas operations.
+
+    Args:
+        frame (pandas.DataFrame): Frame from to_frame()
+        operation (str): One of AGGREGATIONS
+        value_column (str): Column to aggregate
+        group_by_column (str): Optional column to group by
+        filter_column (str): Optional column to filter on before aggregating
+        filter_operator (str): One of FILTER_OPERATORS
+        filter_value (str): Value to compare filter_column against
+
+    Returns:
+        A single value, or a dict of group to value when grouping
+
+    Raises:
+        ValueError: If an argument is invalid, or a numeric operation targets
+            a column without any numeric values
+    """
+    import pandas as pd
+
+    if operation not in AGGREGATIONS:
+        raise ValueError(f"Unsupported operation '{operation}'; use one of {', '.join(AGGREGATIONS)}.")
+    for column in (value_column, group_by_column, filter_column):
+        if column and column not in frame.columns:
+            raise ValueError(f"Column '{column}' not found; available columns: {', '.join(frame.columns)}.")
+
+    if filter_column:
+        frame = frame[_filter_mask(frame[filter_column], filter_operator, filter_value)]
+
+    if operation in NUMERIC_AGGREGATIONS and not pd.api.types.is_numeric_dtype(frame[value_column]):
+        # Text cells would otherwise be concatenated or compared as strings
+        numeric = pd.to_numeric(frame[value_column], errors="coerce")
+        if numeric.notna().sum() == 0:
+            raise ValueError(f"Column '{value_column}' has no numeric values to {operation}.")
+        frame = frame.assign(**{value_column: numeric})
+
+    if group_by_column:
+        result = frame.groupby(group_by_column, dropna=False)[value_column].agg(operation)
+        return {str(group): _to_python(value) for group, value in result.items()}
+    return _to_python(frame[value_column].agg(operation))
+
+
+def _filter_mask(column, operator: str, value: str):
+    """Boolean mask comparing a column to a value given as text."""
+    import pandas as pd
+
+    if operator not in FILTER_OPERATORS:
+        raise ValueError(f"Unsupported filter operator '{operator}'; use one of {', '.join(FILTER_OPERATORS)}.")
+    if operator == "contains":
+        return column.astype("string").str.contains(value, case=False, regex=False).fillna(False)
+
+    # Compare as booleans or numbers when the column holds them
+    if pd.api.types.is_bool_dtype(column):
+        value = value.strip().lower() in ("true", "1", "yes")
+    elif pd.api.types.is_numeric_dtype(column):
+        value = float(value)
+    else:
+        column = column.astype("string")
+    mask = {
+        "==": column == value,
+        "!=": column != value,
+        ">": column > value,
+        ">=": column >= value,
+        "<": column < value,
+        "<=": column <= value,
+    }[operator]
+    return mask.fillna(False).astype(bool)
+
+
+def _column_letter(index: int) -> str:
+    """Spreadsheet column letter for a zero-based column index (0 -> A, 26 -> AA)."""
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord("A") + remainder) + letters
+    return letters
+
+
+def _is_missing(cell: Any) -> bool:
+    """Whether a cell is a pandas missing value."""
+    import pandas as pd
+
+    return cell is None or (not isinstance(cell, (list, dict)) and bool(pd.isna(cell)))
+
+
+def _to_python(value: Any) -> Optional[Any]:
+    """Convert NumPy scalars to plain Python values for JSON output."""
+    if _is_missing(value):
+        return None
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
@@ -0,0 +1,139 @@
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+# Only the sheet properties needed to resolve and describe tabs
+SHEET_FIELDS = "sheets(properties(sheetId,title,index,gridProperties(rowCount,columnCount)))"
+
+# Seconds a spreadsheet's metadata stays valid; edits made outside the agent
+# become visible after at most this long
+TTL = float(os.environ.get("SHEET_METADATA_TTL", "300"))
+
+# A range without a sheet title: cells ("A1:B5", "C:C") or rows ("2:10")
+_CELL_RANGE = re.compile(r"^\$?[A-Za-z]{0,3}\$?\d*(?::\$?[A-Za-z]{0,3}\$?\d*)?$")
+
+
+def split_range(range_name: str) -> Tuple[Optional[str], str]:
+    """Split A1 notation into its sheet title (None if absent) and cell part.
+
+    "'My Sheet'!A1:B2" gives ("My Sheet", "A1:B2"); a bare "Sheet1" gives
+    ("Sheet1", ""), and "A1:B2" gives (None, "A1:B2").
+    """
+    if range_name.startswith("'"):
+        match = re.match(r"^'((?:[^']|'')*)'(?:!(.*))?$", range_name)
+        if match:
+            return match.group(1).replace("''", "'"), match.group(2) or ""
+    elif "!" in range_name:
+        title, _, cells = range_name.partition("!")
+        return title, cells
+    elif not _CELL_RANGE.match(range_name):
+        return range_name, ""
+    return None, range_name
+
+
+def join_range(title: str, cells: str) -> str:
+    """A1 notation for cells of the sheet titled title, quoted so any title is valid."""
+    quoted = "'" + title.replace("'", "''") + "'"
+    return f"{quoted}!{cells}" if cells else quoted
+
+
+class SheetMetadataCache:
+    """Per-spreadsheet cache of sheet (tab) titles, IDs and grid sizes.
+
+    Metadata is fetched with a narrow field mask, kept for `ttl` seconds and
+    dropped early whenever the agent itself adds or deletes a sheet.
+    """
+
+    def __init__(self, ttl: float = TTL):
+        """
+        Args:
+            ttl (float): Seconds before cached metadata is fetched again
+        """
+        self.ttl = ttl
+        self._entries: Dict[str, Tuple[float, List[Dict[str, Any]]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, service, spreadsheet_id: str, refresh: bool = False) -> List[Dict[str, Any]]:
+        """Return the sheet properties of a spreadsheet, fetching them if needed.
+
+        Args:
+            service: Sheets API service
+            spreadsheet_id (str): The ID of the spreadsheet
+            refresh (bool): Ignore the cached entry
+
+        Returns:
+            List[dict]: One properties dict (sheetId, title, index, gridProperties) per sheet
+        """
+        with self._lock:
+            entry = self._entries.get(spreadsheet_id)
+        if entry is not None and not refresh and time.monotonic() - entry[0] < self.ttl:
+            return entry[1]
+
+        response = service.spreadsheets().get(spreadsheetId=spreadsheet_id, fields=SHEET_FIELDS).execute()
+        sheets = [sheet.get('properties', {}) for sheet in response.get('sheets', [])]
+        with self._lock:
+            self._entries[spreadsheet_id] = (time.monotonic(), sheets)
+        return sheets
+
+    def find_sheet(self, service, spreadsheet_id: str, title: str, fresh: bool = False) -> Optional[Dict[str, Any]]:
+        """Return the properties of the sheet with the given title, or None.
+
+        A miss on cached metadata is retried once against fresh metadata, in
+        case the sheet was created outside the agent.
+
+        Args:
+            fresh (bool): Look only at freshly fetched metadata; for destructive
+                requests, where a stale sheetId could name a renamed or recreated tab
+        """
+        for refresh in ((True,) if fresh else (False, True)):
+            for properties in self.get(service, spreadsheet_id, refresh=refresh):
+                if properties.get('title') == title:
+                    return properties
+        return None
+
+    def resolve_range(self, service, spreadsheet_id: str, range_name: str) -> str:
+        """Check the sheet title of a range against cached metadata and normalize it.
+
+        A title matching one sheet only when case is ignored is corrected.
+        Ranges without a title, and bare names that are no sheet's title
+        (such as named ranges), are returned unchanged.
+
+        Args:
+            service: Sheets API service
+            spreadsheet_id (str): The ID of the spreadsheet
+            range_name (str): The range in A1 notation
+
+        Returns:
+            str: The range, with its sheet title as the spreadsheet spells it
+
+        Raises:
+            ValueError: If range_name names a sheet (with "Title!...") that does not exist
+        """
+        title, cells = split_range(range_name)
+        if title is None:
+            return range_name
+        # A miss on cached metadata is retried once against fresh metadata
+        for refresh in (False, True):
+            titles = [sheet.get('title', '') for sheet in self.get(service, spreadsheet_id, refresh=refresh)]
+            if title in titles:
+                return range_name
+            matches = [candidate for candidate in titles if candidate.lower() == title.lower()]
+            if len(matches) == 1:
+                return join_range(matches[0], cells)
+        if not cells and "!" not in range_name:
+            return range_name
+        raise ValueError(
+            f"Sheet '{title}' not found in spreadsheet {spreadsheet_id}; its sheets are: "
+            f"{', '.join(repr(candidate) for candidate in titles)}."
+        )
+
+    def invalidate(self, spreadsheet_id: str) -> None:
+        """Drop the cached metadata of a spreadsheet after changing its sheets."""
+        with self._lock:
+            self._entries.pop(spreadsheet_id, None)
+
+
+# Shared by all sheets tools
+sheet_metadata_cache = SheetMetadataCache()
@@ -0,0 +1,233 @@
+import csv
+import json
+import re
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from .api_retry import NON_IDEMPOTENT_RETRYABLE_STATUSES, execute_with_retry
+
+# Google recommends keeping request payloads around 2 MB; stay well below
+DEFAULT_CHUNK_BYTES = 1_000_000
+DEFAULT_CHUNK_ROWS = 5_000
+
+# File types iter_file_rows reads
+UPLOAD_EXTENSIONS = (".csv", ".parquet", ".pq")
+
+_A1_START = re.compile(r"^(?:(?P<sheet>.+)!)?\$?(?P<column>[A-Za-z]{1,3})\$?(?P<row>\d+)(?::.*)?$")
+
+
+def chunk_rows(
+    rows: Iterable[List[Any]],
+    max_rows: int = DEFAULT_CHUNK_ROWS,
+    max_bytes: int = DEFAULT_CHUNK_BYTES,
+) -> Iterator[List[List[Any]]]:
+    """Group rows into chunks bounded by row count and approximate JSON size.
+
+    Only one chunk is held in memory at a time.
+    """
+    chunk: List[List[Any]] = []
+    size = 0
+    for row in rows:
+        row_size = _row_size(row)
+        if chunk and (len(chunk) >= max_rows or size + row_size > max_bytes):
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(row)
+        size += row_size
+    if chunk:
+        yield chunk
+
+
+def _row_size(row: List[Any]) -> int:
+    """Size of a row in the request body: each cell as a JSON string plus a separator.
+
+    The API client escapes non-ASCII characters in JSON, so a character may
+    take up to twelve bytes; the serialized size is what counts.
+    """
+    return sum(len(json.dumps(str(cell))) + 1 for cell in row) + 2
+
+
+class BulkWriteError(Exception):
+    """A bulk write failed after some of its chunks were already written.
+
+    Attributes:
+        cause (Exception): The error that stopped the write
+        stats (dict): What was written before it, as _write_stats reports it,
+            plus "failed_row_offset": the number of input rows sent before the
+            failing chunk, where a retry must start
+    """
+
+    def __init__(self, cause: Exception, stats: Dict[str, Any]):
+        super().__init__(str(cause))
+        self.cause = cause
+        self.stats = stats
+
+
+def payload_size(rows: Iterable[List[Any]]) -> int:
+    """Approximate JSON size of rows, as chunk_rows measures them."""
+    return sum(_row_size(row) for row in rows)
+
+
+def iter_file_rows(file_path: str, skip_header: bool = False) -> Iterator[List[Any]]:
+    """Stream the rows of a CSV or Parquet file.
+
+    Parquet support needs pyarrow, which is imported only when a Parquet file is read.
+
+    Raises:
+        ValueError: If the file is neither .csv nor .parquet
+    """
+    if not file_path.lower().endswith(UPLOAD_EXTENSIONS):
+        raise ValueError(f"Only {', '.join(UPLOAD_EXTENSIONS)} files can be uploaded.")
+    if file_path.lower().endswith((".parquet", ".pq")):
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(file_path)
+        if not skip_header:
+            yield list(parquet_file.schema_arrow.names)
+        for batch in parquet_file.iter_batches():
+            columns = [column.to_pylist() for column in batch.columns]
+            for row in zip(*columns):
+                yield ["" if cell is None else cell for cell in row]
+        return
+
+    with open(file_path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        if skip_header:
+            next(reader, None)
+        yield from reader
+
+
+def _write_stats(rows: int, cells: int, chunks: int, started: float, updated_range: Optional[str] = None) -> Dict[str, Any]:
+    """Summarize a bulk write, including its throughput."""
+    elapsed = time.monotonic() - started
+    return {
+        "rows_written": rows,
+        "cells_written": cells,
+        "chunks": chunks,
+        "updated_range": updated_range,
+        "elapsed_seconds": round(elapsed, 3),
+        "rows_per_second": round(rows / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+def _span(first: Optional[str], last: Optional[str]) -> Optional[str]:
+    """One A1 range from the start of first to the end of last ("S!A2:D9", "S!A10:D20" -> "S!A2:D20")."""
+    if not first or not last:
+        return first or last
+    start = first.rpartition(":")[0] if ":" in first.rpartition("!")[2] else first
+    end = last.rpartition("!")[2].rpartition(":")[2]
+    return f"{start}:{end}"
+
+
+def append_rows(
+    service,
+    spreadsheet_id: str,
+    range_name: str,
+    rows: Iterable[List[Any]],
+    max_rows: int = DEFAULT_CHUNK_ROWS,
+    max_bytes: int = DEFAULT_CHUNK_BYTES,
+) -> Dict[str, Any]:
+    """Append rows after the table at range_name in size-bounded chunks.
+
+    Appends are not idempotent, so a chunk is retried only when it was
+    rate limited; a server error is raised rather than risk writing the chunk twice.
+    Chunks written before a failure stay written; BulkWriteError reports them
+    and the input row a retry must start from.
+
+    Args:
+        service: Sheets API service
+        spreadsheet_id (str): The ID of the spreadsheet
+        range_name (str): A1 range locating the table to append to
+        rows (Iterable[list]): Rows to write; consumed lazily
+        max_rows (int): Maximum rows per request
+        max_bytes (int): Approximate maximum payload size per request
+
+    Returns:
+        dict: Rows, cells and chunks written, the range written, elapsed time and throughput
+
+    Raises:
+        BulkWriteError: If a chunk, or reading the rows, fails after other
+            chunks were written; earlier failures are raised as they are
+    """
+    started = time.monotonic()
+    sent_rows = total_rows = total_cells = chunks = 0
+    first_range = last_range = None
+    try:
+        for chunk in chunk_rows(rows, max_rows, max_bytes):
+            result = execute_with_retry(lambda: service.spreadsheets().values().append(
+                spreadsheetId=spreadsheet_id,
+                range=range_name,
+                valueInputOption="RAW",
+                insertDataOption="INSERT_ROWS",
+                body={"values": chunk},
+                fields="updates(updatedRange,updatedRows,updatedCells)"
+            ), retry_statuses=NON_IDEMPOTENT_RETRYABLE_STATUSES)
+            updates = result.get("updates", {})
+            sent_rows += len(chunk)
+            total_rows += updates.get("updatedRows", len(chunk))
+            total_cells += updates.get("updatedCells", 0)
+            first_range = first_range or updates.get("updatedRange")
+            last_range = updates.get("updatedRange") or last_range
+            chunks += 1
+    except Exception as error:
+        if not chunks:
+            raise
+        stats = _write_stats(total_rows, total_cells, chunks, started, _span(first_range, last_range))
+        raise BulkWriteError(error, {**stats, "failed_row_offset": sent_rows}) from error
+    return _write_stats(total_rows, total_cells, chunks, started, _span(first_range, last_range))
+
+
+def update_rows(
+    service,
+    spreadsheet_id: str,
+    range_name: str,
+    rows: Iterable[List[Any]],
+    max_rows: int = DEFAULT_CHUNK_ROWS,
+    max_bytes: int = DEFAULT_CHUNK_BYTES,
+) -> Optional[Dict[str, Any]]:
+    """Overwrite cells starting at range_name's top-left cell in size-bounded chunks.
+
+    Each chunk is written to the rows directly below the previous one.
+
+    Returns:
+        Optional[dict]: Write statistics as for append_rows, or None if
+            range_name has no explicit start cell (e.g. "Sheet1" or "A:C")
+
+    Raises:
+        BulkWriteError: If a chunk fails after other chunks were written; its
+            stats also hold "next_range", the start cell of the rows not written
+    """
+    match = _A1_START.match(range_name)
+    if match is None:
+        return None
+    prefix = f"{match.group('sheet')}!" if match.group("sheet") else ""
+    column, row = match.group("column"), int(match.group("row"))
+
+    started = time.monotonic()
+    total_rows = total_cells = chunks = 0
+    first_range = last_range = None
+    try:
+        for chunk in chunk_rows(rows, max_rows, max_bytes):
+            chunk_range = f"{prefix}{column}{row + total_rows}"
+            result = execute_with_retry(lambda: service.spreadsheets().values().update(
+                spreadsheetId=spreadsheet_id,
+                range=chunk_range,
+                valueInputOption="RAW",
+                body={"values": chunk},
+                fields="updatedRange,updatedCells"
+            ))
+            total_rows += len(chunk)
+            total_cells += result.get("updatedCells", 0)
+            first_range = first_range or result.get("updatedRange")
+            last_range = result.get("updatedRange") or last_range
+            chunks += 1
+    except Exception as error:
+        if not chunks:
+            raise
+        stats = _write_stats(total_rows, total_cells, chunks, started, _span(first_range, last_range))
+        raise BulkWriteError(error, {
+            **stats,
+            "failed_row_offset": total_rows,
+            "next_range": f"{prefix}{column}{row + total_rows}",
+        }) from error
+    return _write_stats(total_rows, total_cells, chunks, started, _span(first_range, last_range))
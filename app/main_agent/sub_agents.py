@@ -8,7 +8,7 @@ from google.adk.tools import FunctionTool
 from google.genai import types
 from google.adk.tools import google_search
 
-from . import sub_tools, prompts
+from . import async_tools, context_cache, history_compaction, prompts, result_governor, tool_dispatch
 
 
 # Create search agent
@@ -20,48 +20,86 @@ search_agent = LlmAgent(
     tools=[google_search],  # Integrate the Google search tool
 )
 
+# Re-expands tool results elided from older turns by history compaction
+expand_tool_result_tool = FunctionTool(func=result_governor.govern(history_compaction.expand_tool_result))
+
+# Pages through tool results too large to return at once
+fetch_more_results_tool = FunctionTool(func=result_governor.fetch_more_results)
+
 # Create function tools for email operations
-send_email_tool = FunctionTool(func=sub_tools.send_email)
-list_labels_tool = FunctionTool(func=sub_tools.list_email_labels)
-get_emails_tool = FunctionTool(func=sub_tools.get_emails)
-get_email_by_id_tool = FunctionTool(func=sub_tools.get_email_by_id)
-mark_email_as_read_tool = FunctionTool(func=sub_tools.mark_email_as_read)
-count_unread_emails_tool = FunctionTool(func=sub_tools.count_unread_emails)
+send_email_tool = FunctionTool(func=result_governor.govern(async_tools.send_email))
+send_bulk_email_tool = FunctionTool(func=result_governor.govern(async_tools.send_bulk_email))
+list_labels_tool = FunctionTool(func=result_governor.govern(async_tools.list_email_labels))
+get_emails_tool = FunctionTool(func=result_governor.govern(async_tools.get_emails))
+get_email_by_id_tool = FunctionTool(func=result_governor.govern(async_tools.get_email_by_id))
+mark_email_as_read_tool = FunctionTool(func=result_governor.govern(async_tools.mark_email_as_read))
+mark_emails_as_read_tool = FunctionTool(func=result_governor.govern(async_tools.mark_emails_as_read))
+modify_email_labels_tool = FunctionTool(func=result_governor.govern(async_tools.modify_email_labels))
+count_unread_emails_tool = FunctionTool(func=result_governor.govern(async_tools.count_unread_emails))
 
 email_assistant_agent = LlmAgent(
             name="email_assistant_agent",
-            model="gemini-2.0-flash-exp",
+            model=context_cache.CacheAwareGemini(model="gemini-2.0-flash-exp"),  # Resends the prefix if its cache is gone
             tools=[
                 send_email_tool, 
+                send_bulk_email_tool,
                 list_labels_tool,
                 get_emails_tool,
                 get_email_by_id_tool,
                 mark_email_as_read_tool,
-                count_unread_emails_tool
+                count_unread_emails_tool,
+                mark_emails_as_read_tool,
+                modify_email_labels_tool,
+                expand_tool_result_tool,
+                fetch_more_results_tool
             ],
             instruction=prompts.email_assistant_agent_instruction,
-            description="An assistant that can send and receive emails via Gmail API."
+            description="An assistant that can send and receive emails via Gmail API.",
+            before_tool_callback=tool_dispatch.dispatcher,  # Runs independent calls concurrently
+            before_model_callback=[
+                tool_dispatch.dispatcher.before_model,  # Ends the previous turn's calls
+                history_compaction.compactor,  # Keeps the history within budget
+                context_cache.cache_manager,  # Sends the static prefix as a cache reference
+            ],
+            after_model_callback=tool_dispatch.dispatcher.after_model,  # Records the calls to dispatch
         )
 
 # Create function tools for Google Sheets operations
-create_spreadsheet_tool = FunctionTool(func=sub_tools.create_new_spreadsheet)
-add_sheet_tool = FunctionTool(func=sub_tools.add_sheet_to_spreadsheet)
-get_sheet_values_tool = FunctionTool(func=sub_tools.get_sheet_values)
-update_sheet_values_tool = FunctionTool(func=sub_tools.update_sheet_values)
-delete_sheet_tool = FunctionTool(func=sub_tools.delete_sheet_from_spreadsheet)
-search_drive_files_tool = FunctionTool(func=sub_tools.search_drive_files_by_name)
+create_spreadsheet_tool = FunctionTool(func=result_governor.govern(async_tools.create_new_spreadsheet))
+add_sheet_tool = FunctionTool(func=result_governor.govern(async_tools.add_sheet_to_spreadsheet))
+get_sheet_values_tool = FunctionTool(func=result_governor.govern(async_tools.get_sheet_values))
+batch_get_sheet_values_tool = FunctionTool(func=result_governor.govern(async_tools.batch_get_sheet_values))
+aggregate_sheet_values_tool = FunctionTool(func=result_governor.govern(async_tools.aggregate_sheet_values))
+update_sheet_values_tool = FunctionTool(func=result_governor.govern(async_tools.update_sheet_values))
+batch_update_sheet_values_tool = FunctionTool(func=result_governor.govern(async_tools.batch_update_sheet_values))
+bulk_append_sheet_rows_tool = FunctionTool(func=result_governor.govern(async_tools.bulk_append_sheet_rows))
+delete_sheet_tool = FunctionTool(func=result_governor.govern(async_tools.delete_sheet_from_spreadsheet))
+search_drive_files_tool = FunctionTool(func=result_governor.govern(async_tools.search_drive_files_by_name))
 
 spreadsheet_assistant_agent = LlmAgent(
     name="spreadsheet_assistant_agent",
-    model="gemini-2.0-flash-exp", # You can use the same model or a different one
+    model=context_cache.CacheAwareGemini(model="gemini-2.0-flash-exp"),  # Resends the prefix if its cache is gone
     tools=[
         create_spreadsheet_tool,
         add_sheet_tool,
         get_sheet_values_tool,
+        batch_get_sheet_values_tool,
+        aggregate_sheet_values_tool,
         update_sheet_values_tool,
+        batch_update_sheet_values_tool,
+        bulk_append_sheet_rows_tool,
         delete_sheet_tool,
-        search_drive_files_tool
+        search_drive_files_tool,
+        expand_tool_result_tool,
+        fetch_more_results_tool
     ],
     instruction=prompts.spreadsheet_assistant_agent_instruction, # We will define this in prompts.py
-    description="An assistant that can create, read, update, and delete Google Spreadsheets and their sheets, and search for spreadsheets by name."
+    description="An assistant that can create, read, update, and delete Google Spreadsheets and their sheets, and search for spreadsheets by name.",
+    before_tool_callback=tool_dispatch.dispatcher,  # Runs independent calls concurrently
+    before_model_callback=[
+        tool_dispatch.dispatcher.before_model,  # Ends the previous turn's calls
+        history_compaction.compactor,  # Keeps the history within budget
+        context_cache.cache_manager,  # Sends the static prefix as a cache reference
+    ],
+    after_model_callback=tool_dispatch.dispatcher.after_model,  # Records the calls to dispatch
 )
\ No newline at end of file
@@ -1,117 +1,110 @@
 import os
 import base64
-from email.mime.text import MIMEText
+import codecs
+import html
+import itertools
+import logging
 import datetime
+import email.message
 import email.parser
 from email.utils import parsedate_to_datetime
 import re
-from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Dict, Any, Optional
 
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
+from . import bulk_mail, doc_builder, doc_edits, drive_index, local_files, sheet_frames, sheets_bulk
+from .credential_manager import CredentialManager
+from .mailbox_sync import ENABLED as mailbox_sync_enabled, get_mailbox_sync
+from .message_cache import get_message_cache
+from .services import get_service
+from .sheet_metadata import sheet_metadata_cache
+
+logger = logging.getLogger(__name__)
+
 # Combined API authentication scopes for Gmail and Google Docs/Drive
 SCOPES = [
     'https://www.googleapis.com/auth/gmail.send',
     'https://www.googleapis.com/auth/gmail.readonly',
+    'https://www.googleapis.com/auth/gmail.modify',
     'https://www.googleapis.com/auth/docs',
     'https://www.googleapis.com/auth/drive',
     'https://www.googleapis.com/auth/spreadsheets'
 ]
 
+# Define project root for finding files
+_project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+# Process-wide credential cache shared by every tool
+_credential_manager = CredentialManager(
+    token_path=os.path.join(_project_root, 'token.json'),
+    scopes=SCOPES,
+    client_secret_paths=[
+        os.path.join(_project_root, 'credentials.json'),
+        os.path.join(_project_root, 'static', 'credentials.json')
+    ]
+)
+
 def get_credentials():
-    """Get and refresh API credentials for both Gmail and Google Docs/Drive"""
-    creds = None
-    # Define project root for finding files
-    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
-    token_path = os.path.join(project_root, 'token.json')
-    
-    # Check if token.json exists with stored credentials
-    if os.path.exists(token_path):
-        try:
-            creds = Credentials.from_authorized_user_file(token_path, SCOPES)
-            print(f"Found token at {token_path}")
-        except Exception as e:
-            print(f"Error loading token: {e}")
-    
-    # If no valid credentials, authenticate
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            try:
-                creds.refresh(Request())
-                print("Token refreshed successfully")
-            except Exception as e:
-                print(f"Error refreshing token: {e}")
-                creds = None
-        
-        # If still no valid credentials, look for credentials.json
-        if not creds:
-            # Try multiple locations for credentials file
-            potential_paths = [
-                os.path.join(project_root, 'credentials.json'),
-                os.path.join(project_root, 'static', 'credentials.json')
-            ]
-            
-            client_secret_file = None
-            for path in potential_paths:
-                if os.path.exists(path):
-                    client_secret_file = path
-                    print(f"Using credentials from: {path}")
-                    break
-            
-            if not client_secret_file:
-                raise FileNotFoundError("No credentials.json file found in any of the expected locations.")
-            
-            flow = InstalledAppFlow.from_client_secrets_file(client_secret_file, SCOPES)
-            creds = flow.run_local_server(port=0)
-        
-        # Save credentials for future runs
-        with open(token_path, 'w') as token:
-            token.write(creds.to_json())
-            print(f"Credentials saved to {token_path}")
-    
-    return creds
+    """Get API credentials for both Gmail and Google Docs/Drive.
+
+    Credentials are served from memory and refreshed in the background
+    ahead of expiry; see CredentialManager.
+    """
+    return _credential_manager.get()
+
+def _resolve_attachments(attachment_paths: Optional[list[str]]) -> list[str]:
+    """Resolve attachment paths, allowing only files inside ATTACHMENT_DIR.
+
+    Raises:
+        PermissionError: If a path is outside ATTACHMENT_DIR
+        FileNotFoundError: If a file does not exist
+    """
+    return [
+        local_files.resolve_allowed_path(path, local_files.ATTACHMENT_DIR)
+        for path in attachment_paths or []
+    ]
 
 # Modified function signature to work better with ADK's automatic function calling
-def send_email(to: str, subject: str, body: str) -> dict:
+def send_email(
+    to: str,
+    subject: str,
+    body: str,
+    html_body: str = "",
+    attachment_paths: Optional[list[str]] = None
+) -> dict:
     """Sends an email using Gmail API.
     
     Args:
         to (string): Email address of the recipient
         subject (string): Subject of the email
         body (string): Body content of the email
+        html_body (string, optional): HTML version of the body, shown by mail clients that support it
+        attachment_paths (list[str], optional): Files to attach, inside the attachment directory
         
     Returns:
         dict: Status of the email sending operation
     """
     try:
-        # Get credentials and build service
-        creds = get_credentials()
-        service = build('gmail', 'v1', credentials=creds)
-        
-        # Create email message
-        message = MIMEText(body)
-        message['to'] = to
-        message['subject'] = subject
-        
-        # Encode the message
-        encoded_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
-        
-        # Create the message payload
-        create_message = {
-            'raw': encoded_message
+        attachments = _resolve_attachments(attachment_paths)
+    except (PermissionError, FileNotFoundError) as error:
+        return {
+            "status": "error",
+            "message": str(error)
         }
+    try:
+        # Get credentials and the shared service
+        creds = get_credentials()
+        service = get_service('gmail', 'v1', creds)
         
-        # Send the message
-        send_message = service.users().messages().send(userId="me", body=create_message).execute()
+        # Build, encode and send the message
+        message_id = bulk_mail.send_message(service, to, subject, body, html_body, attachments)
         
         return {
             "status": "success",
             "message": f"Email sent successfully to {to}",
-            "message_id": send_message['id']
+            "message_id": message_id
         }
         
     except HttpError as error:
@@ -124,6 +117,83 @@ def send_email(to: str, subject: str, body: str) -> dict:
             "status": "error", 
             "message": f"An unexpected error occurred: {str(e)}"
         }
+
+def send_bulk_email(
+    recipients: list[str],
+    subject_template: str,
+    body_template: str,
+    variable_names: list[str],
+    variable_values: list[list[str]],
+    html_template: str = "",
+    attachment_paths: Optional[list[str]] = None
+) -> dict:
+    """Sends one personalized email per recipient from a template.
+    
+    Placeholders are written as {{name}}; {{email}} is always the recipient's address.
+    
+    Args:
+        recipients (list[str]): Email addresses of the recipients
+        subject_template (str): Subject with placeholders (e.g., "Invoice for {{first_name}}")
+        body_template (str): Plain-text body with placeholders
+        variable_names (list[str]): Placeholder names (e.g., ["first_name", "amount"])
+        variable_values (list[list[str]]): One row of values per recipient, in the order of
+            recipients, with one value per name in variable_names
+        html_template (str, optional): HTML body with placeholders; values are HTML-escaped
+        attachment_paths (list[str], optional): Files attached to every email, inside the
+            attachment directory
+        
+    Returns:
+        dict: Status, one result per recipient (to, status, and message_id or an
+            error message), and a message
+    """
+    if len(variable_values) != len(recipients):
+        return {
+            "status": "error",
+            "message": f"Got {len(recipients)} recipients but {len(variable_values)} rows of values; pass one row per recipient."
+        }
+    bad_rows = [i for i, row in enumerate(variable_values) if len(row) != len(variable_names)]
+    if bad_rows:
+        return {
+            "status": "error",
+            "message": f"Rows {bad_rows} do not have one value per name in variable_names."
+        }
+    try:
+        attachments = _resolve_attachments(attachment_paths)
+    except (PermissionError, FileNotFoundError) as error:
+        return {
+            "status": "error",
+            "message": str(error)
+        }
+    try:
+        creds = get_credentials()
+        service = get_service('gmail', 'v1', creds)
+        results = bulk_mail.send_bulk(
+            service,
+            recipients,
+            subject_template,
+            body_template,
+            [dict(zip(variable_names, row)) for row in variable_values],
+            html_template=html_template,
+            attachment_paths=attachments
+        )
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": f"An unexpected error occurred: {str(e)}"
+        }
+    
+    sent = sum(1 for result in results if result["status"] == "success")
+    if sent == len(results):
+        status = "success"
+    elif sent:
+        status = "partial_success"
+    else:
+        status = "error"
+    return {
+        "status": status,
+        "results": results,
+        "message": f"Sent {sent} of {len(results)} email(s)."
+    }
         
 def list_email_labels() -> dict:
     """Lists the user's Gmail labels.
@@ -132,9 +202,9 @@ def list_email_labels() -> dict:
         dict: List of Gmail labels
     """
     try:
-        # Get credentials and build service
+        # Get credentials and the shared service
         creds = get_credentials()
-        service = build('gmail', 'v1', credentials=creds)
+        service = get_service('gmail', 'v1', creds)
         
         # Call the Gmail API
         results = service.users().labels().list(userId="me").execute()
@@ -159,6 +229,222 @@ def list_email_labels() -> dict:
             "message": f"An unexpected error occurred: {str(e)}"
         }
 
+# Gmail recommends at most 50 requests per batch to avoid rate limiting
+GMAIL_BATCH_SIZE = 50
+
+def batch_get_messages(service, message_ids: List[str], **get_kwargs) -> List[tuple]:
+    """Fetch several Gmail messages using HTTP batch requests.
+    
+    Args:
+        service: Gmail API service
+        message_ids (List[str]): IDs of the messages to fetch
+        **get_kwargs: Extra arguments for users.messages.get (e.g. format)
+        
+    Returns:
+        List[tuple]: One (message, error) pair per ID, in the order of message_ids.
+            Exactly one of message and error is None.
+    """
+    results = [(None, None)] * len(message_ids)
+    
+    def callback(request_id, response, exception):
+        results[int(request_id)] = (response, exception)
+    
+    for start in range(0, len(message_ids), GMAIL_BATCH_SIZE):
+        batch = service.new_batch_http_request(callback=callback)
+        for index in range(start, min(start + GMAIL_BATCH_SIZE, len(message_ids))):
+            batch.add(
+                service.users().messages().get(userId="me", id=message_ids[index], **get_kwargs),
+                request_id=str(index)
+            )
+        batch.execute()
+    
+    return results
+
+# Headers and response fields requested when listing emails
+LISTING_HEADERS = ["Subject", "From", "Date"]
+LISTING_FIELDS = "id,threadId,historyId,internalDate,snippet,labelIds,payload(mimeType,headers)"
+LIST_FIELDS = "messages(id),nextPageToken,resultSizeEstimate"
+BODY_PREVIEW_CHARS = 150
+
+def summarize_email(msg: dict) -> dict:
+    """Build the listing entry for a message fetched with format="metadata".
+    
+    Args:
+        msg (dict): Gmail message resource with payload headers and snippet
+        
+    Returns:
+        dict: id, threadId, subject, from, date, body_preview and has_attachments
+    """
+    headers = msg.get("payload", {}).get("headers", [])
+    subject = next((h["value"] for h in headers if h["name"].lower() == "subject"), "No Subject")
+    sender_email = next((h["value"] for h in headers if h["name"].lower() == "from"), "Unknown")
+    date_str = next((h["value"] for h in headers if h["name"].lower() == "date"), "")
+    
+    # Gmail's snippet is an HTML-escaped plain text preview of the body; when
+    # it is missing, decode just enough of the body to fill the preview
+    snippet = msg.get("snippet")
+    if snippet:
+        preview = html.unescape(snippet)
+    else:
+        preview = extract_email_body(msg, max_chars=BODY_PREVIEW_CHARS + 1)
+    
+    return {
+        "id": msg["id"],
+        "threadId": msg.get("threadId", ""),
+        "subject": subject,
+        "from": sender_email,
+        "date": date_str,
+        "body_preview": preview[:BODY_PREVIEW_CHARS] + "..." if len(preview) > BODY_PREVIEW_CHARS else preview,
+        # Messages with attachments are sent as multipart/mixed
+        "has_attachments": msg.get("payload", {}).get("mimeType", "") == "multipart/mixed"
+    }
+
+def fetch_listing_metadata(service, message_ids: List[str]) -> List[tuple]:
+    """Batch-fetch the listing metadata (headers and snippet) of several messages."""
+    return batch_get_messages(
+        service,
+        message_ids,
+        format="metadata",
+        metadataHeaders=LISTING_HEADERS,
+        fields=LISTING_FIELDS
+    )
+
+def fetch_label_ids(service, message_ids: List[str]) -> List[tuple]:
+    """Batch-fetch only the current labels of several messages."""
+    return batch_get_messages(service, message_ids, format="minimal", fields="id,labelIds")
+
+def get_ready_mailbox_sync():
+    """Return the mailbox mirror if it is enabled and can answer queries, else None."""
+    mailbox_sync = get_mailbox_sync(
+        lambda: get_service('gmail', 'v1', get_credentials()),
+        fetch_listing_metadata,
+        fetch_label_ids
+    )
+    if mailbox_sync is not None and mailbox_sync.is_ready():
+        return mailbox_sync
+    return None
+
+def get_synced_message_cache(service):
+    """Return the local message cache with label state brought up to date.
+    
+    A failed sync is logged rather than raised; the cache is then used as is.
+    When the mailbox mirror is enabled it owns the history sync instead.
+    """
+    cache = get_message_cache()
+    if mailbox_sync_enabled:
+        return cache
+    try:
+        cache.sync(service)
+    except Exception as e:
+        logger.warning("Gmail cache sync failed: %s", e)
+    return cache
+
+def get_date_range(date_filter: str) -> tuple:
+    """Translate a date filter (today, yesterday, week, month) into dates.
+    
+    Returns:
+        tuple: (after, before) dates; either may be None
+    """
+    today = datetime.datetime.now().date()
+    date_filter = date_filter.lower()
+    if date_filter == "today":
+        return today, None
+    if date_filter == "yesterday":
+        return today - datetime.timedelta(days=1), today
+    if date_filter == "week":
+        return today - datetime.timedelta(days=7), None
+    if date_filter == "month":
+        return today - datetime.timedelta(days=30), None
+    return None, None
+
+def _epoch_ms(date: Optional[datetime.date]) -> Optional[int]:
+    """Local midnight of a date as epoch milliseconds."""
+    if date is None:
+        return None
+    return int(datetime.datetime.combine(date, datetime.time()).timestamp() * 1000)
+
+# The largest page users.messages.list returns
+LIST_PAGE_SIZE = 500
+
+def load_listing_entries(service, cache, message_ids: List[str]) -> List[dict]:
+    """Build listing entries for message IDs, from the cache where possible.
+    
+    Messages that are not cached yet are fetched in batches and cached.
+    
+    Returns:
+        List[dict]: One entry per ID, in order: a summarize_email() dict, or
+            {"id", "error"} if the message could not be fetched
+    """
+    cached = cache.get_many(message_ids)
+    missing_ids = [message_id for message_id in message_ids if message_id not in cached]
+    fetched = dict(zip(missing_ids, fetch_listing_metadata(service, missing_ids)))
+    
+    entries = []
+    for message_id in message_ids:
+        msg = cached.get(message_id)
+        if msg is None:
+            msg, error = fetched[message_id]
+            if error is not None:
+                entries.append({"id": message_id, "error": str(error)})
+                continue
+            cache.put(msg)
+        entries.append(summarize_email(msg))
+    return entries
+
+def iter_emails(query: str = "", max_results: Optional[int] = None, page_size: int = 100, service=None) -> Iterator[dict]:
+    """Lazily yield the listing entries of messages matching a Gmail query.
+    
+    Result pages are followed through nextPageToken. While the details of one
+    page are being fetched the next page is already being listed in the
+    background, and entries are yielded as soon as their page is ready, so
+    callers can stop early and memory stays bounded by one page.
+    
+    Args:
+        query (str): Gmail search query
+        max_results (Optional[int]): Stop after this many messages (default: all)
+        page_size (int): Messages per listed page (at most LIST_PAGE_SIZE)
+        service: Gmail API service (default: the shared service)
+        
+    Yields:
+        dict: A summarize_email() dict, or {"id", "error"} for messages that
+            could not be fetched
+    """
+    if service is None:
+        service = get_service('gmail', 'v1', get_credentials())
+    cache = get_synced_message_cache(service)
+    remaining = max_results
+    if remaining is not None:
+        page_size = min(page_size, remaining)
+    page_size = min(page_size, LIST_PAGE_SIZE)
+    
+    def list_page(page_token):
+        return service.users().messages().list(
+            userId="me",
+            q=query,
+            maxResults=page_size if remaining is None else min(page_size, remaining),
+            pageToken=page_token,
+            fields=LIST_FIELDS
+        ).execute()
+    
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        page = list_page(None)
+        while True:
+            message_ids = [message["id"] for message in page.get("messages", [])]
+            if remaining is not None:
+                message_ids = message_ids[:remaining]
+                remaining -= len(message_ids)
+            
+            # List the next page while this one's details are being fetched
+            page_token = page.get("nextPageToken")
+            more = page_token and (remaining is None or remaining > 0)
+            next_page = pool.submit(list_page, page_token) if more else None
+            
+            yield from load_listing_entries(service, cache, message_ids)
+            
+            if next_page is None:
+                return
+            page = next_page.result()
+
 def get_emails(
     max_results: int = 10, 
     sender: str = "", 
@@ -169,19 +455,40 @@ def get_emails(
     """Get emails from Gmail with optional filtering.
     
     Args:
-        max_results (int): Maximum number of emails to return (default 10)
+        max_results (int): Maximum number of emails to return (default 10); may span several result pages
         sender (str): Filter emails from a specific sender email address
         date_filter (str): Filter by date (today, yesterday, week, month)
         subject_filter (str): Filter by text in the subject line
         is_unread (bool): Filter by unread emails only
         
     Returns:
-        dict: Status and list of filtered emails
+        dict: Status and list of filtered emails. Each email carries its headers
+            and a short body preview; use get_email_by_id for the full body.
     """
     try:
-        # Get credentials and build service
+        # Get credentials and the shared service
         creds = get_credentials()
-        service = build('gmail', 'v1', credentials=creds)
+        service = get_service('gmail', 'v1', creds)
+        
+        after_date, before_date = get_date_range(date_filter) if date_filter else (None, None)
+        
+        # Answer from the local mailbox mirror when it is available
+        mailbox_sync = get_ready_mailbox_sync()
+        if mailbox_sync is not None:
+            messages = mailbox_sync.cache.query(
+                sender=sender,
+                subject=subject_filter,
+                after_ms=_epoch_ms(after_date),
+                before_ms=_epoch_ms(before_date),
+                unread_only=is_unread,
+                limit=max_results
+            )
+            emails = [summarize_email(msg) for msg in messages]
+            return {
+                "status": "success",
+                "message": f"Retrieved {len(emails)} emails",
+                "emails": emails
+            }
         
         # Build the query string for Gmail API
         query_parts = []
@@ -189,23 +496,10 @@ def get_emails(
         if sender:
             query_parts.append(f"from:{sender}")
         
-        if date_filter:
-            today = datetime.datetime.now().date()
-            if date_filter.lower() == "today":
-                date_str = today.strftime("%Y/%m/%d")
-                query_parts.append(f"after:{date_str}")
-            elif date_filter.lower() == "yesterday":
-                yesterday = today - datetime.timedelta(days=1)
-                date_str = yesterday.strftime("%Y/%m/%d")
-                query_parts.append(f"after:{date_str} before:{today.strftime('%Y/%m/%d')}")
-            elif date_filter.lower() == "week":
-                week_ago = today - datetime.timedelta(days=7)
-                date_str = week_ago.strftime("%Y/%m/%d")
-                query_parts.append(f"after:{date_str}")
-            elif date_filter.lower() == "month":
-                month_ago = today - datetime.timedelta(days=30)
-                date_str = month_ago.strftime("%Y/%m/%d")
-                query_parts.append(f"after:{date_str}")
+        if after_date:
+            query_parts.append(f"after:{after_date.strftime('%Y/%m/%d')}")
+        if before_date:
+            query_parts.append(f"before:{before_date.strftime('%Y/%m/%d')}")
         
         if subject_filter:
             query_parts.append(f"subject:{subject_filter}")
@@ -215,34 +509,22 @@ def get_emails(
         
         query = " ".join(query_parts) if query_parts else ""
         
-        # Fetch messages that match the query
-        results = service.users().messages().list(userId="me", q=query, maxResults=max_results).execute()
-        messages = results.get("messages", [])
-        
+        # Walk the result pages lazily and stop once we have enough
         emails = []
-        for message in messages:
-            # Get the full message details
-            msg = service.users().messages().get(userId="me", id=message["id"], format="full").execute()
-            
-            # Parse headers to get subject, from, and date
-            headers = msg["payload"]["headers"]
-            subject = next((h["value"] for h in headers if h["name"].lower() == "subject"), "No Subject")
-            sender_email = next((h["value"] for h in headers if h["name"].lower() == "from"), "Unknown")
-            date_str = next((h["value"] for h in headers if h["name"].lower() == "date"), "")
-            
-            # Extract body using the helper function
-            body = extract_email_body(msg)
-            
-            # Add to our email list
-            emails.append({
-                "id": message["id"],
-                "threadId": msg["threadId"],
-                "subject": subject,
-                "from": sender_email,
-                "date": date_str,
-                "body_preview": body[:150] + "..." if len(body) > 150 else body,
-                "has_attachments": any("filename" in part for part in msg["payload"].get("parts", []))
-            })
+        failed = []
+        for entry in iter_emails(query, max_results=max_results, service=service):
+            if "error" in entry:
+                failed.append(entry)
+            else:
+                emails.append(entry)
+        
+        if failed:
+            return {
+                "status": "partial_success" if emails else "error",
+                "message": f"Retrieved {len(emails)} emails, {len(failed)} could not be fetched",
+                "emails": emails,
+                "failed": failed
+            }
         
         return {
             "status": "success",
@@ -271,12 +553,16 @@ def get_email_by_id(email_id: str) -> dict:
         dict: The full email content
     """
     try:
-        # Get credentials and build service
+        # Get credentials and the shared service
         creds = get_credentials()
-        service = build('gmail', 'v1', credentials=creds)
+        service = get_service('gmail', 'v1', creds)
         
-        # Fetch the specific message
-        msg = service.users().messages().get(userId="me", id=email_id, format="full").execute()
+        # Fetch the specific message, unless it is already cached
+        cache = get_synced_message_cache(service)
+        msg = cache.get(email_id, full=True)
+        if msg is None:
+            msg = service.users().messages().get(userId="me", id=email_id, format="full").execute()
+            cache.put(msg, full=True)
         
         # Parse headers
         headers = msg["payload"]["headers"]
@@ -327,41 +613,92 @@ def get_email_by_id(email_id: str) -> dict:
             "message": f"An unexpected error occurred: {str(e)}"
         }
 
-def extract_email_body(message):
-    """Extract the plain text body from a Gmail message."""
-    if not message["payload"]:
-        return ""
+# Bytes of raw HTML decoded per character of text wanted from an HTML-only body
+HTML_PREFIX_RATIO = 16
+
+_HTML_DROP = re.compile(r"<(script|style|head)\b.*?</\1\s*>|<!--.*?-->", re.IGNORECASE | re.DOTALL)
+_HTML_BREAK = re.compile(r"<\s*(br|/p|/div|/tr|/li|/h[1-6])\b[^>]*>", re.IGNORECASE)
+_HTML_TAG = re.compile(r"<[^>]+>")
+_BLANK_LINES = re.compile(r"\n\s*\n+")
+_SPACES = re.compile(r"[ \t\r\f\v]+")
+
+def html_to_text(markup: str) -> str:
+    """Convert HTML to readable plain text with a few regular expression passes."""
+    text = _HTML_DROP.sub("", markup)
+    text = _HTML_BREAK.sub("\n", text)
+    text = _HTML_TAG.sub("", text)
+    text = html.unescape(text)
+    text = _SPACES.sub(" ", text)
+    return _BLANK_LINES.sub("\n\n", text).strip()
+
+def _part_charset(part: dict) -> str:
+    """Charset declared in a part's Content-Type header (default utf-8)."""
+    for header in part.get("headers", []):
+        if header["name"].lower() == "content-type":
+            content_type = email.message.Message()
+            content_type["Content-Type"] = header["value"]
+            return content_type.get_content_charset() or "utf-8"
+    return "utf-8"
+
+def _decode_part(part: dict, max_bytes: Optional[int] = None) -> str:
+    """Decode a part's base64url body in its declared charset.
     
-    def get_body_from_part(part):
-        """Recursive function to extract body from message parts."""
-        if part.get("mimeType") == "text/plain":
-            if "data" in part.get("body", {}):
-                body_bytes = base64.urlsafe_b64decode(part["body"]["data"])
-                return body_bytes.decode("utf-8")
-        
-        # Check for multipart
-        if part.get("mimeType", "").startswith("multipart/"):
-            for subpart in part.get("parts", []):
-                body = get_body_from_part(subpart)
-                if body:
-                    return body
+    With max_bytes only the base64 prefix covering that many bytes is decoded,
+    and a multi-byte character cut off at the end is dropped.
+    """
+    data = part.get("body", {}).get("data", "")
+    if max_bytes is not None:
+        # Every 4 base64 characters encode 3 bytes
+        data = data[:-(-max_bytes // 3) * 4]
+    raw = base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+    
+    try:
+        decoder = codecs.getincrementaldecoder(_part_charset(part))(errors="replace")
+    except LookupError:
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    return decoder.decode(raw, final=max_bytes is None)
+
+def extract_email_body(message, max_chars: Optional[int] = None) -> str:
+    """Extract the plain text body from a Gmail message.
+    
+    The first text/plain part is used; if there is none, the first text/html
+    part is converted to text. Parts are decoded in their declared charset.
+    
+    Args:
+        message (dict): Gmail message resource fetched with format="full"
+        max_chars (Optional[int]): Only decode enough of the body to return
+            this many characters (default: the whole body)
         
+    Returns:
+        str: The body text, or the message snippet if there is no text part
+    """
+    payload = message.get("payload")
+    if not payload:
         return ""
     
-    # Try to get body from payload directly
-    if "body" in message["payload"] and "data" in message["payload"]["body"]:
-        body_bytes = base64.urlsafe_b64decode(message["payload"]["body"]["data"])
-        return body_bytes.decode("utf-8")
+    # Depth-first walk over the MIME tree without recursion
+    html_part = None
+    stack = [payload]
+    while stack:
+        part = stack.pop()
+        mime_type = part.get("mimeType", "")
+        if "data" in part.get("body", {}):
+            if mime_type == "text/plain" or part is payload and not mime_type.startswith("text/html"):
+                # UTF-8 needs at most 4 bytes per character
+                text = _decode_part(part, max_chars * 4 if max_chars is not None else None)
+                return text[:max_chars] if max_chars is not None else text
+            if mime_type == "text/html" and html_part is None:
+                html_part = part
+        if mime_type.startswith("multipart/") or part is payload:
+            stack.extend(reversed(part.get("parts", [])))
     
-    # Try to get body from parts
-    if "parts" in message["payload"]:
-        for part in message["payload"]["parts"]:
-            body = get_body_from_part(part)
-            if body:
-                return body
+    if html_part is not None:
+        max_bytes = max_chars * 4 * HTML_PREFIX_RATIO if max_chars is not None else None
+        text = html_to_text(_decode_part(html_part, max_bytes))
+        return text[:max_chars] if max_chars is not None else text
     
     # Fallback to snippet
-    return message.get("snippet", "")
+    return html.unescape(message.get("snippet", ""))
 
 def mark_email_as_read(email_id: str) -> dict:
     """Mark an email as read.
@@ -373,9 +710,9 @@ def mark_email_as_read(email_id: str) -> dict:
         dict: Status of the operation
     """
     try:
-        # Get credentials and build service
+        # Get credentials and the shared service
         creds = get_credentials()
-        service = build('gmail', 'v1', credentials=creds)
+        service = get_service('gmail', 'v1', creds)
         
         # Remove UNREAD label
         service.users().messages().modify(
@@ -383,6 +720,7 @@ def mark_email_as_read(email_id: str) -> dict:
             id=email_id,
             body={"removeLabelIds": ["UNREAD"]}
         ).execute()
+        get_message_cache().update_labels(email_id, removed=["UNREAD"])
         
         return {
             "status": "success",
@@ -400,6 +738,142 @@ def mark_email_as_read(email_id: str) -> dict:
             "message": f"An unexpected error occurred: {str(e)}"
         }
 
+# users.messages.batchModify accepts at most 1000 message IDs per call
+GMAIL_MODIFY_BATCH_SIZE = 1000
+
+def list_message_ids(service, query: str, max_results: int) -> List[str]:
+    """List the IDs of up to max_results messages matching a Gmail query, following every page."""
+    message_ids: List[str] = []
+    page_token = None
+    while len(message_ids) < max_results:
+        page = service.users().messages().list(
+            userId="me",
+            q=query,
+            maxResults=min(LIST_PAGE_SIZE, max_results - len(message_ids)),
+            pageToken=page_token,
+            fields="messages(id),nextPageToken"
+        ).execute()
+        message_ids.extend(message["id"] for message in page.get("messages", []))
+        page_token = page.get("nextPageToken")
+        if not page_token:
+            break
+    return message_ids[:max_results]
+
+def resolve_label_ids(service, labels: List[str]) -> List[str]:
+    """Map label names or IDs (case-insensitive) to Gmail label IDs.
+    
+    Raises:
+        ValueError: If a label does not exist
+    """
+    if not labels:
+        return []
+    known = service.users().labels().list(userId="me", fields="labels(id,name)").execute().get("labels", [])
+    by_key = {}
+    for label in known:
+        by_key[label["id"].lower()] = label["id"]
+        by_key[label["name"].lower()] = label["id"]
+    missing = [label for label in labels if label.lower() not in by_key]
+    if missing:
+        raise ValueError(f"Unknown label(s): {', '.join(missing)}. Use list_email_labels to see the available labels.")
+    return [by_key[label.lower()] for label in labels]
+
+def modify_email_labels(
+    email_ids: list[str],
+    add_labels: list[str],
+    remove_labels: list[str],
+    query: str = "",
+    max_messages: int = 1000
+) -> dict:
+    """Add and remove labels on many emails at once.
+    
+    Args:
+        email_ids (list[str]): Gmail message IDs to change (may be empty when query is given)
+        add_labels (list[str]): Label names or IDs to add (e.g., ["STARRED", "Receipts"])
+        remove_labels (list[str]): Label names or IDs to remove (e.g., ["UNREAD", "INBOX"] to mark as read and archive)
+        query (str): Gmail search query selecting more messages (e.g., "from:news@example.com older_than:30d")
+        max_messages (int): Maximum number of messages the query may select (default 1000)
+        
+    Returns:
+        dict: Status, number of messages modified, whether the query matched more
+            messages than max_messages, and a message. When a batch fails after
+            earlier batches were applied, the error also carries the number
+            already modified and the remaining_ids to pass as email_ids on retry
+    """
+    if not add_labels and not remove_labels:
+        return {"status": "error", "message": "Pass at least one label to add or remove."}
+    if not email_ids and not query:
+        return {"status": "error", "message": "Pass email_ids or a query selecting the emails to change."}
+    message_ids: List[str] = []
+    modified = 0
+    try:
+        creds = get_credentials()
+        service = get_service('gmail', 'v1', creds)
+        add_ids = resolve_label_ids(service, add_labels)
+        remove_ids = resolve_label_ids(service, remove_labels)
+        
+        message_ids = list(dict.fromkeys(email_ids))
+        truncated = False
+        if query:
+            # Ask for one more than allowed to learn whether the query was cut short
+            matched = list_message_ids(service, query, max_messages + 1)
+            truncated = len(matched) > max_messages
+            seen = set(message_ids)
+            message_ids.extend(message_id for message_id in matched[:max_messages] if message_id not in seen)
+        
+        cache = get_message_cache()
+        for start in range(0, len(message_ids), GMAIL_MODIFY_BATCH_SIZE):
+            chunk = message_ids[start:start + GMAIL_MODIFY_BATCH_SIZE]
+            service.users().messages().batchModify(
+                userId="me",
+                body={"ids": chunk, "addLabelIds": add_ids, "removeLabelIds": remove_ids}
+            ).execute()
+            cache.update_labels_many(chunk, added=add_ids, removed=remove_ids)
+            modified += len(chunk)
+        
+        message = f"Updated labels on {modified} email(s)."
+        if truncated:
+            message += f" The query matched more than {max_messages} emails; only the first {max_messages} were changed."
+        return {
+            "status": "success",
+            "modified": modified,
+            "truncated": truncated,
+            "message": message
+        }
+    
+    except HttpError as error:
+        return _label_error(f"An error occurred: {error}", modified, message_ids)
+    except Exception as e:
+        return _label_error(f"An unexpected error occurred: {str(e)}", modified, message_ids)
+
+def _label_error(message: str, modified: int, message_ids: List[str]) -> dict:
+    """Build the error result of modify_email_labels, keeping the batches already applied."""
+    if not modified:
+        return {"status": "error", "message": message}
+    remaining_ids = message_ids[modified:]
+    return {
+        "status": "error",
+        "modified": modified,
+        "remaining_ids": remaining_ids,
+        "message": (
+            f"{message}. Labels were already updated on {modified} email(s); "
+            f"retry with email_ids set to the {len(remaining_ids)} remaining_ids to finish."
+        )
+    }
+
+def mark_emails_as_read(email_ids: list[str], query: str = "", max_messages: int = 1000) -> dict:
+    """Mark many emails as read at once.
+    
+    Args:
+        email_ids (list[str]): Gmail message IDs to mark as read (may be empty when query is given)
+        query (str): Gmail search query selecting more messages (e.g., "is:unread from:alerts@example.com")
+        max_messages (int): Maximum number of messages the query may select (default 1000)
+        
+    Returns:
+        dict: Status, number of messages marked as read, and a message. A partial
+            failure also returns the number already marked and the remaining_ids
+    """
+    return modify_email_labels(email_ids, [], ["UNREAD"], query=query, max_messages=max_messages)
+
 def count_unread_emails() -> dict:
     """Count the number of unread emails.
     
@@ -407,15 +881,26 @@ def count_unread_emails() -> dict:
         dict: Count of unread emails
     """
     try:
-        # Get credentials and build service
+        # Count locally when the mailbox mirror is available
+        mailbox_sync = get_ready_mailbox_sync()
+        if mailbox_sync is not None:
+            total = mailbox_sync.cache.count_unread()
+            return {
+                "status": "success",
+                "message": f"You have {total} unread emails",
+                "count": total
+            }
+        
+        # Get credentials and the shared service
         creds = get_credentials()
-        service = build('gmail', 'v1', credentials=creds)
+        service = get_service('gmail', 'v1', creds)
         
         # Get unread messages
         results = service.users().messages().list(
             userId="me", 
             q="is:unread",
-            maxResults=1
+            maxResults=1,
+            fields="resultSizeEstimate"
         ).execute()
         
         total = results.get("resultSizeEstimate", 0)
@@ -437,12 +922,41 @@ def count_unread_emails() -> dict:
             "message": f"An unexpected error occurred: {str(e)}"
         }
 
-def create_document(title: str, content: str = "") -> dict:
+GOOGLE_DOCS_MIME_TYPE = "application/vnd.google-apps.document"
+GOOGLE_SHEETS_MIME_TYPE = "application/vnd.google-apps.spreadsheet"
+
+# Documents created at once by create_documents
+DOCS_CREATE_WORKERS = int(os.environ.get("DOCS_CREATE_WORKERS", "8"))
+
+def _create_populated_document(docs_service, title: str, content: str, content_format: str) -> dict:
+    """Create a Google Doc and fill it with one batchUpdate; returns its ID and URL."""
+    requests, text = doc_builder.compile_content(content, content_format)
+    doc = docs_service.documents().create(body={'title': title}, fields='documentId,revisionId').execute()
+    document_id = doc['documentId']
+    revision_id = doc.get('revisionId')
+    drive_index.record_file({'id': document_id, 'name': title, 'mimeType': GOOGLE_DOCS_MIME_TYPE})
+    
+    # If content is provided, add it to the document
+    if requests:
+        revision_id = doc_edits.batch_update(docs_service, document_id, requests, None)
+    
+    # Later appends and replacements can start from the known state
+    if text is not None:
+        doc_edits.document_state_cache.put(document_id, revision_id, 2 + doc_edits.utf16_len(text), text + "\n")
+    
+    return {
+        "document_id": document_id,
+        "document_url": f"https://docs.google.com/document/d/{document_id}/edit"
+    }
+
+def create_document(title: str, content: str = "", content_format: str = "plain") -> dict:
     """Creates a new Google Doc.
     
     Args:
         title (str): Title of the new document
         content (str, optional): Initial content for the document
+        content_format (str, optional): "plain" (default) inserts content as is; "markdown"
+            turns "#" headings, "-" and "1." lists and "|" tables into real document structure
         
     Returns:
         dict: Status and details of the created document
@@ -450,46 +964,14 @@ def create_document(title: str, content: str = "") -> dict:
     try:
         # Get credentials
         creds = get_credentials()
+        docs_service = get_service('docs', 'v1', creds)
         
-        # Create Drive service to create the document
-        drive_service = build('drive', 'v3', credentials=creds)
-        docs_service = build('docs', 'v1', credentials=creds)
-        
-        # Create an empty document
-        doc_metadata = {
-            'name': title,
-            'mimeType': 'application/vnd.google-apps.document'
-        }
-        
-        doc = drive_service.files().create(body=doc_metadata).execute()
-        document_id = doc.get('id')
-        
-        # If content is provided, add it to the document
-        if content:
-            requests = [
-                {
-                    'insertText': {
-                        'location': {
-                            'index': 1
-                        },
-                        'text': content
-                    }
-                }
-            ]
-            
-            docs_service.documents().batchUpdate(
-                documentId=document_id, 
-                body={'requests': requests}
-            ).execute()
-        
-        # Get the document URL
-        document_url = f"https://docs.google.com/document/d/{document_id}/edit"
+        created = _create_populated_document(docs_service, title, content, content_format)
         
         return {
             "status": "success",
             "message": f"Document '{title}' created successfully",
-            "document_id": document_id,
-            "document_url": document_url
+            **created
         }
         
     except HttpError as error:
@@ -503,6 +985,58 @@ def create_document(title: str, content: str = "") -> dict:
             "message": f"An unexpected error occurred: {str(e)}"
         }
 
+def create_documents(titles: list[str], contents: list[str], content_format: str = "plain") -> dict:
+    """Creates several Google Docs at once.
+    
+    Args:
+        titles (list[str]): Titles of the new documents
+        contents (list[str]): Initial content of each document, in the same order as titles
+            (an empty string for an empty document)
+        content_format (str, optional): "plain" or "markdown", as for create_document
+        
+    Returns:
+        dict: Status, one result per document (title, status, and document_id and
+            document_url or an error message), and a message
+    """
+    if len(contents) != len(titles):
+        return {
+            "status": "error",
+            "message": f"Got {len(titles)} titles but {len(contents)} contents; pass one content per title."
+        }
+    try:
+        creds = get_credentials()
+        docs_service = get_service('docs', 'v1', creds)
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": f"An unexpected error occurred: {str(e)}"
+        }
+    
+    def create(title: str, content: str) -> dict:
+        try:
+            return {"title": title, "status": "success",
+                    **_create_populated_document(docs_service, title, content, content_format)}
+        except HttpError as error:
+            return {"title": title, "status": "error", "message": f"An error occurred: {error}"}
+        except Exception as e:
+            return {"title": title, "status": "error", "message": f"An unexpected error occurred: {str(e)}"}
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(DOCS_CREATE_WORKERS, len(titles)))) as pool:
+        results = list(pool.map(create, titles, contents))
+    
+    created = sum(1 for result in results if result["status"] == "success")
+    if created == len(results):
+        status = "success"
+    elif created:
+        status = "partial_success"
+    else:
+        status = "error"
+    return {
+        "status": status,
+        "documents": results,
+        "message": f"Created {created} of {len(results)} document(s)."
+    }
+
 def delete_document(document_id: str) -> dict:
     """Deletes a Google Doc.
     
@@ -517,10 +1051,12 @@ def delete_document(document_id: str) -> dict:
         creds = get_credentials()
         
         # Create Drive service
-        drive_service = build('drive', 'v3', credentials=creds)
+        drive_service = get_service('drive', 'v3', creds)
         
         # Delete the document (move to trash)
         drive_service.files().delete(fileId=document_id).execute()
+        doc_edits.document_state_cache.invalidate(document_id)
+        drive_index.forget_file(document_id)
         
         return {
             "status": "success",
@@ -554,53 +1090,14 @@ def edit_document(document_id: str, content: str, replace_all: bool = False) ->
         creds = get_credentials()
         
         # Create Docs service
-        docs_service = build('docs', 'v1', credentials=creds)
-        
-        requests = []
+        docs_service = get_service('docs', 'v1', creds)
         
-        # If replacing all content, first get the document to find its content
         if replace_all:
-            document = docs_service.documents().get(documentId=document_id).execute()
-            end_index = document.get('body', {}).get('content', [])[-1].get('endIndex', 1)
-            
-            # Delete all content
-            requests.append({
-                'deleteContentRange': {
-                    'range': {
-                        'startIndex': 1,
-                        'endIndex': end_index - 1
-                    }
-                }
-            })
-            
-            # Insert new content at the beginning
-            requests.append({
-                'insertText': {
-                    'location': {
-                        'index': 1
-                    },
-                    'text': content
-                }
-            })
+            # Only the ranges that differ from the current text are rewritten
+            doc_edits.replace_text(docs_service, doc_edits.document_state_cache, document_id, content)
         else:
-            # Append to the end of the document
-            document = docs_service.documents().get(documentId=document_id).execute()
-            end_index = document.get('body', {}).get('content', [])[-1].get('endIndex', 1)
-            
-            requests.append({
-                'insertText': {
-                    'location': {
-                        'index': end_index - 1
-                    },
-                    'text': content
-                }
-            })
-        
-        # Execute the changes
-        docs_service.documents().batchUpdate(
-            documentId=document_id, 
-            body={'requests': requests}
-        ).execute()
+            # Appends reuse the end index remembered from the last edit
+            doc_edits.append_text(docs_service, doc_edits.document_state_cache, document_id, content)
         
         return {
             "status": "success",
@@ -632,7 +1129,33 @@ def update_sheet_values(spreadsheet_id: str, range_name: str, values: list[list[
     """
     try:
         creds = get_credentials()
-        service = build('sheets', 'v4', credentials=creds)
+        service = get_service('sheets', 'v4', creds)
+        range_name = sheet_metadata_cache.resolve_range(service, spreadsheet_id, range_name)
+        
+        # Large uploads, by row count or by bytes, are split into size-bounded requests
+        if (len(values) > sheets_bulk.DEFAULT_CHUNK_ROWS
+                or sheets_bulk.payload_size(values) > sheets_bulk.DEFAULT_CHUNK_BYTES):
+            try:
+                stats = sheets_bulk.update_rows(service, spreadsheet_id, range_name, values)
+            except sheets_bulk.BulkWriteError as error:
+                offset = error.stats["failed_row_offset"]
+                return {
+                    "status": "error",
+                    "message": (
+                        f"Writing failed after {error.stats['rows_written']} rows were written "
+                        f"({error.stats['updated_range']}): {error.cause}. To write the rest, call "
+                        f"update_sheet_values with range_name '{error.stats['next_range']}' and the values "
+                        f"from row {offset + 1} of this call on."
+                    ),
+                    **error.stats
+                }
+            if stats is not None:
+                return {
+                    "status": "success",
+                    "message": f"Updated range {range_name} in spreadsheet {spreadsheet_id} in {stats['chunks']} chunks",
+                    "updated_cells": stats["cells_written"],
+                    **stats
+                }
         
         body = {
             'values': values
@@ -651,6 +1174,8 @@ def update_sheet_values(spreadsheet_id: str, range_name: str, values: list[list[
             "updated_cells": result.get("updatedCells", 0)
         }
         
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
     except HttpError as error:
         return {
             "status": "error",
@@ -662,13 +1187,127 @@ def update_sheet_values(spreadsheet_id: str, range_name: str, values: list[list[
             "message": f"An unexpected error occurred: {str(e)}"
         }
 
+def bulk_append_sheet_rows(
+    spreadsheet_id: str,
+    range_name: str,
+    file_path: str,
+    skip_header: bool = False,
+    start_row: int = 0
+) -> dict:
+    """Appends all rows of a local CSV or Parquet file to a Google Sheet.
+    
+    The file is streamed and written in size-bounded chunks with retries, so
+    tens of thousands of rows can be uploaded without loading them all at once.
+    
+    Args:
+        spreadsheet_id (str): The ID of the spreadsheet.
+        range_name (str): The A1 notation of the table to append to (e.g., "Sheet1!A1").
+        file_path (str): Path of the .csv or .parquet file to upload, inside the upload directory.
+        skip_header (bool): Whether to skip the file's header row (default False).
+        start_row (int): Number of the file's rows (after a skipped header) to leave out, to
+            resume an upload that failed part way; use the retry_start_row of the failed call (default 0).
+        
+    Returns:
+        dict: Status, message, and rows/cells written, the range written, chunk count, elapsed
+            seconds and rows per second. If the upload fails part way, the rows already written
+            and the retry_start_row to resume from.
+    """
+    try:
+        try:
+            resolved_path = local_files.resolve_allowed_path(
+                file_path, local_files.UPLOAD_DIR, sheets_bulk.UPLOAD_EXTENSIONS
+            )
+        except (PermissionError, FileNotFoundError) as error:
+            return {"status": "error", "message": str(error)}
+        creds = get_credentials()
+        service = get_service('sheets', 'v4', creds)
+        range_name = sheet_metadata_cache.resolve_range(service, spreadsheet_id, range_name)
+        rows = itertools.islice(sheets_bulk.iter_file_rows(resolved_path, skip_header=skip_header), start_row, None)
+        stats = sheets_bulk.append_rows(service, spreadsheet_id, range_name, rows)
+        return {
+            "status": "success",
+            "message": f"Appended {stats['rows_written']} rows from {file_path} to spreadsheet {spreadsheet_id}",
+            **stats
+        }
+    except sheets_bulk.BulkWriteError as error:
+        retry_start_row = start_row + error.stats["failed_row_offset"]
+        return {
+            "status": "error",
+            "message": (
+                f"The upload failed after {error.stats['rows_written']} rows were appended "
+                f"({error.stats['updated_range']}): {error.cause}. Those rows stay in the sheet. To append the rest, "
+                f"call bulk_append_sheet_rows again with the same file and skip_header and start_row={retry_start_row}; "
+                "starting over would append the written rows twice."
+            ),
+            **error.stats,
+            "retry_start_row": retry_start_row
+        }
+    except ImportError:
+        return {"status": "error", "message": "Reading Parquet files requires the pyarrow package."}
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    except HttpError as error:
+        return {"status": "error", "message": f"An API error occurred: {error}"}
+    except Exception as e:
+        return {"status": "error", "message": f"An unexpected error occurred: {str(e)}"}
+
+def batch_update_sheet_values(
+    spreadsheet_id: str,
+    ranges: list[str],
+    values: list[list[list[str]]],
+    major_dimension: str = "ROWS"
+) -> dict:
+    """Writes data to several ranges of a Google Sheet in one request.
+    
+    Args:
+        spreadsheet_id (str): The ID of the spreadsheet.
+        ranges (list[str]): The A1 notation of each range to write (e.g., ["Sheet1!A1", "Sheet2!B2:C3"]).
+        values (list[list[list[str]]]): One 2D list of string values per range, in the same order as ranges.
+        major_dimension (str): "ROWS" if each inner list is a row, "COLUMNS" if it is a column (default "ROWS").
+        
+    Returns:
+        dict: Status, message, and the number of updated cells per range.
+    """
+    try:
+        if len(ranges) != len(values):
+            return {"status": "error", "message": "ranges and values must have the same length."}
+        creds = get_credentials()
+        service = get_service('sheets', 'v4', creds)
+        body = {
+            'valueInputOption': 'RAW',
+            'data': [
+                {'range': range_name, 'majorDimension': major_dimension, 'values': range_values}
+                for range_name, range_values in zip(ranges, values)
+            ]
+        }
+        result = service.spreadsheets().values().batchUpdate(
+            spreadsheetId=spreadsheet_id,
+            body=body,
+            fields="totalUpdatedCells,responses(updatedRange,updatedCells)"
+        ).execute()
+        responses = result.get('responses', [])
+        return {
+            "status": "success",
+            "message": f"Updated {len(responses)} range(s) in spreadsheet {spreadsheet_id}",
+            "updated_cells": {
+                range_name: response.get('updatedCells', 0)
+                for range_name, response in zip(ranges, responses)
+            },
+            "total_updated_cells": result.get('totalUpdatedCells', 0)
+        }
+    except HttpError as error:
+        return {"status": "error", "message": f"An API error occurred: {error}"}
+    except Exception as e:
+        return {"status": "error", "message": f"An unexpected error occurred: {str(e)}"}
+
 def create_new_spreadsheet(title: str) -> dict:
     """Creates a new Google Spreadsheet."""
     try:
         creds = get_credentials()
-        service = build('sheets', 'v4', credentials=creds)
+        service = get_service('sheets', 'v4', creds)
         spreadsheet = {'properties': {'title': title}}
         sheet = service.spreadsheets().create(body=spreadsheet, fields='spreadsheetId,spreadsheetUrl').execute()
+        drive_index.record_file({'id': sheet.get('spreadsheetId'), 'name': title, 'mimeType': GOOGLE_SHEETS_MIME_TYPE})
         return {
             "status": "success",
             "message": f"Spreadsheet '{title}' created successfully.",
@@ -684,7 +1323,7 @@ def add_sheet_to_spreadsheet(spreadsheet_id: str, sheet_title: str) -> dict:
     """Adds a new sheet (tab) to an existing Google Spreadsheet."""
     try:
         creds = get_credentials()
-        service = build('sheets', 'v4', credentials=creds)
+        service = get_service('sheets', 'v4', creds)
         requests = [{
             'addSheet': {
                 'properties': {'title': sheet_title}
@@ -692,6 +1331,7 @@ def add_sheet_to_spreadsheet(spreadsheet_id: str, sheet_title: str) -> dict:
         }]
         body = {'requests': requests}
         response = service.spreadsheets().batchUpdate(spreadsheetId=spreadsheet_id, body=body).execute()
+        sheet_metadata_cache.invalidate(spreadsheet_id)
         new_sheet_properties = None
         for reply in response.get('replies', []):
             if 'addSheet' in reply:
@@ -711,11 +1351,29 @@ def add_sheet_to_spreadsheet(spreadsheet_id: str, sheet_title: str) -> dict:
     except Exception as e:
         return {"status": "error", "message": f"An unexpected error occurred: {str(e)}"}
 
-def get_sheet_values(spreadsheet_id: str, range_name: str) -> dict:
-    """Reads data from a specified range in a Google Sheet."""
+def get_sheet_values(spreadsheet_id: str, range_name: str, as_columns: bool = False) -> dict:
+    """Reads data from a specified range in a Google Sheet.
+    
+    Args:
+        spreadsheet_id (str): The ID of the spreadsheet.
+        range_name (str): The A1 notation of the range to read (e.g., "Sheet1!A1:B5").
+        as_columns (bool): Return typed columns keyed by the header row, with raw
+            (unformatted) numbers, instead of a list of rows (default False).
+    
+    Returns:
+        dict: Status, message, and values (or columns, dtypes and row_count when as_columns is set).
+    """
     try:
         creds = get_credentials()
-        service = build('sheets', 'v4', credentials=creds)
+        service = get_service('sheets', 'v4', creds)
+        range_name = sheet_metadata_cache.resolve_range(service, spreadsheet_id, range_name)
+        if as_columns:
+            values = _get_unformatted_values(service, spreadsheet_id, range_name)
+            return {
+                "status": "success",
+                "message": f"Successfully retrieved columns from range '{range_name}'.",
+                **sheet_frames.to_columns(sheet_frames.to_frame(values))
+            }
         result = service.spreadsheets().values().get(spreadsheetId=spreadsheet_id, range=range_name).execute()
         values = result.get('values', [])
         return {
@@ -723,6 +1381,131 @@ def get_sheet_values(spreadsheet_id: str, range_name: str) -> dict:
             "message": f"Successfully retrieved values from range '{range_name}'.",
             "values": values
         }
+    except ImportError:
+        return {"status": "error", "message": "Columnar results require the pandas package."}
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    except HttpError as error:
+        return {"status": "error", "message": f"An API error occurred: {error}"}
+    except Exception as e:
+        return {"status": "error", "message": f"An unexpected error occurred: {str(e)}"}
+
+def _get_unformatted_values(service, spreadsheet_id: str, range_name: str) -> list:
+    """Read a range with raw numbers and booleans rather than display strings."""
+    result = service.spreadsheets().values().get(
+        spreadsheetId=spreadsheet_id,
+        range=range_name,
+        valueRenderOption="UNFORMATTED_VALUE",
+        fields="values"
+    ).execute()
+    return result.get('values', [])
+
+def aggregate_sheet_values(
+    spreadsheet_id: str,
+    range_name: str,
+    operation: str,
+    value_column: str,
+    group_by_column: str = "",
+    filter_column: str = "",
+    filter_operator: str = "==",
+    filter_value: str = "",
+    header_row: bool = True
+) -> dict:
+    """Computes an aggregate over a column of a Google Sheet range without returning the cells.
+    
+    Use this for questions like "total of column C" or "average amount per category".
+    "sum", "mean" and "median" ignore cells that are not numbers. Dates and times are
+    read as spreadsheet serial numbers (days since 1899-12-30), so "min"/"max" of a
+    date column returns a serial number and date filters must compare against one.
+    
+    Args:
+        spreadsheet_id (str): The ID of the spreadsheet.
+        range_name (str): The A1 notation of the range to read (e.g., "Sheet1!A1:F1000").
+        operation (str): One of "sum", "mean", "median", "min", "max", "count", "nunique".
+        value_column (str): Header of the column to aggregate (or its letter, e.g. "C", when header_row is False).
+        group_by_column (str): Optional header of a column to group by; returns one result per group.
+        filter_column (str): Optional header of a column to filter rows on before aggregating.
+        filter_operator (str): One of "==", "!=", ">", ">=", "<", "<=", "contains" (default "==").
+        filter_value (str): Value to compare filter_column against.
+        header_row (bool): Whether the first row of the range holds column headers (default True).
+    
+    Returns:
+        dict: Status, message, the result (a value, or a mapping of group to value) and the number of rows considered.
+    """
+    try:
+        creds = get_credentials()
+        service = get_service('sheets', 'v4', creds)
+        resolved_range = sheet_metadata_cache.resolve_range(service, spreadsheet_id, range_name)
+        frame = sheet_frames.to_frame(
+            _get_unformatted_values(service, spreadsheet_id, resolved_range),
+            header_row=header_row
+        )
+        result = sheet_frames.aggregate(
+            frame,
+            operation,
+            value_column,
+            group_by_column=group_by_column,
+            filter_column=filter_column,
+            filter_operator=filter_operator,
+            filter_value=filter_value
+        )
+        return {
+            "status": "success",
+            "message": f"Computed {operation} of '{value_column}' over range '{range_name}'.",
+            "result": result,
+            "row_count": len(frame)
+        }
+    except ImportError:
+        return {"status": "error", "message": "Aggregations require the pandas package."}
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
+    except HttpError as error:
+        return {"status": "error", "message": f"An API error occurred: {error}"}
+    except Exception as e:
+        return {"status": "error", "message": f"An unexpected error occurred: {str(e)}"}
+
+def batch_get_sheet_values(
+    spreadsheet_id: str,
+    ranges: list[str],
+    value_render_option: str = "FORMATTED_VALUE",
+    major_dimension: str = "ROWS"
+) -> dict:
+    """Reads data from several ranges of a Google Sheet in one request.
+    
+    Args:
+        spreadsheet_id (str): The ID of the spreadsheet.
+        ranges (list[str]): The A1 notation of each range to read (e.g., ["Sheet1!A1:B5", "Sheet2!C:C"]).
+        value_render_option (str): "FORMATTED_VALUE" (as displayed), "UNFORMATTED_VALUE" (raw numbers) or "FORMULA" (default "FORMATTED_VALUE").
+        major_dimension (str): "ROWS" to return a list of rows, "COLUMNS" to return a list of columns (default "ROWS").
+        
+    Returns:
+        dict: Status, message, and the values of each range keyed by the requested range.
+    """
+    try:
+        creds = get_credentials()
+        service = get_service('sheets', 'v4', creds)
+        resolved_ranges = [
+            sheet_metadata_cache.resolve_range(service, spreadsheet_id, range_name) for range_name in ranges
+        ]
+        result = service.spreadsheets().values().batchGet(
+            spreadsheetId=spreadsheet_id,
+            ranges=resolved_ranges,
+            valueRenderOption=value_render_option,
+            majorDimension=major_dimension,
+            fields="valueRanges(values)"
+        ).execute()
+        # Value ranges come back in request order
+        value_ranges = result.get('valueRanges', [])
+        return {
+            "status": "success",
+            "message": f"Successfully retrieved values from {len(value_ranges)} range(s).",
+            "values": {
+                range_name: value_range.get('values', [])
+                for range_name, value_range in zip(ranges, value_ranges)
+            }
+        }
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}
     except HttpError as error:
         return {"status": "error", "message": f"An API error occurred: {error}"}
     except Exception as e:
@@ -732,14 +1515,10 @@ def delete_sheet_from_spreadsheet(spreadsheet_id: str, sheet_name: str) -> dict:
     """Deletes a sheet (tab) from a Google Spreadsheet by its name."""
     try:
         creds = get_credentials()
-        service = build('sheets', 'v4', credentials=creds)
-        sheet_metadata = service.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
-        sheets = sheet_metadata.get('sheets', '')
-        sheet_id_to_delete = None
-        for sheet in sheets:
-            if sheet.get('properties', {}).get('title', '') == sheet_name:
-                sheet_id_to_delete = sheet.get('properties', {}).get('sheetId')
-                break
+        service = get_service('sheets', 'v4', creds)
+        # Never delete by a cached sheetId: the tab may have been renamed or recreated since
+        sheet_properties = sheet_metadata_cache.find_sheet(service, spreadsheet_id, sheet_name, fresh=True)
+        sheet_id_to_delete = sheet_properties.get('sheetId') if sheet_properties else None
         if sheet_id_to_delete is None:
             return {
                 "status": "error",
@@ -752,6 +1531,7 @@ def delete_sheet_from_spreadsheet(spreadsheet_id: str, sheet_name: str) -> dict:
         }]
         body = {'requests': requests}
         service.spreadsheets().batchUpdate(spreadsheetId=spreadsheet_id, body=body).execute()
+        sheet_metadata_cache.invalidate(spreadsheet_id)
         return {
             "status": "success",
             "message": f"Sheet '{sheet_name}' deleted successfully from spreadsheet {spreadsheet_id}."
@@ -761,42 +1541,74 @@ def delete_sheet_from_spreadsheet(spreadsheet_id: str, sheet_name: str) -> dict:
     except Exception as e:
         return {"status": "error", "message": f"An unexpected error occurred: {str(e)}"}
 
-def search_drive_files_by_name(name_query: str, mime_type: Optional[str] = None, max_results: int = 10) -> dict:
+def _drive_query_literal(value: str) -> str:
+    """Quote a value for a Drive search query, escaping backslashes and quotes."""
+    return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+def search_drive_files_by_name(
+    name_query: str,
+    mime_type: Optional[str] = None,
+    max_results: int = 10,
+    match_mode: str = "contains"
+) -> dict:
     """Searches Google Drive for files by name (partial match).
     
     Args:
         name_query (str): The name or partial name of the file to search for.
         mime_type (Optional[str]): The MIME type to filter by (e.g., spreadsheets, docs). If None, searches all file types.
         max_results (int): Maximum number of files to return (default 10).
+        match_mode (str): "contains" (default) matches anywhere in the name, "prefix" matches
+            the start of the name, and "fuzzy" tolerates typos (only with the local Drive index).
     
     Returns:
         dict: Status, a list of files (with id, name, description, mimeType), and a message.
     """
+    if match_mode not in drive_index.MATCH_MODES:
+        return {
+            'status': 'error',
+            'message': f"Unsupported match_mode '{match_mode}'; use one of {', '.join(drive_index.MATCH_MODES)}."
+        }
     try:
+        index = drive_index.get_drive_index(lambda: get_service('drive', 'v3', get_credentials()))
+        if index is not None and index.is_ready():
+            file_list = index.search(name_query, mime_type, max_results, match_mode)
+            return {
+                'status': 'success',
+                'files': file_list,
+                'message': f"Found {len(file_list)} file(s) matching '{name_query}'."
+            }
+
         creds = get_credentials()
-        service = build('drive', 'v3', credentials=creds)
+        service = get_service('drive', 'v3', creds)
         # Build the query string
-        query = f"name contains '{name_query}'"
+        query = f"name contains {_drive_query_literal(name_query)}"
         if mime_type:
-            query += f" and mimeType='{mime_type}'"
+            query += f" and mimeType = {_drive_query_literal(mime_type)}"
         # Only return not-trashed files
         query += " and trashed = false"
-        results = service.files().list(
-            q=query,
-            pageSize=max_results,
-            fields="files(id, name, description, mimeType)"
-        ).execute()
-        files = results.get('files', [])
-        # Format output
-        file_list = [
-            {
-                'id': f.get('id'),
-                'name': f.get('name'),
-                'description': f.get('description', ''),
-                'mimeType': f.get('mimeType')
-            }
-            for f in files
-        ]
+        file_list = []
+        page_token = None
+        while len(file_list) < max_results:
+            results = service.files().list(
+                q=query,
+                pageSize=min(max(max_results - len(file_list), 1), 1000),
+                pageToken=page_token,
+                fields="nextPageToken,files(id,name,description,mimeType)"
+            ).execute()
+            for f in results.get('files', []):
+                # Drive's "contains" matches word prefixes; narrow it for prefix mode
+                if match_mode == "prefix" and not f.get('name', '').lower().startswith(name_query.lower()):
+                    continue
+                file_list.append({
+                    'id': f.get('id'),
+                    'name': f.get('name'),
+                    'description': f.get('description', ''),
+                    'mimeType': f.get('mimeType')
+                })
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+        file_list = file_list[:max_results]
         return {
             'status': 'success',
             'files': file_list,
@@ -0,0 +1,265 @@
+import asyncio
+import logging
+import os
+import time
+import weakref
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.events import EventActions
+from google.adk.models import LlmRequest, LlmResponse
+from google.adk.sessions.state import State
+from google.adk.tools import BaseTool, ToolContext
+
+from . import session_store
+
+logger = logging.getLogger(__name__)
+
+# Google API used by each tool, for per-API concurrency limits
+TOOL_APIS = {
+    "send_email": "gmail",
+    "send_bulk_email": "gmail",
+    "list_email_labels": "gmail",
+    "get_emails": "gmail",
+    "get_email_by_id": "gmail",
+    "mark_email_as_read": "gmail",
+    "mark_emails_as_read": "gmail",
+    "modify_email_labels": "gmail",
+    "count_unread_emails": "gmail",
+    "create_document": "docs",
+    "create_documents": "docs",
+    "delete_document": "drive",
+    "edit_document": "docs",
+    "create_new_spreadsheet": "sheets",
+    "add_sheet_to_spreadsheet": "sheets",
+    "get_sheet_values": "sheets",
+    "batch_get_sheet_values": "sheets",
+    "aggregate_sheet_values": "sheets",
+    "update_sheet_values": "sheets",
+    "batch_update_sheet_values": "sheets",
+    "bulk_append_sheet_rows": "sheets",
+    "delete_sheet_from_spreadsheet": "sheets",
+    "search_drive_files_by_name": "drive",
+}
+
+# Tools without side effects, which can safely run out of order with each other
+PARALLEL_SAFE_TOOLS = {
+    "list_email_labels",
+    "get_emails",
+    "get_email_by_id",
+    "count_unread_emails",
+    "get_sheet_values",
+    "batch_get_sheet_values",
+    "aggregate_sheet_values",
+    "search_drive_files_by_name",
+    "fetch_more_results",
+}
+
+# Maximum concurrent calls per API from one turn; override with e.g. TOOL_CONCURRENCY_GMAIL=8
+DEFAULT_API_LIMIT = 4
+
+# Seconds after which calls of a model response that ADK never reached are cancelled
+PENDING_TTL = 600
+
+
+class _CallContext:
+    """Tool context of one call started ahead of ADK reaching it.
+
+    ADK creates a call's ToolContext only when it reaches the call, so a call
+    started early runs with this stand-in instead: it reads a snapshot of the
+    session state and records its own state changes and actions, which are
+    moved into the call's real ToolContext once ADK reaches it (see apply_to).
+    Parallel-safe tools may use state and actions only.
+    """
+
+    def __init__(self, tool_context: ToolContext):
+        self.invocation_id = tool_context.invocation_id
+        self.agent_name = tool_context.agent_name
+        self.function_call_id: Optional[str] = None
+        self.actions = EventActions()
+        self.state = State(value=tool_context.state.to_dict(), delta=self.actions.state_delta)
+
+    def apply_to(self, tool_context: ToolContext) -> None:
+        """Move this call's state changes and actions into its own ToolContext."""
+        for key, value in self.actions.state_delta.items():
+            tool_context.state[key] = value
+        tool_context.actions.artifact_delta.update(self.actions.artifact_delta)
+        tool_context.actions.requested_auth_configs.update(self.actions.requested_auth_configs)
+        for field in ("skip_summarization", "transfer_to_agent", "escalate"):
+            value = getattr(self.actions, field)
+            if value is not None:
+                setattr(tool_context.actions, field, value)
+
+
+class _Batch:
+    """The function calls of one model response, in order, and the tasks started for them."""
+
+    def __init__(self, calls: List[Tuple[str, Dict[str, Any]]]):
+        self.calls = calls
+        self.tasks: List[Optional[asyncio.Task]] = [None] * len(calls)
+        self.contexts: List[Optional[_CallContext]] = [None] * len(calls)
+        self.position = 0
+        self.started = False
+        self.created = time.monotonic()
+
+    def cancel(self) -> None:
+        """Cancel the tasks of calls ADK never reached."""
+        for task in self.tasks[self.position:]:
+            if task is not None and not task.done():
+                task.cancel()
+
+
+class ParallelToolDispatcher:
+    """Runs the independent function calls of one model turn concurrently.
+
+    Installed on an agent in three places:
+    - before_model_callback=dispatcher.before_model records the tools of the
+      request;
+    - after_model_callback=dispatcher.after_model records the function calls
+      of the response;
+    - before_tool_callback=dispatcher, the dispatcher itself.
+
+    ADK executes those calls one after another. When the first of them
+    reaches the before_tool_callback, every parallel-safe call of the
+    response is started at once as an asyncio task, bounded by a per-API
+    semaphore. Each call's callback then awaits its own task, so results are
+    handed back to ADK, and on to the model, in the original call order, and
+    the state changes and actions the call made are moved into its own
+    ToolContext. Calls that are not parallel-safe run normally, in order.
+
+    Batches are kept per invocation and agent. Tasks ADK never collects are
+    cancelled when the agent next calls the model, when finish_invocation()
+    is called, or after PENDING_TTL seconds. Collection stops early on an
+    exception, an agent transfer or an early return.
+    """
+
+    def __init__(
+        self,
+        parallel_tools: Iterable[str] = PARALLEL_SAFE_TOOLS,
+        tool_apis: Optional[Dict[str, str]] = None,
+        default_limit: int = DEFAULT_API_LIMIT,
+    ):
+        """
+        Args:
+            parallel_tools (Iterable[str]): Names of the tools that may run concurrently
+            tool_apis (Optional[Dict[str, str]]): Tool name to API name (default TOOL_APIS)
+            default_limit (int): Concurrent calls per API unless TOOL_CONCURRENCY_<API> is set
+        """
+        self.parallel_tools = set(parallel_tools)
+        self.tool_apis = tool_apis or TOOL_APIS
+        self.default_limit = default_limit
+        # Keyed by (invocation id, agent name)
+        self._tools: Dict[Tuple[str, str], Tuple[float, Dict[str, BaseTool]]] = {}
+        self._batches: Dict[Tuple[str, str], _Batch] = {}
+        # Semaphores belong to an event loop, and Runner.run() starts a new loop per call
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def before_model(self, callback_context: CallbackContext, llm_request: LlmRequest) -> None:
+        """before_model_callback: the previous response's calls are over; remember this request's tools."""
+        key = (callback_context.invocation_id, callback_context.agent_name)
+        self._drop(key)
+        self._tools[key] = (time.monotonic(), llm_request.tools_dict)
+        self._sweep()
+
+    def after_model(self, callback_context: CallbackContext, llm_response: LlmResponse) -> None:
+        """after_model_callback: remember the function calls of a response."""
+        if llm_response.partial or not llm_response.content:
+            return
+        calls = [
+            (part.function_call.name, part.function_call.args or {})
+            for part in llm_response.content.parts or []
+            if part.function_call
+        ]
+        if not calls:
+            return
+        key = (callback_context.invocation_id, callback_context.agent_name)
+        self._drop(key)
+        self._batches[key] = _Batch(calls)
+
+    async def __call__(self, tool: BaseTool, args: Dict[str, Any], tool_context: ToolContext) -> Optional[Any]:
+        """before_tool_callback: return the concurrently computed result, or None to run the tool normally."""
+        key = (tool_context.invocation_id, tool_context.agent_name)
+        batch = self._batches.get(key)
+        if batch is None:
+            return None
+        position = batch.position
+        if position >= len(batch.calls) or batch.calls[position] != (tool.name, args):
+            # Not the call this batch expected next; run everything from here normally
+            self._drop(key)
+            return None
+        if not batch.started:
+            self._start(key, batch, tool_context)
+        batch.position += 1
+        if batch.position == len(batch.calls):
+            del self._batches[key]
+        task = batch.tasks[position]
+        if task is None:
+            return None
+        result = await task
+        batch.contexts[position].apply_to(tool_context)
+        # An empty response would make ADK run the tool a second time
+        return result if result else {"result": result}
+
+    def finish_invocation(self, invocation_id: str) -> None:
+        """Cancel whatever an ended invocation left running."""
+        for key in [key for key in self._batches if key[0] == invocation_id]:
+            self._drop(key)
+        for key in [key for key in self._tools if key[0] == invocation_id]:
+            del self._tools[key]
+
+    def _start(self, key: Tuple[str, str], batch: _Batch, tool_context: ToolContext) -> None:
+        """Start every parallel-safe call of a batch, each with its own _CallContext.
+
+        The session scope is settled first, in the first call's context, so
+        calls that page or recall results under it agree on one.
+        """
+        batch.started = True
+        tools = self._tools.get(key, (0, {}))[1]
+        parallel = [
+            i for i, (name, _) in enumerate(batch.calls)
+            if name in self.parallel_tools and name in tools
+        ]
+        if len(parallel) < 2:
+            return
+        session_store.session_scope(tool_context)
+        for i in parallel:
+            name, args = batch.calls[i]
+            batch.contexts[i] = _CallContext(tool_context)
+            batch.tasks[i] = asyncio.ensure_future(self._run(tools[name], args, batch.contexts[i]))
+        logger.debug("Dispatched %d tool calls concurrently", len(parallel))
+
+    def _drop(self, key: Tuple[str, str]) -> None:
+        batch = self._batches.pop(key, None)
+        if batch is not None:
+            batch.cancel()
+
+    def _sweep(self) -> None:
+        """Forget invocations idle for longer than PENDING_TTL, cancelling their calls.
+
+        Covers invocations that ended without finish_invocation() being called.
+        """
+        cutoff = time.monotonic() - PENDING_TTL
+        for key in [key for key, batch in self._batches.items() if batch.created < cutoff]:
+            self._drop(key)
+        for key in [key for key, (recorded, _) in self._tools.items() if recorded < cutoff]:
+            del self._tools[key]
+
+    async def _run(self, tool: BaseTool, args: Dict[str, Any], tool_context: _CallContext) -> Any:
+        """Run one tool call under its API's concurrency limit."""
+        async with self._semaphore(self.tool_apis.get(tool.name, tool.name)):
+            return await tool.run_async(args=args, tool_context=tool_context)
+
+    def _semaphore(self, api: str) -> asyncio.Semaphore:
+        """The current event loop's semaphore for an API."""
+        semaphores = self._semaphores.setdefault(asyncio.get_running_loop(), {})
+        semaphore = semaphores.get(api)
+        if semaphore is None:
+            limit = int(os.environ.get(f"TOOL_CONCURRENCY_{api.upper()}", self.default_limit))
+            semaphore = semaphores[api] = asyncio.Semaphore(limit)
+        return semaphore
+
+
+# Shared by all agents so the per-API limits apply across them
+dispatcher = ParallelToolDispatcher()
@@ -1,12 +1,18 @@
 from google.adk.tools import agent_tool
 from google.adk.tools import FunctionTool
-from . import sub_agents, sub_tools
+from . import async_tools, history_compaction, result_governor, sub_agents
 
 # Create agent tools
 search_tool = agent_tool.AgentTool(sub_agents.search_agent)
 
 # Create function tools for Google Docs operations
-create_document_tool = FunctionTool(func=sub_tools.create_document)
-delete_document_tool = FunctionTool(func=sub_tools.delete_document)
-edit_document_tool = FunctionTool(func=sub_tools.edit_document)
+create_document_tool = FunctionTool(func=result_governor.govern(async_tools.create_document))
+create_documents_tool = FunctionTool(func=result_governor.govern(async_tools.create_documents))
+delete_document_tool = FunctionTool(func=result_governor.govern(async_tools.delete_document))
+edit_document_tool = FunctionTool(func=result_governor.govern(async_tools.edit_document))
 
+# Re-expands tool results elided from older turns by history compaction
+expand_tool_result_tool = FunctionTool(func=result_governor.govern(history_compaction.expand_tool_result))
+
+# Pages through tool results too large to return at once
+fetch_more_results_tool = FunctionTool(func=result_governor.fetch_more_results)
@@ -16,6 +16,7 @@ import argparse
 SCOPES = [
     'https://www.googleapis.com/auth/gmail.send',
     'https://www.googleapis.com/auth/gmail.readonly',
+    'https://www.googleapis.com/auth/gmail.modify',
     'https://www.googleapis.com/auth/docs',
     'https://www.googleapis.com/auth/drive',
     'https://www.googleapis.com/auth/spreadsheets'
@@ -34,15 +35,19 @@ def setup_gmail_auth(credentials_file='credentials.json'):
         print("Found existing token.json file.")
         try:
             creds = Credentials.from_authorized_user_info(
-                json.loads(open('token.json').read()), SCOPES)
+                json.loads(open('token.json').read()))
             
+            # A token granted before new scopes were added must be re-authorized
+            if not creds.has_scopes(SCOPES):
+                print("Token is missing required scopes. Creating new token...")
+
             # Check if token is valid
-            if creds.valid:
+            elif creds.valid:
                 print("Token is valid! Authorization complete.")
                 return
             
             # Try to refresh if expired
-            if creds.expired and creds.refresh_token:
+            elif creds.expired and creds.refresh_token:
                 print("Token expired. Attempting to refresh...")
                 creds.refresh(Request())
                 # Save refreshed token
@@ -0,0 +1,170 @@
+import asyncio
+from unittest import mock
+
+import pytest
+from google.adk.models import Gemini, LlmRequest, LlmResponse
+from google.genai import errors as genai_errors
+from google.genai import types
+
+from app.main_agent import context_cache
+from app.main_agent.context_cache import ContextCacheManager, LocalCacheBackend
+
+INSTRUCTION = "You are a helpful assistant. " * 20
+
+
+def make_request(instruction: str = INSTRUCTION) -> LlmRequest:
+    return LlmRequest(
+        model="gemini-2.0-flash",
+        contents=[types.Content(role="user", parts=[types.Part(text="hello")])],
+        config=types.GenerateContentConfig(system_instruction=instruction),
+    )
+
+
+def run(manager: ContextCacheManager, agent_name: str = "agent", instruction: str = INSTRUCTION) -> LlmRequest:
+    request = make_request(instruction)
+    asyncio.run(manager(mock.Mock(agent_name=agent_name), request))
+    return request
+
+
+@pytest.fixture
+def backend():
+    return LocalCacheBackend()
+
+
+@pytest.fixture
+def manager(backend):
+    return ContextCacheManager(backend, ttl=3600, refresh_margin=600, min_tokens=1)
+
+
+def test_first_call_creates_cache_and_strips_prefix(manager, backend):
+    request = run(manager)
+
+    assert request.config.cached_content in backend.caches
+    assert request.config.system_instruction is None
+    assert manager.stats() == {"caches": 1, "hits": 0, "misses": 1}
+
+    backend.expand(request)
+    assert request.config.system_instruction == INSTRUCTION
+
+
+def test_later_calls_reuse_cache(manager, backend):
+    first = run(manager)
+    second = run(manager)
+
+    assert second.config.cached_content == first.config.cached_content
+    assert len(backend.caches) == 1
+    assert manager.stats()["hits"] == 1
+
+
+def test_small_prefix_is_not_cached(backend):
+    manager = ContextCacheManager(backend, min_tokens=10_000)
+    request = run(manager)
+
+    assert request.config.cached_content is None
+    assert request.config.system_instruction == INSTRUCTION
+    assert not backend.caches
+
+
+def test_cache_near_expiry_is_refreshed(manager, backend):
+    name = run(manager).config.cached_content
+    backend.caches[name]["expires_at"] -= 3500
+    manager._caches[next(iter(manager._caches))].expires_at -= 3500
+
+    request = run(manager)
+
+    assert request.config.cached_content == name
+    assert backend.caches[name]["expires_at"] - context_cache.time.monotonic() > 3000
+
+
+def test_cache_deleted_elsewhere_is_recreated_on_refresh(manager, backend):
+    name = run(manager).config.cached_content
+    backend.caches.clear()
+    manager._caches[next(iter(manager._caches))].expires_at -= 3500
+
+    request = run(manager)
+
+    assert request.config.cached_content != name
+    assert request.config.cached_content in backend.caches
+
+
+def test_changed_prompt_invalidates_without_deleting(manager, backend):
+    old = run(manager).config.cached_content
+    new = run(manager, instruction=INSTRUCTION + "Be brief.").config.cached_content
+
+    assert new != old
+    assert [cached.name for cached in manager._caches.values()] == [new]
+    # Another process may still use the old cache; it expires with its TTL
+    assert old in backend.caches
+
+
+def test_new_process_adopts_matching_cache(manager, backend):
+    name = run(manager).config.cached_content
+    other = run(manager, agent_name="other", instruction=INSTRUCTION + "Other.").config.cached_content
+
+    restarted = ContextCacheManager(backend, min_tokens=1)
+    request = run(restarted)
+
+    assert request.config.cached_content == name
+    assert set(backend.caches) == {name, other}
+
+
+def test_adopt_skips_cache_about_to_expire(manager, backend):
+    name = run(manager).config.cached_content
+    backend.caches[name]["expires_at"] -= 3500
+
+    restarted = ContextCacheManager(backend, ttl=3600, refresh_margin=600, min_tokens=1)
+    request = run(restarted)
+
+    assert request.config.cached_content != name
+
+
+def test_backend_failure_leaves_request_untouched(manager, backend):
+    with mock.patch.object(backend, "create", side_effect=RuntimeError("quota")):
+        request = run(manager)
+
+    assert request.config.cached_content is None
+    assert request.config.system_instruction == INSTRUCTION
+
+
+def test_restore_puts_prefix_back_and_forgets_cache(manager, backend):
+    request = run(manager)
+    name = request.config.cached_content
+
+    assert manager.restore(request)
+    assert request.config.cached_content is None
+    assert request.config.system_instruction == INSTRUCTION
+    assert run(manager).config.cached_content != name
+
+
+def test_model_call_retried_without_vanished_cache(manager, backend, monkeypatch):
+    monkeypatch.setattr(context_cache, "cache_manager", manager)
+    request = run(manager)
+    backend.caches.clear()
+    sent = []
+
+    async def generate(self, llm_request, stream=False):
+        sent.append(llm_request.config.cached_content)
+        try:
+            backend.expand(llm_request)
+        except KeyError:
+            raise genai_errors.ClientError(404, {"error": {"message": "CachedContent not found", "status": "NOT_FOUND"}})
+        yield LlmResponse()
+
+    async def call():
+        model = context_cache.CacheAwareGemini(model="gemini-2.0-flash")
+        return [response async for response in model.generate_content_async(request)]
+
+    with mock.patch.object(Gemini, "generate_content_async", generate):
+        responses = asyncio.run(call())
+
+    assert len(responses) == 1
+    assert sent == [sent[0], None]
+    assert request.config.system_instruction == INSTRUCTION
+
+
+def test_clear_deletes_caches(manager, backend):
+    run(manager)
+    asyncio.run(manager.clear())
+
+    assert not backend.caches
+    assert manager.stats()["caches"] == 0
@@ -0,0 +1,62 @@
+import os
+from unittest import mock
+
+import httplib2
+import pytest
+from google.auth.credentials import AnonymousCredentials
+
+from app.main_agent import discovery_documents, services
+
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch, tmp_path):
+    """No network, an empty cache directory and no documents in memory."""
+    monkeypatch.setattr(discovery_documents, "ALLOW_NETWORK", False)
+    monkeypatch.setattr(discovery_documents, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(discovery_documents, "_documents", {})
+    monkeypatch.setattr(services, "_services", {})
+    with mock.patch.object(httplib2.Http, "request", side_effect=AssertionError("network used")):
+        yield tmp_path
+
+
+def test_document_loaded_from_bundled_copy_and_persisted(offline):
+    document = discovery_documents.get_discovery_document("gmail", "v1")
+
+    assert document["name"] == "gmail"
+    assert os.path.exists(offline / "gmail.v1.json")
+    assert os.path.exists(offline / "gmail.v1.pickle")
+
+
+def test_later_process_loads_pickled_copy(offline):
+    discovery_documents.get_discovery_document("sheets", "v4")
+    discovery_documents._documents.clear()
+
+    with mock.patch.object(discovery_documents, "get_static_doc", side_effect=AssertionError("not from cache")):
+        document = discovery_documents.get_discovery_document("sheets", "v4")
+
+    assert document["name"] == "sheets"
+
+
+def test_outdated_pickle_is_reparsed_from_json(offline):
+    discovery_documents.get_discovery_document("gmail", "v1")
+    discovery_documents._documents.clear()
+    json_path = offline / "gmail.v1.json"
+    json_path.write_text('{"name": "edited"}', encoding="utf-8")
+    pickle_mtime = os.path.getmtime(offline / "gmail.v1.pickle")
+    os.utime(json_path, (pickle_mtime + 10, pickle_mtime + 10))
+
+    assert discovery_documents.get_discovery_document("gmail", "v1") == {"name": "edited"}
+
+
+def test_unknown_api_fails_without_network(offline):
+    with pytest.raises(FileNotFoundError, match="GOOGLE_DISCOVERY_ALLOW_NETWORK"):
+        discovery_documents.get_discovery_document("no-such-api", "v1")
+
+
+@pytest.mark.parametrize("api_name, api_version", [("gmail", "v1"), ("sheets", "v4"), ("docs", "v1"), ("drive", "v3")])
+def test_service_built_without_network(api_name, api_version):
+    credentials = AnonymousCredentials()
+    service = services.get_service(api_name, api_version, credentials)
+
+    assert services.get_service(api_name, api_version, credentials) is service
+    assert hasattr(service, "new_batch_http_request")
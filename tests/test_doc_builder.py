@@ -0,0 +1,105 @@
+import pytest
+
+from app.main_agent import doc_builder
+
+TABLE, ROW, CELL = "<table>", "<row>", "<cell>"
+
+
+def utf16_units(text: str) -> list:
+    """One list item per UTF-16 code unit, so list positions match Docs indices."""
+    units = []
+    for char in text:
+        units.extend([char] + [""] * (len(char.encode("utf-16-le")) // 2 - 1))
+    return units
+
+
+def apply(requests: list) -> list:
+    """Run requests against a new document, modelling a table the way Docs lays it out.
+
+    insertTable puts a newline at the index, then one index for the table,
+    one per row and two per cell (its start and its empty paragraph).
+    """
+    document = ["\n"]
+    for request in requests:
+        if "insertTable" in request:
+            table = request["insertTable"]
+            units = ["\n", TABLE] + ([ROW] + [CELL, "\n"] * table["columns"]) * table["rows"]
+            at = table["location"]["index"] - 1
+        elif "insertText" in request:
+            units = utf16_units(request["insertText"]["text"])
+            at = request["insertText"]["location"]["index"] - 1
+        else:
+            continue
+        assert 0 <= at < len(document)
+        document[at:at] = units
+    return document
+
+
+def read(document: list):
+    """Split a modelled document into the text before, the table cells and the text after."""
+    before, rows, after = [], [], []
+    tokens = iter(document)
+    for token in tokens:
+        if token == TABLE:
+            break
+        before.append(token)
+    else:
+        return "".join(before), None, ""
+    cell = None
+    for token in tokens:
+        if token == ROW:
+            rows.append([])
+        elif token == CELL:
+            cell = []
+        elif cell is not None and token == "\n":
+            rows[-1].append("".join(cell))
+            cell = None
+        elif cell is not None:
+            cell.append(token)
+        else:
+            after.append(token)
+    return "".join(before), rows, "".join(after)
+
+
+def test_table_cells_land_in_their_cells():
+    content = "# Report 😀\n| Name | Note |\n|---|---|\n| 𝔄da | ✓ |\n| Bob | |\nDone 🎉"
+
+    requests, text = doc_builder.compile_content(content, "markdown")
+    before, rows, after = read(apply(requests))
+
+    assert text is None
+    assert before == "Report 😀\n\n"
+    assert rows == [["Name", "Note"], ["𝔄da", "✓"], ["Bob", ""]]
+    assert after == "Done 🎉\n\n"
+
+
+@pytest.mark.parametrize("rows", [
+    [["a"]],
+    [["a", "b", "c"], ["d"]],
+    [["😀😀", ""], ["", "𝔞𝔟𝔠"], ["x", "y"]],
+])
+def test_table_size_matches_the_indices_it_takes(rows):
+    requests = doc_builder._table_requests(1, rows)
+
+    document = apply(requests)
+
+    # Everything but the document's own final newline belongs to the table
+    assert len(document) - 1 == doc_builder._table_size(rows)
+    columns = max(len(row) for row in rows)
+    assert read(document)[1] == [row + [""] * (columns - len(row)) for row in rows]
+
+
+def test_heading_and_list_styles_cover_their_paragraphs():
+    content = "## Plan 🗓\n- first 😀\n- second\nplain"
+
+    requests, text = doc_builder.compile_content(content, "markdown")
+    document = apply(requests)
+
+    assert text == "Plan 🗓\nfirst 😀\nsecond\nplain\n"
+    styled = {
+        next(iter(request)): request[next(iter(request))]["range"]
+        for request in requests if "insertText" not in request
+    }
+    assert "".join(document[styled["updateParagraphStyle"]["startIndex"] - 1:styled["updateParagraphStyle"]["endIndex"] - 1]) == "Plan 🗓"
+    bullets = styled["createParagraphBullets"]
+    assert "".join(document[bullets["startIndex"] - 1:bullets["endIndex"] - 1]) == "first 😀\nsecond"
@@ -0,0 +1,154 @@
+import json
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+from app.main_agent import doc_edits
+from app.main_agent.doc_edits import DocumentStateCache
+
+
+def apply_requests(body: str, requests: list) -> str:
+    """Apply insertText/deleteContentRange requests the way Docs does, in UTF-16 indices from 1."""
+    units = body.encode("utf-16-le")
+    for request in requests:
+        if "deleteContentRange" in request:
+            span = request["deleteContentRange"]["range"]
+            units = units[:(span["startIndex"] - 1) * 2] + units[(span["endIndex"] - 1) * 2:]
+        else:
+            at = (request["insertText"]["location"]["index"] - 1) * 2
+            units = units[:at] + request["insertText"]["text"].encode("utf-16-le") + units[at:]
+    return units.decode("utf-16-le")
+
+
+class FakeDocs:
+    """A one-document Docs service whose body is a single paragraph of plain text."""
+
+    def __init__(self, text: str):
+        self.text = text + "\n"
+        self.revision = 1
+        self.gets = 0
+        self.updates = []
+
+    def edit_elsewhere(self, text: str) -> None:
+        self.text = text + "\n"
+        self.revision += 1
+
+    def documents(self):
+        return self
+
+    def get(self, documentId, fields):
+        self.gets += 1
+        end_index = 1 + doc_edits.utf16_len(self.text)
+        document = {
+            "revisionId": str(self.revision),
+            "body": {"content": [
+                {"endIndex": 1},
+                {"startIndex": 1, "endIndex": end_index, "paragraph": {"elements": [
+                    {"startIndex": 1, "endIndex": end_index, "textRun": {"content": self.text}},
+                ]}},
+            ]},
+        }
+        return Result(lambda: document)
+
+    def batchUpdate(self, documentId, body):
+        def execute():
+            required = body.get("writeControl", {}).get("requiredRevisionId")
+            if required and required != str(self.revision):
+                content = json.dumps({"error": {"message": "The required revision ID does not match the latest revision."}})
+                raise HttpError(httplib2.Response({"status": 400}), content.encode())
+            self.updates.append(body["requests"])
+            self.text = apply_requests(self.text, body["requests"])
+            self.revision += 1
+            return {"writeControl": {"requiredRevisionId": str(self.revision)}}
+        return Result(execute)
+
+
+class Result:
+    def __init__(self, execute):
+        self.execute = execute
+
+
+@pytest.mark.parametrize("current, desired", [
+    ("hello world", "hello brave world"),
+    ("😀 smile\nsecond line", "😀 grin\nsecond 🎉 line"),
+    ("𝔘𝔫𝔦𝔠𝔬𝔡𝔢 text 😀😀", "𝔘𝔫𝔦 text 😀"),
+    ("a😀b😀c", "😀a😀c😀"),
+    ("line one\nline two\nline three\n", "line one\nline 2\nline three\nline four\n"),
+    ("", "🎉 all new"),
+    ("all gone 🎉", ""),
+])
+def test_diff_requests_round_trip_over_non_bmp_text(current, desired):
+    requests = doc_edits.diff_requests(current, desired)
+
+    assert apply_requests(current, requests) == desired
+    # Deletes and inserts are sent from the end of the document to the start
+    starts = [
+        request.get("deleteContentRange", {}).get("range", {}).get("startIndex")
+        or request["insertText"]["location"]["index"]
+        for request in requests
+    ]
+    assert starts == sorted(starts, reverse=True)
+
+
+def test_body_text_counts_non_bmp_characters_as_two_indices():
+    service = FakeDocs("😀 hi\nnext")
+
+    revision_id, text, end_index = doc_edits.fetch_state(service, "doc")
+
+    assert (revision_id, text) == ("1", "😀 hi\nnext\n")
+    assert end_index == 1 + 2 + len(" hi\nnext\n")
+
+
+def test_replace_text_diffs_against_the_cached_state():
+    service = FakeDocs("😀 draft")
+    cache = DocumentStateCache()
+
+    assert doc_edits.replace_text(service, cache, "doc", "😀 first draft") == 1
+    assert doc_edits.replace_text(service, cache, "doc", "😀 final draft 🎉") > 0
+
+    assert service.text == "😀 final draft 🎉\n"
+    assert service.gets == 1
+    assert cache.get("doc")["text"] == service.text
+    assert doc_edits.replace_text(service, cache, "doc", "😀 final draft 🎉") == 0
+
+
+def test_replace_text_retries_after_a_revision_conflict():
+    service = FakeDocs("shared 😀 notes")
+    cache = DocumentStateCache()
+    doc_edits.replace_text(service, cache, "doc", "shared 😀 notes v2")
+    service.edit_elsewhere("🎉 someone else's notes")
+
+    doc_edits.replace_text(service, cache, "doc", "🎉 our notes")
+
+    assert service.text == "🎉 our notes\n"
+    # The stale diff was rejected, then recomputed against a fresh GET
+    assert service.gets == 2
+    assert cache.get("doc") == {"revision_id": str(service.revision), "end_index": 1 + 2 + len(" our notes\n"), "text": service.text}
+
+
+def test_append_text_retries_with_a_fresh_end_index_after_a_conflict():
+    service = FakeDocs("start")
+    cache = DocumentStateCache()
+    doc_edits.append_text(service, cache, "doc", " 😀")
+    service.edit_elsewhere("a longer body written by 𝔰𝔬𝔪𝔢𝔬𝔫𝔢 else")
+
+    doc_edits.append_text(service, cache, "doc", " 🎉")
+
+    assert service.text == "a longer body written by 𝔰𝔬𝔪𝔢𝔬𝔫𝔢 else 🎉\n"
+    assert cache.get("doc")["end_index"] == 1 + doc_edits.utf16_len(service.text)
+
+
+def test_other_errors_clear_the_cached_state():
+    service = FakeDocs("text")
+    cache = DocumentStateCache()
+    doc_edits.append_text(service, cache, "doc", "!")
+    service.batchUpdate = lambda documentId, body: Result(_raise_not_found)
+
+    with pytest.raises(HttpError):
+        doc_edits.append_text(service, cache, "doc", "?")
+    assert cache.get("doc") is None
+
+
+def _raise_not_found():
+    raise HttpError(httplib2.Response({"status": 404}), b"not found")
@@ -0,0 +1,18 @@
+import os
+
+from app.main_agent.history_compaction import ElidedResultStore
+
+
+def test_store_creates_its_database_on_first_use(tmp_path):
+    path = str(tmp_path / "db" / "sessions.sqlite3")
+    store = ElidedResultStore(path)
+
+    assert not os.path.exists(os.path.dirname(path))
+
+    store.remember("scope", "get_email:1", {"body": "hello"})
+    store.save("scope", [("get_email:1", {"body": "hello"})])
+
+    assert os.path.exists(path)
+    # A new store reads results saved by an earlier one from the database
+    assert ElidedResultStore(path).recall("scope", "get_email:1") == {"body": "hello"}
+    assert ElidedResultStore(path).recall("other scope", "get_email:1") is None
@@ -0,0 +1,113 @@
+import asyncio
+import inspect
+from types import SimpleNamespace
+
+import pytest
+from google.adk.tools import FunctionTool
+
+from app.main_agent import result_governor as governance
+from app.main_agent.result_governor import TRUNCATION_MARK, ResultGovernor, result_size
+
+BUDGET = 1500
+
+
+@pytest.fixture
+def governor(monkeypatch):
+    shared = ResultGovernor(default_budget=BUDGET)
+    monkeypatch.setattr(governance, "result_governor", shared)
+    return shared
+
+
+def session():
+    """A stand-in for a ToolContext; only its state is used."""
+    return SimpleNamespace(state={})
+
+
+def list_emails(count: int) -> dict:
+    """Lists emails.
+
+    Args:
+        count (int): Number of emails
+    """
+    return {
+        "status": "success",
+        "emails": [{"id": str(i), "subject": f"Subject {i} ✉️"} for i in range(count)],
+    }
+
+
+def read_all_pages(tool, context, **args):
+    page = asyncio.run(tool.run_async(args=args, tool_context=context))
+    pages = [page]
+    while "next_cursor" in page:
+        page = governance.fetch_more_results(page["next_cursor"], context)
+        pages.append(page)
+    return pages
+
+
+def test_small_results_are_returned_unchanged(governor):
+    assert governance.govern(list_emails)(2) == list_emails(2)
+
+
+def test_large_list_is_paged_within_budget_and_reassembles(governor):
+    context = session()
+    pages = read_all_pages(FunctionTool(func=governance.govern(list_emails)), context, count=200)
+
+    assert len(pages) > 1
+    assert all(result_size(page) <= BUDGET for page in pages)
+    emails = [email for page in pages for email in page["emails"]]
+    assert emails == list_emails(200)["emails"]
+    assert pages[-1]["page"]["offset"] + pages[-1]["page"]["returned"] == 200
+
+
+def test_pages_belong_to_the_session_that_made_them(governor):
+    first = asyncio.run(
+        FunctionTool(func=governance.govern(list_emails)).run_async(args={"count": 200}, tool_context=session())
+    )
+
+    result = governance.fetch_more_results(first["next_cursor"], session())
+
+    assert result["status"] == "error"
+
+
+def test_later_pages_of_sheet_values_repeat_the_header(governor):
+    def get_sheet_values() -> dict:
+        return {"values": [["Name", "Amount"]] + [[f"row {i}", i] for i in range(300)]}
+
+    pages = read_all_pages(FunctionTool(func=governance.govern(get_sheet_values)), session())
+
+    assert len(pages) > 1
+    assert all(page["values"][0] == ["Name", "Amount"] for page in pages)
+    assert all(page["page"].get("header_repeated") for page in pages[1:])
+    rows = pages[0]["values"] + [row for page in pages[1:] for row in page["values"][1:]]
+    assert rows == get_sheet_values()["values"]
+
+
+def test_result_too_large_to_page_is_truncated(governor):
+    # The other fields alone exceed the budget, so no page of "body" fits
+    def read_email() -> dict:
+        return {"subject": "s" * 1600, "body": "😀" * 1000}
+
+    shaped = governance.govern(read_email)()
+
+    assert result_size(shaped) <= BUDGET
+    assert shaped["truncated"] is True
+    assert shaped["body"].endswith(TRUNCATION_MARK)
+    assert "next_cursor" not in shaped and TRUNCATION_MARK in shaped["message"]
+
+
+def test_wrapper_keeps_the_declaration_and_takes_the_context():
+    async def search(query: str) -> dict:
+        """Searches.
+
+        Args:
+            query (str): What to look for
+        """
+        return {"query": query}
+
+    wrapped = governance.govern(search)
+    tool = FunctionTool(func=wrapped)
+
+    assert inspect.iscoroutinefunction(wrapped)
+    assert "tool_context" in inspect.signature(wrapped).parameters
+    assert list(tool._get_declaration().parameters.properties) == ["query"]
+    assert asyncio.run(tool.run_async(args={"query": "x"}, tool_context=session())) == {"query": "x"}
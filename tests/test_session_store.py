@@ -0,0 +1,142 @@
+import asyncio
+import threading
+
+import pytest
+from google.adk.agents import BaseAgent
+from google.adk.events import Event, EventActions
+from google.adk.runners import Runner
+from google.genai import types
+
+from app.main_agent import session_store
+from app.main_agent.session_store import SqliteSessionService
+
+APP_NAME = "test_app"
+
+
+class CountingAgent(BaseAgent):
+    """Replies with a few events, yielding to the event loop between them."""
+
+    async def _run_async_impl(self, ctx):
+        for i in range(3):
+            await asyncio.sleep(0)
+            yield Event(
+                author=self.name,
+                invocation_id=ctx.invocation_id,
+                content=types.Content(role="model", parts=[types.Part(text=f"reply {i}")]),
+            )
+
+
+@pytest.fixture
+def service(tmp_path):
+    return SqliteSessionService(str(tmp_path / "sessions.sqlite3"))
+
+
+def message(text: str) -> types.Content:
+    return types.Content(role="user", parts=[types.Part(text=text)])
+
+
+def test_streams_progress_while_a_write_is_blocked(service):
+    runner = Runner(agent=CountingAgent(name="agent"), app_name=APP_NAME, session_service=service)
+    gate = threading.Event()
+    store_event = service._store_event
+
+    def blocked_store_event(*args):
+        gate.wait(timeout=10)
+        store_event(*args)
+
+    service._store_event = blocked_store_event
+
+    async def stream(session_id: str):
+        await session_store.load_session(service, APP_NAME, "user", session_id)
+        received = []
+        async for event in runner.run_async(user_id="user", session_id=session_id, new_message=message("hi")):
+            received.append(event.content.parts[0].text)
+        return received
+
+    async def both():
+        return await asyncio.wait_for(asyncio.gather(stream("a"), stream("b")), timeout=5)
+
+    try:
+        # Every write is held on the writer thread, yet both streams finish
+        results = asyncio.run(both())
+    finally:
+        gate.set()
+    assert results == [["reply 0", "reply 1", "reply 2"]] * 2
+
+    for session_id in ("a", "b"):
+        stored = service.get_session(app_name=APP_NAME, user_id="user", session_id=session_id)
+        assert [event.author for event in stored.events] == ["user", "agent", "agent", "agent"]
+
+
+def test_get_session_returns_loaded_session_once(service):
+    loaded = asyncio.run(session_store.load_session(service, APP_NAME, "user", "s"))
+
+    assert service.get_session(app_name=APP_NAME, user_id="user", session_id="s") is loaded
+    again = service.get_session(app_name=APP_NAME, user_id="user", session_id="s")
+    assert again is not loaded and again.id == "s"
+
+
+def user_event(text: str, state_delta=None) -> Event:
+    return Event(
+        author="user",
+        invocation_id="turn",
+        content=message(text),
+        actions=EventActions(state_delta=state_delta or {}),
+    )
+
+
+def test_events_and_state_survive_reopening(tmp_path):
+    path = str(tmp_path / "sessions.sqlite3")
+    service = SqliteSessionService(path)
+    session = service.create_session(app_name=APP_NAME, user_id="user", session_id="s", state={"topic": "tax"})
+    service.append_event(session, user_event("first", {"step": 1}))
+    service.append_event(session, user_event("second", {"step": 2, "temp:scratch": "x"}))
+    service.flush()
+
+    reopened = SqliteSessionService(path).get_session(app_name=APP_NAME, user_id="user", session_id="s")
+
+    assert [event.content.parts[0].text for event in reopened.events] == ["first", "second"]
+    assert reopened.state == {"topic": "tax", "step": 2}
+
+
+def test_app_and_user_state_are_shared_across_sessions(service):
+    first = service.create_session(app_name=APP_NAME, user_id="ann", session_id="a")
+    service.append_event(first, user_event("hi", {"app:version": 2, "user:name": "Ann", "draft": "one"}))
+    service.flush()
+
+    same_user = service.create_session(app_name=APP_NAME, user_id="ann", session_id="b")
+    other_user = service.create_session(app_name=APP_NAME, user_id="bob", session_id="c")
+
+    assert same_user.state == {"app:version": 2, "user:name": "Ann"}
+    assert other_user.state == {"app:version": 2}
+
+
+def test_history_window_starts_at_a_user_message(tmp_path):
+    service = SqliteSessionService(str(tmp_path / "sessions.sqlite3"), history_events=3)
+    session = service.create_session(app_name=APP_NAME, user_id="user", session_id="s")
+    for turn in range(3):
+        service.append_event(session, user_event(f"question {turn}"))
+        service.append_event(session, Event(author="agent", invocation_id="turn", content=message(f"answer {turn}")))
+
+    loaded = service.get_session(app_name=APP_NAME, user_id="user", session_id="s")
+    full = service.list_events(app_name=APP_NAME, user_id="user", session_id="s")
+
+    # The last three events begin with an answer, which is dropped so no turn is cut in half
+    assert [event.content.parts[0].text for event in loaded.events] == ["question 2", "answer 2"]
+    assert len(full.events) == 6
+
+
+def test_delete_session_removes_its_events(service):
+    session = service.create_session(app_name=APP_NAME, user_id="user", session_id="s")
+    service.append_event(session, user_event("hi"))
+    service.delete_session(app_name=APP_NAME, user_id="user", session_id="s")
+
+    assert service.get_session(app_name=APP_NAME, user_id="user", session_id="s") is None
+    assert service.list_events(app_name=APP_NAME, user_id="user", session_id="s").events == []
+
+
+def test_creating_an_existing_session_is_an_error(service):
+    service.create_session(app_name=APP_NAME, user_id="user", session_id="s")
+
+    with pytest.raises(ValueError, match="already exists"):
+        service.create_session(app_name=APP_NAME, user_id="user", session_id="s")
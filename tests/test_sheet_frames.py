@@ -0,0 +1,28 @@
+import pytest
+
+from app.main_agent import sheet_frames
+
+pytest.importorskip("pandas")
+
+VALUES = [
+    ["Category", "Amount", "Note"],
+    ["food", 12.5, "lunch"],
+    ["food", "n/a", "dinner"],
+    ["rent", 800, "march"],
+]
+
+
+def test_sum_skips_cells_that_are_not_numbers():
+    frame = sheet_frames.to_frame(VALUES)
+
+    assert sheet_frames.aggregate(frame, "sum", "Amount") == 812.5
+    assert sheet_frames.aggregate(frame, "mean", "Amount", group_by_column="Category") == {"food": 12.5, "rent": 800}
+
+
+def test_numeric_operation_on_text_column_is_an_error():
+    frame = sheet_frames.to_frame(VALUES)
+
+    with pytest.raises(ValueError, match="'Note'"):
+        sheet_frames.aggregate(frame, "sum", "Note")
+    # Non-numeric operations still work on text
+    assert sheet_frames.aggregate(frame, "max", "Note") == "march"
@@ -0,0 +1,83 @@
+import asyncio
+from typing import AsyncGenerator
+
+from google.adk.agents import LlmAgent
+from google.adk.models import BaseLlm, LlmRequest, LlmResponse
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.adk.tools import FunctionTool, ToolContext
+from google.genai import types
+
+from app.main_agent.tool_dispatch import ParallelToolDispatcher
+
+
+class ScriptedLlm(BaseLlm):
+    """Calls lookup_a and lookup_b in one response, then answers."""
+
+    async def generate_content_async(self, llm_request: LlmRequest, stream: bool = False) -> AsyncGenerator[LlmResponse, None]:
+        if llm_request.contents[-1].parts[0].function_response is None:
+            parts = [
+                types.Part(function_call=types.FunctionCall(name="lookup_a", args={"key": "a"})),
+                types.Part(function_call=types.FunctionCall(name="lookup_b", args={"key": "b"})),
+            ]
+        else:
+            parts = [types.Part(text="done")]
+        yield LlmResponse(content=types.Content(role="model", parts=parts))
+
+
+def run_agent(dispatcher: ParallelToolDispatcher, tools, after_tool):
+    agent = LlmAgent(
+        name="agent",
+        model=ScriptedLlm(model="scripted"),
+        tools=tools,
+        before_model_callback=dispatcher.before_model,
+        after_model_callback=dispatcher.after_model,
+        before_tool_callback=dispatcher,
+        after_tool_callback=after_tool,
+    )
+    service = InMemorySessionService()
+    runner = Runner(agent=agent, app_name="app", session_service=service)
+    session = service.create_session(app_name="app", user_id="user")
+
+    async def run():
+        message = types.Content(role="user", parts=[types.Part(text="go")])
+        return [event async for event in runner.run_async(user_id="user", session_id=session.id, new_message=message)]
+
+    events = asyncio.run(run())
+    return events, service.get_session(app_name="app", user_id="user", session_id=session.id)
+
+
+def test_calls_run_concurrently_with_their_own_state_changes():
+    running = []
+    overlap = []
+
+    async def lookup(key: str, tool_context: ToolContext) -> dict:
+        running.append(key)
+        await asyncio.sleep(0.05)
+        overlap.append(len(running))
+        running.remove(key)
+        tool_context.state[f"looked_up_{key}"] = True
+        return {"status": "success", "key": key}
+
+    async def lookup_a(key: str, tool_context: ToolContext) -> dict:
+        """Looks up a."""
+        return await lookup(key, tool_context)
+
+    async def lookup_b(key: str, tool_context: ToolContext) -> dict:
+        """Looks up b."""
+        return await lookup(key, tool_context)
+
+    deltas = {}
+
+    def after_tool(tool, args, tool_context, tool_response):
+        deltas[tool.name] = {
+            key: value for key, value in tool_context.state._delta.items() if key.startswith("looked_up")
+        }
+
+    dispatcher = ParallelToolDispatcher(parallel_tools={"lookup_a", "lookup_b"})
+    events, _ = run_agent(dispatcher, [FunctionTool(func=lookup_a), FunctionTool(func=lookup_b)], after_tool)
+
+    assert max(overlap) == 2
+    # Each call's state change is recorded in its own ToolContext
+    assert deltas == {"lookup_a": {"looked_up_a": True}, "lookup_b": {"looked_up_b": True}}
+    assert events[-1].content.parts[0].text == "done"